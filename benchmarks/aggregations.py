@@ -0,0 +1,219 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Benchmark of the aggregation and querying of the record-view events.
+
+Synthetic events are indexed in the in-memory stand-in of the search engine
+(see :mod:`invenio_stats.memory`), aggregated by the record-view aggregation
+and queried, so that no search cluster is needed. The time of each stage is
+split between the time spent in the stand-in search engine and the time spent
+in Invenio-Stats, e.g. building the requests and processing the responses.
+
+Usage::
+
+    python benchmarks/aggregations.py --events 1000000 --days 30 --json out.json
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from importlib.resources import files
+
+from flask import Flask
+from invenio_cache import InvenioCache
+from streams import build_events, generate_events
+
+from invenio_stats import InvenioStats
+from invenio_stats.aggregations import StatAggregator
+from invenio_stats.contrib.config import AGGREGATIONS_CONFIG, EVENTS_CONFIG
+from invenio_stats.memory import InMemoryQueue, InMemorySearchClient
+from invenio_stats.processors import EventsIndexer
+from invenio_stats.queries import DateHistogramQuery, TermsQuery
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def create_app():
+    """Create the application of the benchmark."""
+    app = Flask("benchmarks")
+    app.config.update(CACHE_TYPE="SimpleCache")
+    InvenioCache(app)
+    InvenioStats(app)
+    return app
+
+
+def put_templates(client, version):
+    """Put the record-view events and aggregations templates."""
+    for package in (
+        EVENTS_CONFIG["record-view"]["templates"],
+        AGGREGATIONS_CONFIG["record-view-agg"]["templates"],
+    ):
+        for template in files(package).joinpath(version).iterdir():
+            if template.name.endswith(".json"):
+                client.indices.put_template(
+                    name=template.name,
+                    body=json.loads(
+                        template.read_text().replace("__SEARCH_INDEX_PREFIX__", "")
+                    ),
+                )
+
+
+def percentile(values, percent):
+    """Get a percentile of a list of values."""
+    values = sorted(values)
+    return values[min(int(len(values) * percent / 100), len(values) - 1)]
+
+
+def stage(client, name, func, count=None):
+    """Run a stage, and measure its time in and out of the search engine."""
+    client.reset_stats()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    engine = sum(client.timings.values())
+    report = {
+        "stage": name,
+        "seconds": round(elapsed, 3),
+        "engine (s)": round(engine, 3),
+        "stats (s)": round(elapsed - engine, 3),
+        "per second": round(count / elapsed) if count else None,
+        "calls": {
+            method: {"count": calls, "seconds": round(client.timings[method], 3)}
+            for method, calls in client.calls.most_common()
+        },
+    }
+    return result, report
+
+
+def run_queries(queries, records, end_date):
+    """Run the queries over random records, and measure their latencies."""
+    latencies = {name: [] for name in queries}
+    for record in records:
+        for name, (query, kwargs) in queries.items():
+            start = time.perf_counter()
+            query.run(start_date=START, end_date=end_date, **kwargs(record))
+            latencies[name].append(time.perf_counter() - start)
+    return {
+        name: {
+            "p50 (ms)": round(statistics.median(values) * 1000, 2),
+            "p95 (ms)": round(percentile(values, 95) * 1000, 2),
+            "max (ms)": round(max(values) * 1000, 2),
+        }
+        for name, values in latencies.items()
+    }
+
+
+def run(events, days, queries, version):
+    """Run the stages of the benchmark."""
+    client = InMemorySearchClient()
+    put_templates(client, version)
+    end_date = START + timedelta(days=days)
+    reports = []
+
+    stream, report = stage(
+        client,
+        "generate",
+        lambda: build_events(generate_events(events, days=days, start=START)),
+        events,
+    )
+    reports.append(report)
+
+    indexer = EventsIndexer(
+        InMemoryQueue(stream),
+        client=client,
+        preprocessors=EVENTS_CONFIG["record-view"]["params"]["preprocessors"],
+    )
+    _, report = stage(client, "index", indexer.run, events)
+    reports.append(report)
+    del stream
+
+    aggregator = StatAggregator(
+        "record-view-agg",
+        client=client,
+        **AGGREGATIONS_CONFIG["record-view-agg"]["params"],
+    )
+    _, report = stage(
+        client,
+        "aggregate",
+        lambda: aggregator.run(start_date=START, end_date=end_date),
+        events,
+    )
+    reports.append(report)
+
+    histogram = DateHistogramQuery(
+        name="record-view",
+        index="stats-record-view",
+        client=client,
+        copy_fields={"pid_type": "pid_type", "pid_value": "pid_value"},
+        required_filters={"recid": "pid_value"},
+        metric_fields={
+            "views": ("sum", "count", {}),
+            "unique_views": ("sum", "unique_count", {}),
+        },
+    )
+    totals = TermsQuery(
+        name="record-view-total",
+        index="stats-record-view",
+        client=client,
+        aggregated_fields=["pid_value"],
+        metric_fields={"views": ("sum", "count", {})},
+    )
+    rng = random.Random(0)
+    records = [str(int(rng.paretovariate(1.2)) - 1) for _ in range(queries)]
+    latencies, report = stage(
+        client,
+        "query",
+        lambda: run_queries(
+            {
+                "histogram": (histogram, lambda record: {"recid": record}),
+                "totals": (totals, lambda record: {}),
+            },
+            records,
+            end_date,
+        ),
+    )
+    report["latencies"] = latencies
+    reports.append(report)
+    return reports
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--version", default="os-v2", choices=["os-v1", "os-v2", "v7"])
+    parser.add_argument("--json", help="file to which the results are written")
+    args = parser.parse_args()
+
+    with create_app().app_context():
+        reports = run(args.events, args.days, args.queries, args.version)
+
+    for report in reports:
+        print(
+            ", ".join(
+                "{}: {}".format(k, v)
+                for k, v in report.items()
+                if k not in ("calls", "latencies") and v is not None
+            )
+        )
+        for method, calls in report["calls"].items():
+            print("    {}: {count} calls, {seconds}s".format(method, **calls))
+        for query, latencies in report.get("latencies", {}).items():
+            print(
+                "    {} query: {}".format(
+                    query,
+                    ", ".join("{}: {}".format(k, v) for k, v in latencies.items()),
+                )
+            )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
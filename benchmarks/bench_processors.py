@@ -0,0 +1,56 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Benchmarks of the events preprocessors and indexer."""
+
+import hashlib
+from collections import deque
+
+from invenio_stats.memory import InMemoryQueue
+from invenio_stats.processors import (
+    EventsIndexer,
+    anonymize_user,
+    flag_robots,
+    hash_id,
+)
+
+
+def bench_build_events(measure, stream):
+    """Baseline: copying the events, as done by every preprocessor."""
+    measure(lambda events: [dict(event) for event in events], stream)
+
+
+def bench_flag_robots(measure, stream):
+    """Flag the events of robots."""
+    measure(lambda events: [flag_robots(event) for event in events], stream)
+
+
+def bench_anonymize_user(app, measure, stream):
+    """Anonymize the events, including the geolocation of their IP address."""
+    measure(lambda events: [anonymize_user(event) for event in events], stream)
+
+
+def bench_hash_id(measure, stream):
+    """Compute the identifiers of the anonymized events."""
+
+    def anonymized(event):
+        visitor = event.pop("user_id") or event.pop("session_id")
+        event["visitor_id"] = hashlib.sha224(visitor.encode("utf-8")).hexdigest()
+        return event
+
+    measure(
+        lambda events: [hash_id(event["timestamp"], event) for event in events],
+        stream,
+        prepare=anonymized,
+    )
+
+
+def bench_actionsiter(app, measure, stream):
+    """Generate the bulk actions of the events, sent to a no-op bulk sink."""
+
+    def index(events):
+        indexer = EventsIndexer(InMemoryQueue(events), client=object())
+        # keep the last action, to trace the allocations of the indexed events
+        return deque(indexer.actionsiter(), maxlen=1)
+
+    measure(index, stream)
@@ -0,0 +1,116 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Fixtures of the benchmarks of the events processing hot path.
+
+The benchmarks run on synthetic streams of record-view events whose user
+agents, IP addresses and records follow skewed (Pareto) distributions, like
+real traffic. They don't need a search cluster nor a message broker.
+
+Usage::
+
+    pip install -e .[benchmarks]
+    pytest benchmarks/ --benchmark-json=results.json
+    pytest-benchmark compare results.json other-results.json
+
+The sizes of the streams are set with the ``STATS_BENCHMARK_SIZES`` environment
+variable, e.g. ``STATS_BENCHMARK_SIZES=10000,100000``. Each benchmark records
+the throughput (``events_per_second``) and the memory allocated per event
+(``allocated_blocks_per_event`` and ``peak_bytes_per_event``) in its
+``extra_info``.
+"""
+
+import os
+import tracemalloc
+
+import pytest
+from flask import Flask
+from invenio_cache import InvenioCache
+from streams import build_events, generate_events
+
+from invenio_stats import InvenioStats
+
+SIZES = [
+    int(size)
+    for size in os.environ.get("STATS_BENCHMARK_SIZES", "10000,100000,1000000").split(
+        ","
+    )
+]
+"""Number of events of the benchmarked streams."""
+
+ALLOCATIONS_SAMPLE = 10000
+"""Number of events on which the allocations are traced."""
+
+_streams = {}
+
+
+@pytest.fixture(params=SIZES, ids=lambda size: "{}-events".format(size))
+def stream(request):
+    """Values of a synthetic stream of events, generated once per size."""
+    size = request.param
+    if size not in _streams:
+        _streams.clear()
+        _streams[size] = generate_events(size)
+    return _streams[size]
+
+
+@pytest.fixture(scope="session")
+def app():
+    """Application with the statistics and cache extensions."""
+    app_ = Flask("benchmarks")
+    app_.config.update(CACHE_TYPE="SimpleCache")
+    InvenioCache(app_)
+    InvenioStats(app_)
+    with app_.app_context():
+        yield app_
+
+
+@pytest.fixture
+def measure(benchmark):
+    """Benchmark a function processing a list of events.
+
+    The events can be prepared, e.g. preprocessed, by a function which is not
+    timed.
+
+    The function is timed once on the whole stream, the events being built
+    beforehand. The allocations are then traced on a sample of the events:
+    the memory blocks still allocated once the function returns, e.g. by the
+    processed events, and the peak of the traced memory.
+    """
+
+    def _measure(func, values, prepare=None):
+        def events(values):
+            events = build_events(values)
+            return [prepare(event) for event in events] if prepare else events
+
+        benchmark.pedantic(
+            func,
+            setup=lambda: ((events(values),), {}),
+            rounds=1,
+            iterations=1,
+        )
+        stats = benchmark.stats.stats
+        benchmark.extra_info["events"] = len(values)
+        benchmark.extra_info["events_per_second"] = round(len(values) / stats.mean)
+
+        sample = events(values[:ALLOCATIONS_SAMPLE])
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            processed = func(sample)
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        del processed
+        blocks = sum(
+            stat.count_diff
+            for stat in after.compare_to(before, "filename")
+            if stat.count_diff > 0
+        )
+        benchmark.extra_info["allocated_blocks_per_event"] = round(
+            blocks / len(sample), 2
+        )
+        benchmark.extra_info["peak_bytes_per_event"] = round(peak / len(sample))
+
+    return _measure
@@ -0,0 +1,161 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Benchmark of the templates variants of the file-download events.
+
+The same synthetic events are indexed in indices created from the default and
+from the ``performance`` templates. The size of the indices and the time taken
+by the daily aggregation queries of ``StatAggregator`` are then compared.
+
+Usage::
+
+    python benchmarks/index_templates.py --host localhost:9200 --events 500000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from importlib.resources import files
+
+from invenio_search.engine import search
+
+TEMPLATES = {
+    "default": "invenio_stats.contrib.file_download",
+    "performance": "invenio_stats.contrib.file_download.performance",
+}
+
+
+def generate_events(count, files_count, start):
+    """Generate synthetic file-download events over a month."""
+    for _ in range(count):
+        file_idx = int(random.paretovariate(1.2)) % files_count
+        timestamp = start + timedelta(seconds=random.randrange(30 * 86400))
+        yield {
+            "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%S"),
+            "bucket_id": "B{:031d}".format(file_idx),
+            "file_id": "F{:031d}".format(file_idx),
+            "file_key": "file-{}.pdf".format(file_idx),
+            "unique_id": "B{0:031d}_F{0:031d}".format(file_idx),
+            "country": random.choice(["CH", "FR", "DE", "US", None]),
+            "visitor_id": str(random.randrange(count // 10 + 1)),
+            "unique_session_id": str(random.randrange(count // 5 + 1)),
+            "is_robot": random.random() < 0.1,
+            "size": random.randrange(10**9),
+            "updated_timestamp": timestamp.isoformat(),
+        }
+
+
+def create_index(client, variant, version):
+    """Create the events index of a templates variant."""
+    prefix = "bench-{}-".format(variant)
+    template = (
+        files(TEMPLATES[variant]).joinpath(version, "file-download-v1.json").read_text()
+    )
+    client.indices.put_template(
+        name=prefix + "file-download",
+        body=json.loads(template.replace("__SEARCH_INDEX_PREFIX__", prefix)),
+    )
+    index = prefix + "events-stats-file-download-2026-01"
+    client.indices.create(index=index)
+    return index
+
+
+def aggregation_query(day):
+    """Build the query of the daily aggregation of the events."""
+    return {
+        "size": 0,
+        "query": {
+            "bool": {
+                "filter": [
+                    {"term": {"timestamp": day.strftime("%Y-%m-%d||/d")}},
+                    {"term": {"is_robot": False}},
+                ]
+            }
+        },
+        "aggs": {
+            "terms": {
+                "terms": {"field": "unique_id", "size": 10000},
+                "aggs": {
+                    "top_hit": {"top_hits": {"size": 1, "sort": {"timestamp": "desc"}}},
+                    "unique_count": {
+                        "cardinality": {
+                            "field": "unique_session_id",
+                            "precision_threshold": 1000,
+                        }
+                    },
+                    "volume": {"sum": {"field": "size"}},
+                    "last_update": {"max": {"field": "updated_timestamp"}},
+                },
+            }
+        },
+    }
+
+
+def run(client, variant, version, events, files_count, repeat):
+    """Index the events of a variant and measure its aggregations."""
+    random.seed(0)
+    start = datetime(2026, 1, 1)
+    index = create_index(client, variant, version)
+    try:
+        indexing_start = time.perf_counter()
+        search.helpers.bulk(
+            client,
+            (
+                {"_index": index, "_source": event}
+                for event in generate_events(events, files_count, start)
+            ),
+            chunk_size=1000,
+        )
+        client.indices.refresh(index=index)
+        indexing = time.perf_counter() - indexing_start
+        client.indices.forcemerge(index=index, max_num_segments=1)
+        size = client.indices.stats(index=index, metric="store")["_all"]["total"][
+            "store"
+        ]["size_in_bytes"]
+
+        timings = []
+        for _ in range(repeat):
+            query_start = time.perf_counter()
+            for day in range(30):
+                client.search(
+                    index=index,
+                    body=aggregation_query(start + timedelta(days=day)),
+                    request_cache=False,
+                )
+            timings.append(time.perf_counter() - query_start)
+        return {
+            "variant": variant,
+            "indexing (s)": round(indexing, 2),
+            "size (MiB)": round(size / 2**20, 2),
+            "aggregations (s)": round(statistics.median(timings), 3),
+        }
+    finally:
+        client.indices.delete(index=index, ignore_unavailable=True)
+        client.indices.delete_template(name="bench-{}-file-download".format(variant))
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost:9200")
+    parser.add_argument("--version", default="os-v2", choices=["os-v1", "os-v2", "v7"])
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    client_cls = getattr(search, "OpenSearch", None) or search.Elasticsearch
+    client = client_cls(hosts=[args.host])
+    results = [
+        run(client, variant, args.version, args.events, args.files, args.repeat)
+        for variant in TEMPLATES
+    ]
+    for result in results:
+        print(", ".join("{}: {}".format(k, v) for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Synthetic streams of events of the benchmarks.
+
+The user agents, IP addresses and records of the events follow skewed
+(Pareto) distributions, like real traffic.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.1 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0",
+    "python-requests/2.31.0",
+    "Mozilla/5.0 (Linux; Android 14) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.6099.43 Mobile Safari/537.36",
+    "Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)",
+    "curl/8.4.0",
+    "Wget/1.21.4",
+    "Mozilla/5.0 (compatible; AhrefsBot/7.0; +http://ahrefs.com/robot/)",
+]
+"""User agents of the events, by decreasing frequency."""
+
+
+def skewed_index(rng, count, alpha=1.2):
+    """Pick an index in ``range(count)``, the first ones being the most likely."""
+    return min(int(rng.paretovariate(alpha)) - 1, count - 1)
+
+
+def generate_events(size, seed=0, days=1, start=None):
+    """Generate the values of a stream of record-view events.
+
+    The events are generated as tuples, so that the cost of building them is
+    not included in the benchmarks: see :func:`build_events`.
+
+    :param days: number of days over which the events are spread.
+    :param start: date of the first event.
+    """
+    rng = random.Random(seed)
+    ips = [
+        "{}.{}.{}.{}".format(
+            rng.randrange(1, 224),
+            rng.randrange(256),
+            rng.randrange(256),
+            rng.randrange(1, 255),
+        )
+        for _ in range(max(size // 20, 1))
+    ]
+    records = max(size // 10, 1)
+    start = start or datetime(2026, 1, 1, tzinfo=timezone.utc)
+    step = timedelta(days=days) / size
+
+    events = []
+    for i in range(size):
+        record = skewed_index(rng, records)
+        ip_index = skewed_index(rng, len(ips), alpha=0.8)
+        logged_in = rng.random() < 0.2
+        events.append(
+            (
+                # like the event builders, without timezone
+                (start + i * step).strftime("%Y-%m-%dT%H:%M:%S"),
+                "R{:08d}".format(record),
+                "recid",
+                str(record),
+                "https://example.org/search?q={}".format(record % 97),
+                ips[ip_index],
+                USER_AGENTS[skewed_index(rng, len(USER_AGENTS), alpha=0.6)],
+                str(rng.randrange(1000)) if logged_in else None,
+                None if logged_in else "{:032x}".format(ip_index),
+                "recid_{}".format(record),
+            )
+        )
+    return events
+
+
+FIELDS = (
+    "timestamp",
+    "record_id",
+    "pid_type",
+    "pid_value",
+    "referrer",
+    "ip_address",
+    "user_agent",
+    "user_id",
+    "session_id",
+    "unique_id",
+)
+"""Fields of the generated events."""
+
+
+def build_events(values):
+    """Build the events of a stream, as received from the events queue."""
+    return [dict(zip(FIELDS, event)) for event in values]
@@ -361,6 +361,16 @@ An example request fetching statistics is the following:
               }
            }'
 
+The same query can be sent as the ``q`` argument of a GET request, whose
+responses can be cached by the browsers and proxies for the ``max_age`` of the
+statistics:
+
+.. code-block:: bash
+
+    $ curl -G localhost:5000/stats \
+        --data-urlencode 'q={"mystat": {"stat": "bucket-file-download-total",
+                                        "params": {"bucket_id": 20}}}'
+
 The query format is the following:
 
 .. code-block:: json
@@ -407,20 +417,30 @@ The provided query classes are:
 * :py:class:`~invenio_stats.queries.TermsQuery`: aggregation by terms
   (unique field values).
 
-Those two query classes have a common format for their results:
+* :py:class:`~invenio_stats.queries.MultiKeyTermsQuery`: metrics of a list of
+  keys (e.g. all the records of a search results page) in a single query.
+
+* :py:class:`~invenio_stats.queries.TotalsQuery`: all-time totals materialized
+  by an aggregation with the ``totals`` parameter enabled.
+  The totals of the aggregations computed before it was enabled can be
+  initialized with ``invenio stats aggregations rebuild-totals``.
+
+These query classes, i.e. the date histogram, terms, multi-key terms and
+totals queries, have a common format for their results:
 
 .. code-block:: json
 
     {
         "<CUSTOM-QUERY-NAME1>": {
-            "type": "<STATISTIC-TYPE>",
             "key_type": "<AGGREGATION-TYPE (date, terms, ...)>",
+            "buckets": ["..."],
             "SOME-OTHER-KEY": "<SOME-OTHER-VALUE>",
         }
     }
 
-The field ``type`` is ``bucket`` for both as these are bucket aggregations
-(see the search engine's documentation, e.g. Elasticsearch or OpenSearch).
+The terms, multi-key terms and totals queries also return a ``type`` field,
+which is ``bucket`` as these are bucket aggregations (see the search engine's
+documentation, e.g. Elasticsearch or OpenSearch).
 The ``key-type`` field is used as a helper for UI widgets so that they know
 how they can display the statistic automatically.
 
@@ -5,16 +5,26 @@
 
 """Aggregation classes."""
 
+import hashlib
+import json
 import math
+import re
+import time
+from collections import defaultdict
 from datetime import datetime, timezone
+from itertools import islice
 
 from dateutil import parser
 from dateutil.relativedelta import relativedelta
+from flask import current_app
 from invenio_search import current_search_client
 from invenio_search.engine import dsl, search
 from invenio_search.utils import prefix_index
 
 from .bookmark import SUPPORTED_INTERVALS, BookmarkAPI, format_range_dt
+from .metrics import current_metrics
+from .status import record_aggregation_run
+from .tracing import start_span
 from .utils import get_bucket_size
 
 INTERVAL_ROUNDING = {
@@ -32,6 +42,17 @@ INTERVAL_DELTAS = {
 }
 
 
+TIME_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def _interval_seconds(value):
+    """Get the number of seconds of a refresh interval, or None if disabled."""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)(ms|s|m|h|d)", str(value or "1s"))
+    if match is None:
+        return None
+    return float(match.group(1)) * TIME_UNITS[match.group(2)]
+
+
 def filter_robots(query):
     """Modify a search query so that robot events are filtered out."""
     return query.filter("term", is_robot=False)
@@ -50,6 +71,36 @@ ALLOWED_METRICS = {
 }
 
 
+TOTALS_METRICS = {"cardinality", "sum"}
+"""Metrics which can be summed up over time into all-time totals."""
+
+TOTALS_SCRIPT = """
+if (ctx._source.runs == null) {
+    ctx._source.runs = [];
+}
+if (ctx._source.runs.contains(params.run_id)) {
+    ctx.op = 'noop';
+} else {
+    for (entry in params.increments.entrySet()) {
+        def value = ctx._source[entry.getKey()];
+        ctx._source[entry.getKey()] = (value == null ? 0 : value) + entry.getValue();
+    }
+    for (entry in params.fields.entrySet()) {
+        ctx._source[entry.getKey()] = entry.getValue();
+    }
+    ctx._source.runs.add(params.run_id);
+    if (ctx._source.runs.size() > params.max_runs) {
+        ctx._source.runs.remove(0);
+    }
+}
+"""
+"""Painless script applying the increments of an aggregation run to a total.
+
+The identifiers of the last runs applied to a total are kept, so that the
+increments of a run are never applied twice.
+"""
+
+
 class StatAggregator(object):
     """Generic aggregation class.
 
@@ -73,7 +124,7 @@ class StatAggregator(object):
         {
             "timestamp": "<ISO DATE TIME>",
             "field_on_which_we_aggregate": "<A VALUE>",
-            "count": "<NUMBER OF OCCURRENCE OF THIS EVENT>",
+            "count": "<NUMBER OF OCCURRENCE OF THIS EVENT (SUM OF WEIGHTS)>",
             "field_metric": "<METRIC CALCULATION ON A FIELD>",
             "updated_timestamp": "<ISO DATE TIME>"
         }
@@ -84,8 +135,34 @@ class StatAggregator(object):
     Note the difference between the `timestamp` and the `updated_timestamp`. The first one identifies
     the date that is being calculated. The second one is to identify when the aggregation was modified.
     That might be useful if there are more actions depending on that action, like reindexing.
+
+    Optionally, the aggregator also maintains one all-time totals document per
+    aggregated value in the ``stats-totals-<event>`` index, which can be read
+    with :py:class:`~invenio_stats.queries.TotalsQuery` instead of summing up
+    all the aggregation documents:
+
+    .. code-block:: json
+
+        {
+            "field_on_which_we_aggregate": "<A VALUE>",
+            "count": "<TOTAL NUMBER OF OCCURRENCES OF THIS EVENT>",
+            "field_metric": "<SUM OF THE METRIC OVER ALL INTERVALS>",
+            "updated_timestamp": "<ISO DATE TIME>"
+        }
     """
 
+    TOTALS_MAPPINGS = {
+        "mappings": {
+            "date_detection": False,
+            "properties": {
+                "runs": {"type": "keyword", "index": False},
+                "updated_timestamp": {"type": "date"},
+            },
+        }
+    }
+
+    PENDING_MAPPINGS = {"mappings": {"enabled": False}}
+
     def __init__(
         self,
         name,
@@ -98,6 +175,9 @@ class StatAggregator(object):
         interval="day",
         index_interval="month",
         max_bucket_size=10000,
+        totals=False,
+        weight_field="weight",
+        event_index=None,
     ):
         """Construct aggregator instance.
 
@@ -115,10 +195,20 @@ class StatAggregator(object):
         :param interval: aggregation time window. default: month.
         :param index_interval: time window of the search indices which
             will contain the resulting aggregations.
+        :param totals: maintain the all-time totals of each aggregated value
+            in the ``stats-totals-<event>`` index. The chunk of documents being
+            written is kept in the ``stats-totals-pending-<event>`` index until
+            it is written along with its increments.
+        :param weight_field: field of the events' sampling weight, summed up
+            (with a default of 1) as the ``count`` of the aggregation. If
+            ``None``, the events are counted.
+        :param event_index: index or alias of the aggregated events. By
+            default, the ``events-stats-<event>`` alias, which covers both the
+            date-suffixed and the rolled over events indices.
         """
         self.name = name
         self.event = event
-        self.event_index = prefix_index(f"events-stats-{event}")
+        self.event_index = prefix_index(event_index or f"events-stats-{event}")
         self.client = client or current_search_client
         self.index = prefix_index(f"stats-{event}")
         self.field = field
@@ -133,6 +223,16 @@ class StatAggregator(object):
         )
         self.bookmark_api = BookmarkAPI(self.client, self.name, self.interval)
         self.max_bucket_size = max_bucket_size
+        self.totals = totals
+        self.weight_field = weight_field
+        self.backfill_report = None
+        self.totals_index = prefix_index(f"stats-totals-{event}")
+        self.pending_index = prefix_index(f"stats-totals-pending-{event}")
+        self.totals_fields = ["count"] + [
+            dst
+            for dst, (metric, _, _) in self.metric_fields.items()
+            if metric in TOTALS_METRICS
+        ]
 
         if any(v not in ALLOWED_METRICS for k, (v, _, _) in self.metric_fields.items()):
             raise (
@@ -210,87 +310,320 @@ class StatAggregator(object):
         for modifier in self.query_modifiers:
             agg_query = modifier(agg_query)
 
-        total_buckets = get_bucket_size(
+        with start_span(
+            "aggregation.interval", aggregation=self.name, interval=rounded_dt
+        ) as interval_span:
+            total_buckets = get_bucket_size(
+                self.client,
+                self.event_index,
+                self.field,
+                start_date=rounded_dt,
+                end_date=rounded_dt,
+            )
+
+            num_partitions = max(
+                int(math.ceil(float(total_buckets) / self.max_bucket_size)), 1
+            )
+            metrics = current_metrics()
+            if metrics is not None:
+                metrics.inc(
+                    "aggregation_partitions_total",
+                    num_partitions,
+                    aggregation=self.name,
+                )
+            for p in range(num_partitions):
+                with start_span(
+                    "aggregation.partition",
+                    parent=interval_span,
+                    aggregation=self.name,
+                    partition=p,
+                    partitions=num_partitions,
+                ) as span:
+                    terms = agg_query.aggs.bucket(
+                        "terms",
+                        "terms",
+                        field=self.field,
+                        include={"partition": p, "num_partitions": num_partitions},
+                        size=self.max_bucket_size,
+                    )
+                    terms.metric(
+                        "top_hit", "top_hits", size=1, sort={"timestamp": "desc"}
+                    )
+                    for dst, (metric, src, opts) in self.metric_fields.items():
+                        terms.metric(dst, metric, field=src, **opts)
+                    if self.weight_field:
+                        terms.metric(
+                            "total_weight", "sum", field=self.weight_field, missing=1
+                        )
+                    # Let's get also the last time that the event happened
+                    terms.metric("last_update", "max", field="updated_timestamp")
+
+                    results = agg_query.execute(
+                        # NOTE: Without this, the aggregation changes above, do not
+                        # invalidate the search's response cache, and thus you would
+                        # always get the same results for each partition.
+                        ignore_cache=True,
+                    )
+                    span.set_attribute(
+                        "buckets", len(results.aggregations["terms"].buckets)
+                    )
+                    for aggregation in results.aggregations["terms"].buckets:
+                        doc = aggregation.top_hit.hits.hits[0]["_source"].to_dict()
+                        aggregation = aggregation.to_dict()
+                        interval_date = datetime.strptime(
+                            doc["timestamp"], "%Y-%m-%dT%H:%M:%S"
+                        ).replace(**dict.fromkeys(INTERVAL_ROUNDING[self.interval], 0))
+
+                        # Skip events that have been previously aggregated.
+                        # The`updated_timestamp` field was introduced with v4.0.0, and it will
+                        # not exist in events created earlier
+                        last_update_aggr = aggregation["last_update"].get(
+                            "value_as_string", None
+                        )
+                        if last_update_aggr and previous_bookmark:
+                            last_date = datetime.fromisoformat(
+                                last_update_aggr.rstrip("Z")
+                            ).replace(tzinfo=timezone.utc)
+                            if last_date < previous_bookmark:
+                                if metrics is not None:
+                                    metrics.inc(
+                                        "aggregation_skipped_total",
+                                        aggregation=self.name,
+                                    )
+                                continue
+
+                        aggregation_data = {}
+                        aggregation_data["timestamp"] = interval_date.isoformat()
+                        aggregation_data[self.field] = aggregation["key"]
+                        aggregation_data["count"] = (
+                            round(aggregation["total_weight"]["value"])
+                            if self.weight_field
+                            else aggregation["doc_count"]
+                        )
+                        aggregation_data["updated_timestamp"] = datetime.now(
+                            timezone.utc
+                        ).isoformat()
+
+                        if self.metric_fields:
+                            for f in self.metric_fields:
+                                aggregation_data[f] = aggregation[f]["value"]
+
+                        for destination, source in self.copy_fields.items():
+                            if isinstance(source, str):
+                                aggregation_data[destination] = doc[source]
+                            else:
+                                aggregation_data[destination] = source(
+                                    doc, aggregation_data
+                                )
+
+                        index_name = prefix_index(
+                            "stats-{0}-{1}".format(
+                                self.event,
+                                interval_date.strftime(self.index_name_suffix),
+                            )
+                        )
+                        if metrics is not None:
+                            metrics.inc(
+                                "aggregation_buckets_total", aggregation=self.name
+                            )
+                        yield {
+                            "_id": "{0}-{1}".format(
+                                aggregation["key"],
+                                interval_date.strftime(self.doc_id_suffix),
+                            ),
+                            "_index": index_name,
+                            "_source": aggregation_data,
+                        }
+
+    def _write_with_totals(self, actions, run_key, chunk_size=50, **kwargs):
+        """Write aggregation documents along with the increments of their totals.
+
+        The previous version of each document is fetched, so that only the
+        difference is added to the totals when an interval is re-aggregated,
+        or subtracted from them when a document is deleted.
+
+        The increments of each chunk of documents are computed, and stored in
+        the pending index along with the documents, before anything is
+        written. If the chunk fails to be written, e.g. partially, it is
+        replayed as it was stored by the next run, before computing new
+        increments from the documents which were actually written. The
+        increments are identified by the run, the documents and the
+        increments themselves, so that those already applied to a total are
+        not applied twice.
+
+        :param run_key: identifier of the run, e.g. the bookmark and the
+            interval of the written documents.
+        :returns: the number of written documents and of errors.
+        """
+        self._ensure_totals_index()
+        self._replay_pending(**kwargs)
+        actions = iter(actions)
+        success = 0
+        while True:
+            chunk = list(islice(actions, chunk_size))
+            if not chunk:
+                return success, 0
+            previous = self.client.mget(
+                body={
+                    "docs": [
+                        {
+                            "_index": a["_index"],
+                            "_id": a["_id"],
+                            "_source": self.totals_fields + [self.field],
+                        }
+                        for a in chunk
+                    ]
+                }
+            )
+            increments = self._new_increments()
+            for action, prev_doc in zip(chunk, previous["docs"]):
+                prev_source = (
+                    prev_doc.get("_source", {}) if prev_doc.get("found") else {}
+                )
+                if action.get("_op_type") == "delete":
+                    if prev_source:
+                        self._add_increments(increments, prev_source, sign=-1)
+                else:
+                    self._add_increments(increments, action["_source"], prev_source)
+
+            run_id = hashlib.sha1(
+                json.dumps(
+                    [self.name, run_key, [a["_id"] for a in chunk], increments],
+                    sort_keys=True,
+                    default=str,
+                ).encode()
+            ).hexdigest()
+            self.client.index(
+                index=self.pending_index,
+                id=self.name,
+                body={"run_id": run_id, "increments": increments, "actions": chunk},
+            )
+            self._write_pending(chunk, increments, run_id, **kwargs)
+            success += len(chunk)
+
+    def _write_pending(self, chunk, increments, run_id, **kwargs):
+        """Write a pending chunk of documents and the increments of its totals."""
+        requests = chunk + list(self._totals_actions(increments, run_id))
+        search.helpers.bulk(
             self.client,
-            self.event_index,
-            self.field,
-            start_date=rounded_dt,
-            end_date=rounded_dt,
+            requests,
+            chunk_size=len(requests),
+            # the documents of a replayed chunk may already be deleted
+            ignore_status=(404,),
+            **kwargs,
         )
+        self.client.delete(index=self.pending_index, id=self.name)
 
-        num_partitions = max(
-            int(math.ceil(float(total_buckets) / self.max_bucket_size)), 1
+    def _replay_pending(self, **kwargs):
+        """Write the chunk of documents left pending by an interrupted run."""
+        if not dsl.Index(self.pending_index, using=self.client).exists():
+            self.client.indices.create(
+                index=self.pending_index, body=self.PENDING_MAPPINGS
+            )
+            return
+        try:
+            pending = self.client.get(index=self.pending_index, id=self.name)
+        except search.NotFoundError:
+            return
+        pending = pending["_source"]
+        self._write_pending(
+            pending["actions"], pending["increments"], pending["run_id"], **kwargs
         )
-        for p in range(num_partitions):
-            terms = agg_query.aggs.bucket(
-                "terms",
-                "terms",
-                field=self.field,
-                include={"partition": p, "num_partitions": num_partitions},
-                size=self.max_bucket_size,
+
+    def _ensure_totals_index(self):
+        """Create the totals index if it doesn't exist."""
+        if not dsl.Index(self.totals_index, using=self.client).exists():
+            self.client.indices.create(
+                index=self.totals_index, body=self.TOTALS_MAPPINGS
             )
-            terms.metric("top_hit", "top_hits", size=1, sort={"timestamp": "desc"})
-            for dst, (metric, src, opts) in self.metric_fields.items():
-                terms.metric(dst, metric, field=src, **opts)
-            # Let's get also the last time that the event happened
-            terms.metric("last_update", "max", field="updated_timestamp")
-
-            results = agg_query.execute(
-                # NOTE: Without this, the aggregation changes above, do not
-                # invalidate the search's response cache, and thus you would
-                # always get the same results for each partition.
-                ignore_cache=True,
+
+    def _add_increments(self, increments, source, prev_source=None, sign=1):
+        """Add the difference between two versions of a document to a total."""
+        total = increments[source[self.field]]
+        for field in self.totals_fields:
+            total["increments"][field] += sign * (
+                (source.get(field) or 0) - ((prev_source or {}).get(field) or 0)
             )
-            for aggregation in results.aggregations["terms"].buckets:
-                doc = aggregation.top_hit.hits.hits[0]["_source"].to_dict()
-                aggregation = aggregation.to_dict()
-                interval_date = datetime.strptime(
-                    doc["timestamp"], "%Y-%m-%dT%H:%M:%S"
-                ).replace(**dict.fromkeys(INTERVAL_ROUNDING[self.interval], 0))
-
-                # Skip events that have been previously aggregated.
-                # The`updated_timestamp` field was introduced with v4.0.0, and it will
-                # not exist in events created earlier
-                last_update_aggr = aggregation["last_update"].get(
-                    "value_as_string", None
-                )
-                if last_update_aggr and previous_bookmark:
-                    last_date = datetime.fromisoformat(
-                        last_update_aggr.rstrip("Z")
-                    ).replace(tzinfo=timezone.utc)
-                    if last_date < previous_bookmark:
-                        continue
-
-                aggregation_data = {}
-                aggregation_data["timestamp"] = interval_date.isoformat()
-                aggregation_data[self.field] = aggregation["key"]
-                aggregation_data["count"] = aggregation["doc_count"]
-                aggregation_data["updated_timestamp"] = datetime.now(
-                    timezone.utc
-                ).isoformat()
-
-                if self.metric_fields:
-                    for f in self.metric_fields:
-                        aggregation_data[f] = aggregation[f]["value"]
-
-                for destination, source in self.copy_fields.items():
-                    if isinstance(source, str):
-                        aggregation_data[destination] = doc[source]
-                    else:
-                        aggregation_data[destination] = source(doc, aggregation_data)
-
-                index_name = prefix_index(
-                    "stats-{0}-{1}".format(
-                        self.event, interval_date.strftime(self.index_name_suffix)
-                    )
-                )
-                yield {
-                    "_id": "{0}-{1}".format(
-                        aggregation["key"], interval_date.strftime(self.doc_id_suffix)
-                    ),
-                    "_index": index_name,
-                    "_source": aggregation_data,
+        for destination in self.copy_fields:
+            if destination in source:
+                total["fields"][destination] = source[destination]
+
+    def _totals_actions(self, increments, run_id, max_runs=10):
+        """Build the updates applying the increments of a run to the totals."""
+        updated_timestamp = datetime.now(timezone.utc).isoformat()
+        for key, total in increments.items():
+            yield {
+                "_op_type": "update",
+                "_index": self.totals_index,
+                "_id": key,
+                "retry_on_conflict": 3,
+                "scripted_upsert": True,
+                "upsert": {},
+                "script": {
+                    "lang": "painless",
+                    "source": TOTALS_SCRIPT,
+                    "params": {
+                        "run_id": run_id,
+                        "max_runs": max_runs,
+                        "increments": dict(total["increments"]),
+                        "fields": {
+                            **total["fields"],
+                            self.field: key,
+                            "updated_timestamp": updated_timestamp,
+                        },
+                    },
+                },
+            }
+
+    def rebuild_totals(self):
+        """Rebuild the totals documents from the aggregation documents.
+
+        The totals are summed up over all the aggregation documents, e.g. to
+        initialize them for the aggregations which were run before the totals
+        were enabled. The aggregation should not run in the meantime, as the
+        totals index is replaced.
+
+        :returns: the number of totals documents.
+        """
+        # the documents of an interrupted run are summed up with the others
+        self._replay_pending()
+        increments = self._new_increments()
+        aggs_query = (
+            dsl.Search(using=self.client, index=self.index)
+            .filter("exists", field=self.field)
+            .extra(_source=self.totals_fields + [self.field] + list(self.copy_fields))
+        )
+        for doc in aggs_query.scan():
+            self._add_increments(increments, doc.to_dict())
+
+        if dsl.Index(self.totals_index, using=self.client).exists():
+            self.client.indices.delete(index=self.totals_index)
+        self._ensure_totals_index()
+        updated_timestamp = datetime.now(timezone.utc).isoformat()
+        search.helpers.bulk(
+            self.client,
+            (
+                {
+                    "_index": self.totals_index,
+                    "_id": key,
+                    "_source": {
+                        **total["fields"],
+                        **total["increments"],
+                        self.field: key,
+                        "runs": [],
+                        "updated_timestamp": updated_timestamp,
+                    },
                 }
+                for key, total in increments.items()
+            ),
+            refresh=True,
+        )
+        return len(increments)
+
+    @staticmethod
+    def _new_increments():
+        """Create an empty mapping of value -> totals increments."""
+        return defaultdict(lambda: {"increments": defaultdict(int), "fields": {}})
 
     def _upper_limit(self, end_date):
         max_ = datetime.max.replace(tzinfo=timezone.utc)
@@ -299,8 +632,93 @@ class StatAggregator(object):
             datetime.now(timezone.utc),
         )
 
-    def run(self, start_date=None, end_date=None, update_bookmark=True):
-        """Calculate statistics aggregations."""
+    def _disable_refresh(self, index, drop_replicas=False):
+        """Disable the refresh (and the replicas) of an aggregations index.
+
+        :returns: the original settings of the index.
+        """
+        if not self.client.indices.exists(index=index):
+            try:
+                self.client.indices.create(index=index)
+            except search.exceptions.RequestError:
+                # the index was created concurrently
+                pass
+        current = self.client.indices.get_settings(index=index, flat_settings=True)[
+            index
+        ]["settings"]
+        original = {"refresh_interval": current.get("index.refresh_interval")}
+        backfill = {"refresh_interval": "-1"}
+        if drop_replicas:
+            original["number_of_replicas"] = current.get("index.number_of_replicas")
+            backfill["number_of_replicas"] = 0
+        self.client.indices.put_settings(index=index, body={"index": backfill})
+        return original
+
+    def _backfill_indices(self, actions, settings, drop_replicas=False):
+        """Disable the refresh of the indices before they are written."""
+        for action in actions:
+            if action["_index"] not in settings:
+                settings[action["_index"]] = self._disable_refresh(
+                    action["_index"], drop_replicas
+                )
+            yield action
+
+    def _restore_indices(self, settings, elapsed):
+        """Restore the settings of the backfilled indices and refresh them."""
+        refresh_start = time.monotonic()
+        for index, original in settings.items():
+            try:
+                self.client.indices.put_settings(index=index, body={"index": original})
+            except Exception:
+                current_app.logger.exception(
+                    "Could not restore the settings of %s: %s", index, original
+                )
+        if settings:
+            self.client.indices.refresh(index=",".join(settings))
+        refresh_elapsed = time.monotonic() - refresh_start
+
+        disabled = 0
+        for original in settings.values():
+            interval = _interval_seconds(original["refresh_interval"])
+            if interval:
+                disabled += int(elapsed / interval)
+        self.backfill_report = {
+            "indices": sorted(settings),
+            "duration": round(elapsed, 3),
+            "refresh_duration": round(refresh_elapsed, 3),
+            "periodic_refreshes_disabled": disabled,
+        }
+        current_app.logger.info(
+            "Backfilled %d indices of %s in %.1fs, refreshed them in %.1fs",
+            len(settings),
+            self.name,
+            elapsed,
+            refresh_elapsed,
+        )
+
+    def run(
+        self,
+        start_date=None,
+        end_date=None,
+        update_bookmark=True,
+        backfill=False,
+        drop_replicas=False,
+        update_totals=True,
+    ):
+        """Calculate statistics aggregations.
+
+        :param backfill: disable the refresh of the written aggregations
+            indices until the end of the run, e.g. when aggregating a large
+            range of dates. The original settings are restored afterwards, and
+            the indices are refreshed once. The durations of the run and of
+            the final refresh, and the number of periodic refreshes which were
+            disabled meanwhile, are reported in ``backfill_report``; the time
+            saved, if any, is measured by comparing with a run without it.
+        :param drop_replicas: in backfill mode, also remove the replicas of
+            the written indices until the end of the run.
+        :param update_totals: update the all-time totals, if enabled, with
+            the written documents.
+        """
         # If no events have been indexed there is nothing to aggregate
         if not dsl.Index(self.event_index, using=self.client).exists():
             return
@@ -321,25 +739,58 @@ class StatAggregator(object):
             end_date = datetime.now(timezone.utc).isoformat()
 
         results = []
-        for dt_key, dt in sorted(dates.items()):
-            results.append(
-                search.helpers.bulk(
-                    self.client,
-                    self.agg_iter(dt, previous_bookmark),
-                    stats_only=True,
-                    chunk_size=50,
-                )
-            )
+        backfill_settings = {}
+        run_start = time.monotonic()
+        metrics = current_metrics()
+        try:
+            for dt_key, dt in sorted(dates.items()):
+                interval_start = time.monotonic()
+                actions = self.agg_iter(dt, previous_bookmark)
+                if backfill:
+                    actions = self._backfill_indices(
+                        actions, backfill_settings, drop_replicas
+                    )
+                if self.totals and update_totals:
+                    run_key = [previous_bookmark, dt_key]
+                    results.append(self._write_with_totals(actions, run_key))
+                else:
+                    results.append(
+                        search.helpers.bulk(
+                            self.client,
+                            actions,
+                            stats_only=True,
+                            chunk_size=50,
+                        )
+                    )
+                if metrics is not None:
+                    metrics.observe(
+                        "aggregation_bulk_seconds",
+                        time.monotonic() - interval_start,
+                        aggregation=self.name,
+                        interval=self.interval,
+                    )
+        finally:
+            if backfill:
+                self._restore_indices(backfill_settings, time.monotonic() - run_start)
         if update_bookmark:
             self.bookmark_api.set_bookmark(end_date)
+            record_aggregation_run(
+                self.name,
+                max((upper_limit - lower_limit).total_seconds(), 0),
+                time.monotonic() - run_start,
+            )
         return results
 
     def list_bookmarks(self, start_date=None, end_date=None, limit=None):
         """List the aggregation's bookmarks."""
         return self.bookmark_api.list_bookmarks(start_date, end_date, limit)
 
-    def delete(self, start_date=None, end_date=None):
-        """Delete aggregation documents."""
+    def delete(self, start_date=None, end_date=None, update_totals=True):
+        """Delete aggregation documents.
+
+        :param update_totals: subtract the deleted documents from the
+            all-time totals, if enabled.
+        """
         aggs_query = dsl.Search(
             using=self.client,
             index=self.index,
@@ -365,18 +816,25 @@ class StatAggregator(object):
         if range_args:
             bookmarks_query = bookmarks_query.filter("range", date=range_args)
 
-        def _delete_actions():
-            for query in (aggs_query, bookmarks_query):
-                affected_indices = set()
-                for doc in query.scan():
-                    affected_indices.add(doc.meta.index)
-                    yield {
-                        "_index": doc.meta.index,
-                        "_op_type": "delete",
-                        "_id": doc.meta.id,
-                    }
-                current_search_client.indices.flush(
-                    index=",".join(affected_indices), wait_if_ongoing=True
-                )
+        def _delete_actions(query):
+            affected_indices = set()
+            for doc in query.scan():
+                affected_indices.add(doc.meta.index)
+                yield {
+                    "_index": doc.meta.index,
+                    "_op_type": "delete",
+                    "_id": doc.meta.id,
+                }
+            self.client.indices.flush(
+                index=",".join(affected_indices), wait_if_ongoing=True
+            )
 
-        search.helpers.bulk(self.client, _delete_actions(), refresh=True)
+        if self.totals and update_totals:
+            self._write_with_totals(
+                _delete_actions(aggs_query),
+                ["delete", range_args],
+                refresh=True,
+            )
+        else:
+            search.helpers.bulk(self.client, _delete_actions(aggs_query), refresh=True)
+        search.helpers.bulk(self.client, _delete_actions(bookmarks_query), refresh=True)
@@ -0,0 +1,59 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Load shedding of the emitted events when their queue is backlogged.
+
+A backlog policy is called with each event about to be emitted and the depth
+of its queue, and returns the reason of its decision along with the
+probability of keeping the event. Events kept with a probability lower than 1
+get their ``weight`` increased accordingly, like sampled events.
+"""
+
+from counter_robots import is_robot
+
+
+class BacklogPolicy(object):
+    """Shed the least valuable events first as the queue grows.
+
+    - Above the high watermark, the events of robots and of the low-priority
+      event types are dropped.
+    - Above the critical watermark, the other events are also sampled.
+    """
+
+    def __init__(
+        self,
+        high_watermark,
+        critical_watermark=None,
+        sampling_rate=0.1,
+        low_priority=None,
+    ):
+        """Constructor.
+
+        :param high_watermark: queue depth above which the events are shed.
+        :param critical_watermark: queue depth above which the events are
+            sampled.
+        :param sampling_rate: probability of keeping an event above the
+            critical watermark.
+        :param low_priority: names of the event types which are dropped above
+            the high watermark.
+        """
+        self.high_watermark = high_watermark
+        self.critical_watermark = critical_watermark
+        self.sampling_rate = sampling_rate
+        self.low_priority = set(low_priority or [])
+
+    def __call__(self, event_type, event, depth):
+        """Decide what happens to an event.
+
+        :returns: a tuple of the reason of the decision and the probability
+            of keeping the event.
+        """
+        if depth < self.high_watermark:
+            return "accept", 1
+        if event_type in self.low_priority:
+            return "low-priority", 0
+        if "user_agent" in event and is_robot(event["user_agent"]):
+            return "robot", 0
+        if self.critical_watermark is not None and depth >= self.critical_watermark:
+            return "sample", self.sampling_rate
+        return "accept", 1
@@ -0,0 +1,478 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""End-to-end benchmark of the events processing, aggregations and queries."""
+
+import inspect
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from invenio_base.utils import obj_or_import_string
+from invenio_search import current_search, current_search_client
+from invenio_search.engine import dsl, search
+from invenio_search.utils import prefix_index
+
+from .aggregations import INTERVAL_DELTAS, INTERVAL_ROUNDING
+from .memory import InMemorySearchClient
+from .proxies import current_stats
+from .tasks import aggregate_events, process_events
+from .utils import format_datetime_iso
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.1 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "python-requests/2.31.0",
+    "Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)",
+]
+"""User agents of the synthetic events, by decreasing frequency."""
+
+BENCHMARK_PREFIX = "benchmark-"
+"""Prefix of the identifiers of the synthetic events."""
+
+
+def is_synthetic(value):
+    """Tell whether an identifier is built from the ones of synthetic events.
+
+    E.g. the ``unique_id`` of a synthetic record-view event is
+    ``recid_benchmark-<number>``.
+    """
+    if not isinstance(value, str):
+        return False
+    return any(part.startswith(BENCHMARK_PREFIX) for part in value.split("_"))
+
+
+def _skewed(rng, count, alpha=1.2):
+    """Pick a number in ``range(count)``, the first ones being the most likely."""
+    return min(int(rng.paretovariate(alpha)) - 1, count - 1)
+
+
+def _visitor(rng):
+    """Build the fields of the visitor of a synthetic event."""
+    visitor = _skewed(rng, 100000, alpha=0.8)
+    logged_in = visitor % 5 == 0
+    return {
+        "ip_address": "10.{}.{}.{}".format(
+            visitor >> 16 & 255, visitor >> 8 & 255, visitor & 255
+        ),
+        "user_agent": USER_AGENTS[_skewed(rng, len(USER_AGENTS), alpha=0.6)],
+        "user_id": str(visitor) if logged_in else None,
+        "session_id": None if logged_in else "{:032x}".format(visitor),
+    }
+
+
+def record_view_event(rng, timestamp):
+    """Build a synthetic record-view event.
+
+    :param rng: random number generator.
+    :param timestamp: timestamp of the event.
+    """
+    record = _skewed(rng, 100000)
+    return {
+        "timestamp": timestamp,
+        "record_id": "{}{:012d}".format(BENCHMARK_PREFIX, record),
+        "pid_type": "recid",
+        "pid_value": "{}{}".format(BENCHMARK_PREFIX, record),
+        "referrer": None,
+        **_visitor(rng),
+    }
+
+
+def file_download_event(rng, timestamp):
+    """Build a synthetic file-download event.
+
+    :param rng: random number generator.
+    :param timestamp: timestamp of the event.
+    """
+    bucket = _skewed(rng, 100000)
+    file_ = _skewed(rng, 5)
+    return {
+        "timestamp": timestamp,
+        "bucket_id": "{}{:012d}".format(BENCHMARK_PREFIX, bucket),
+        "file_id": "{}{:04d}-{:012d}".format(BENCHMARK_PREFIX, file_, bucket),
+        "file_key": "file-{}.pdf".format(file_),
+        "size": 1024 * (1 + bucket % 1000),
+        "referrer": None,
+        **_visitor(rng),
+    }
+
+
+def percentiles(latencies):
+    """Get the percentiles of a list of latencies, in milliseconds."""
+    if not latencies:
+        return {}
+    latencies = sorted(latencies)
+
+    def percentile(percent):
+        index = min(int(len(latencies) * percent / 100), len(latencies) - 1)
+        return round(latencies[index] * 1000, 2)
+
+    return {
+        "p50": round(statistics.median(latencies) * 1000, 2),
+        "p95": percentile(95),
+        "p99": percentile(99),
+        "max": round(latencies[-1] * 1000, 2),
+    }
+
+
+@contextmanager
+def in_memory_search():
+    """Replace the search client of the application by an in-memory client.
+
+    The registered templates are put in the in-memory client, so that the
+    indices are created as in the search cluster.
+    """
+    # the client of invenio-search is built lazily and cached in ``_client``
+    original = current_search._client
+    current_search._client = InMemorySearchClient()
+    try:
+        list(current_search.put_templates())
+        list(current_search.put_index_templates())
+        yield current_search._client
+    finally:
+        current_search._client = original
+
+
+class EventsBenchmark(object):
+    """End-to-end benchmark of an event type.
+
+    Synthetic events are published with ``current_stats.publish``, indexed
+    with the ``process_events`` task, aggregated by the aggregations of the
+    event with the ``aggregate_events`` task, and the queries reading these
+    aggregations are run. Each stage runs against the search cluster and the
+    message broker of the application.
+
+    The events are spread over ``days`` days from ``start_date``, and their
+    identifiers are prefixed with ``benchmark-``, so that they can be told
+    apart from the real events. The benchmark refuses to run on dates for
+    which there are real events or aggregations, as their aggregations would
+    be computed again. Neither the bookmarks nor the totals of the
+    aggregations are updated, and the synthetic events and aggregations are
+    deleted at the end.
+    """
+
+    def __init__(
+        self,
+        event_type,
+        events=10000,
+        start_date=None,
+        days=1,
+        batch_size=500,
+        queries=100,
+        seed=0,
+    ):
+        """Constructor.
+
+        :param event_type: name of the benchmarked event type.
+        :param events: number of synthetic events.
+        :param start_date: date of the first event.
+        :param days: number of days over which the events are spread.
+        :param batch_size: number of events published at once.
+        :param queries: number of runs of each query.
+        :param seed: seed of the random generation of the events.
+        """
+        self.event_type = event_type
+        self.events = events
+        self.start_date = start_date or datetime(2000, 1, 1, tzinfo=timezone.utc)
+        self.end_date = self.start_date + timedelta(days=days)
+        self.batch_size = batch_size
+        self.queries = queries
+        self.rng = random.Random(seed)
+
+    @property
+    def aggregations(self):
+        """Configured aggregations of the event."""
+        return [
+            name
+            for name, agg in current_stats.aggregations.items()
+            if agg.params.get("event") == self.event_type
+        ]
+
+    @property
+    def query_names(self):
+        """Configured queries reading the aggregations of the event."""
+        aggregations = set(self.aggregations)
+        return [
+            name
+            for name in current_stats.queries
+            if aggregations & set(current_stats.get_query_aggregations(name))
+        ]
+
+    def _report(self, stage, count, unit, elapsed, latencies, **extra):
+        return {
+            "stage": stage,
+            "count": count,
+            "unit": unit,
+            "seconds": round(elapsed, 3),
+            "per_second": round(count / elapsed) if elapsed else None,
+            "latencies": percentiles(latencies),
+            **extra,
+        }
+
+    def generate(self):
+        """Generate the synthetic events."""
+        factories = current_app.config["STATS_BENCHMARK_EVENT_FACTORIES"]
+        if self.event_type not in factories:
+            raise ValueError(
+                "No synthetic events factory for {} events.".format(self.event_type)
+            )
+        factory = obj_or_import_string(factories[self.event_type])
+        step = (self.end_date - self.start_date) / self.events
+        return [
+            factory(
+                self.rng,
+                format_datetime_iso(
+                    self.start_date + i * step, replace_microsecond=True
+                ),
+            )
+            for i in range(self.events)
+        ]
+
+    def publish(self, events):
+        """Publish the events in batches."""
+        latencies = []
+        start = time.perf_counter()
+        for i in range(0, len(events), self.batch_size):
+            batch_start = time.perf_counter()
+            current_stats.publish(self.event_type, events[i : i + self.batch_size])
+            latencies.append(time.perf_counter() - batch_start)
+        return self._report(
+            "publish", len(events), "events", time.perf_counter() - start, latencies
+        )
+
+    def process(self):
+        """Index the queued events."""
+        start = time.perf_counter()
+        ((_, (indexed, errors)),) = process_events([self.event_type])
+        elapsed = time.perf_counter() - start
+
+        event = current_stats.events[self.event_type]
+        client = event.params.get("client") or current_search_client
+        client.indices.refresh(index=prefix_index("events-stats-" + self.event_type))
+        return self._report("process", indexed, "events", elapsed, [], errors=errors)
+
+    def aggregate(self):
+        """Aggregate the indexed events."""
+        latencies = []
+        count = errors = 0
+        for name in self.aggregations:
+            start = time.perf_counter()
+            (results,) = aggregate_events(
+                [name],
+                start_date=self.start_date.isoformat(),
+                end_date=self.end_date.isoformat(),
+                update_bookmark=False,
+                update_totals=False,
+            )
+            latencies.append(time.perf_counter() - start)
+            for success, failed in results or []:
+                count += success
+                errors += failed
+
+            agg = current_stats.aggregations[name]
+            client = agg.params.get("client") or current_search_client
+            client.indices.refresh(
+                index=prefix_index("stats-{}".format(agg.params["event"]))
+            )
+        return self._report(
+            "aggregate", count, "documents", sum(latencies), latencies, errors=errors
+        )
+
+    def _query_params(self, query):
+        """Build the parameters of the runs of a query.
+
+        The values of the required filters of the query are picked from the
+        aggregated documents.
+        """
+        params = {}
+        run_params = inspect.signature(query.run).parameters
+        if "start_date" in run_params:
+            params["start_date"] = self.start_date.isoformat()
+        if "end_date" in run_params:
+            params["end_date"] = self.end_date.isoformat()
+        required_filters = getattr(query, "required_filters", {})
+        if not required_filters:
+            return [params] * self.queries
+
+        docs_search = dsl.Search(using=query.client, index=query.index).filter(
+            "range",
+            **{
+                getattr(query, "time_field", "timestamp"): {
+                    "gte": self.start_date.isoformat(),
+                    "lt": self.end_date.isoformat(),
+                }
+            },
+        )
+        try:
+            docs = [hit.to_dict() for hit in docs_search[: self.queries]]
+        except search.exceptions.NotFoundError:
+            docs = []
+        if not docs:
+            return []
+        return [
+            {
+                **params,
+                **{param: doc.get(field) for param, field in required_filters.items()},
+            }
+            for doc in (self.rng.choice(docs) for _ in range(self.queries))
+        ]
+
+    def query(self):
+        """Run the queries reading the aggregations."""
+        latencies = []
+        per_query = {}
+        errors = 0
+        for name in self.query_names:
+            query = current_stats.get_query(name)
+            query_latencies = []
+            for params in self._query_params(query):
+                start = time.perf_counter()
+                try:
+                    query.run(**params)
+                except Exception:
+                    current_app.logger.warning("Query %s failed", name, exc_info=True)
+                    errors += 1
+                query_latencies.append(time.perf_counter() - start)
+            per_query[name] = percentiles(query_latencies)
+            latencies.extend(query_latencies)
+        return self._report(
+            "query",
+            len(latencies),
+            "queries",
+            sum(latencies),
+            latencies,
+            errors=errors,
+            queries=per_query,
+        )
+
+    @property
+    def date_range(self):
+        """Range of the dates of the events and of their aggregations.
+
+        The aggregations are computed over whole intervals, e.g. days.
+
+        :returns: a ``(start, end)`` tuple, the end being excluded.
+        """
+        start, end = self.start_date, self.end_date
+        last = self.end_date - timedelta(microseconds=1)
+        for name in self.aggregations:
+            interval = current_stats.aggregations[name].params.get("interval", "day")
+            rounding = {
+                unit: 1 if unit in ("month", "day") else 0
+                for unit in INTERVAL_ROUNDING[interval]
+            }
+            start = min(start, self.start_date.replace(**rounding))
+            end = max(end, last.replace(**rounding) + INTERVAL_DELTAS[interval])
+        return start, end
+
+    def _targets(self):
+        """Get the indices written by the benchmark.
+
+        :returns: a list of ``(client, index, fields)`` tuples, the fields
+            identifying the synthetic documents.
+        """
+        event = current_stats.events[self.event_type]
+        fields = []
+        targets = []
+        for name in self.aggregations:
+            agg = current_stats.aggregations[name]
+            fields.append(agg.params["field"])
+            targets.append(
+                (
+                    agg.params.get("client") or current_search_client,
+                    prefix_index("stats-{}".format(agg.params["event"])),
+                    [agg.params["field"]],
+                )
+            )
+        targets.insert(
+            0,
+            (
+                event.params.get("client") or current_search_client,
+                prefix_index("events-stats-" + self.event_type),
+                fields or ["unique_id"],
+            ),
+        )
+        return targets
+
+    def _documents(self, client, index, fields):
+        """Get the documents of an index in the benchmark's dates.
+
+        :returns: an iterator of ``(index, id, synthetic)`` tuples.
+        """
+        start, end = self.date_range
+        docs_search = (
+            dsl.Search(using=client, index=index)
+            .filter(
+                "range", timestamp={"gte": start.isoformat(), "lt": end.isoformat()}
+            )
+            .source(fields)
+        )
+        try:
+            for hit in docs_search.scan():
+                doc = hit.to_dict()
+                yield hit.meta.index, hit.meta.id, any(
+                    is_synthetic(doc.get(field)) for field in fields
+                )
+        except search.exceptions.NotFoundError:
+            return
+
+    def check_dates(self):
+        """Check that there are no real events or aggregations in the dates.
+
+        :raises ValueError: if there are.
+        """
+        for client, index, fields in self._targets():
+            for _, _, synthetic in self._documents(client, index, fields):
+                if not synthetic:
+                    start, end = self.date_range
+                    raise ValueError(
+                        "There are real documents in {} between {} and {}, "
+                        "choose other dates for the benchmark.".format(
+                            index, start.isoformat(), end.isoformat()
+                        )
+                    )
+
+    def cleanup(self):
+        """Delete the synthetic events and aggregations."""
+        for client, index, fields in self._targets():
+            search.helpers.bulk(
+                client,
+                (
+                    {"_op_type": "delete", "_index": doc_index, "_id": doc_id}
+                    for doc_index, doc_id, synthetic in self._documents(
+                        client, index, fields
+                    )
+                    if synthetic
+                ),
+                refresh=True,
+            )
+
+    def run(self):
+        """Run the stages of the benchmark.
+
+        :returns: the report of each stage.
+        """
+        self.check_dates()
+        start = time.perf_counter()
+        events = self.generate()
+        reports = [
+            self._report(
+                "generate", len(events), "events", time.perf_counter() - start, []
+            ),
+            self.publish(events),
+        ]
+        del events
+        try:
+            reports.append(self.process())
+            reports.append(self.aggregate())
+            reports.append(self.query())
+        finally:
+            self.cleanup()
+        return reports
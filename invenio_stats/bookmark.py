@@ -84,6 +84,13 @@ class BookmarkAPI(object):
     @_ensure_index_exists
     def get_bookmark(self, refresh_time=60):
         """Get last aggregation date."""
+        return self.find_bookmark(refresh_time=refresh_time)
+
+    def find_bookmark(self, refresh_time=60):
+        """Get last aggregation date, without creating the bookmarks index.
+
+        :returns: the date, or ``None`` if there is no bookmark (yet).
+        """
         # retrieve the oldest bookmark
         query_bookmark = (
             dsl.Search(using=self.client, index=self.bookmark_index)
@@ -91,7 +98,10 @@ class BookmarkAPI(object):
             .sort({"date": {"order": "desc"}})
             .extra(size=1)  # fetch one document only
         )
-        bookmark = next(iter(query_bookmark.execute()), None)
+        try:
+            bookmark = next(iter(query_bookmark.execute()), None)
+        except search.exceptions.NotFoundError:
+            return None
         if bookmark:
             try:
                 my_date = datetime.fromisoformat(bookmark.date)
@@ -0,0 +1,171 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Buffered emission of events, off the request path."""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+_STOP = object()
+"""Marker waking up the background thread when the buffer is closed."""
+
+
+class EventBuffer(object):
+    """Bounded buffer publishing events in batches from a background thread.
+
+    Events are published once ``batch_size`` of them have accumulated, or
+    ``flush_interval`` seconds after the first one, whichever comes first. The
+    remaining events are flushed when the process exits.
+
+    When the buffer is full, the ``overflow`` policy decides what happens to
+    new events:
+
+    - ``"drop"``: the event is discarded (and counted in ``dropped``).
+    - ``"block"``: the caller waits until there is room in the buffer.
+    - ``"spill"``: the event is published directly by the caller.
+    """
+
+    overflow_policies = {"drop", "block", "spill"}
+    """Supported overflow policies."""
+
+    def __init__(
+        self,
+        app,
+        publish,
+        max_size=10000,
+        batch_size=100,
+        flush_interval=1.0,
+        overflow="drop",
+    ):
+        """Constructor.
+
+        :param app: Flask application, whose context is pushed to publish.
+        :param publish: function publishing a list of events of a given type,
+            of the form ``publish(event_type, events)``.
+        :param max_size: maximum number of buffered events.
+        :param batch_size: maximum number of events published at once.
+        :param flush_interval: maximum time in seconds an event is buffered.
+        :param overflow: policy applied when the buffer is full.
+        """
+        if overflow not in self.overflow_policies:
+            raise ValueError(
+                "Overflow policy should be one of [{}]".format(
+                    ", ".join(sorted(self.overflow_policies))
+                )
+            )
+        self.app = app
+        self.publish = publish
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stopped = threading.Event()
+        atexit.register(self.close)
+
+    def _ensure_worker(self):
+        """Start the background thread (again, in forked processes)."""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # the buffered events of the parent process are not ours
+                self._queue = queue.Queue(maxsize=self.max_size)
+                self._pid = os.getpid()
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="invenio-stats-event-buffer", daemon=True
+            )
+            self._thread.start()
+
+    def put(self, event_type, event):
+        """Buffer an event."""
+        self._ensure_worker()
+        try:
+            self._queue.put((event_type, event), block=self.overflow == "block")
+        except queue.Full:
+            if self.overflow == "spill":
+                self._publish([(event_type, event)])
+            else:
+                self.dropped += 1
+
+    def _collect(self):
+        """Wait for the next batch of events."""
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            timeout = (
+                self.flush_interval if deadline is None else deadline - time.monotonic()
+            )
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                break
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _publish(self, batch):
+        """Publish a batch of events, grouped by type."""
+        events = defaultdict(list)
+        for event_type, event in batch:
+            events[event_type].append(event)
+        with self.app.app_context():
+            for event_type, typed_events in events.items():
+                try:
+                    self.publish(event_type, typed_events)
+                except Exception:
+                    self.app.logger.exception(
+                        "Error publishing %d buffered events", len(typed_events)
+                    )
+
+    def _run(self):
+        """Publish the buffered events until the buffer is closed."""
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if batch:
+                self._publish(batch)
+
+    def flush(self):
+        """Publish all the buffered events from the calling thread."""
+        if self._queue is None or self._pid != os.getpid():
+            return
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    batch.append(item)
+            if not batch:
+                return
+            self._publish(batch)
+
+    def close(self):
+        """Stop the background thread and flush the remaining events."""
+        self._stopped.set()
+        if self._thread is not None and self._pid == os.getpid():
+            try:
+                self._queue.put_nowait(_STOP)
+            except queue.Full:
+                # the background thread isn't waiting for events anyway
+                pass
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
@@ -5,6 +5,9 @@
 
 """Aggregation classes."""
 
+import json
+from contextlib import nullcontext
+from datetime import timezone
 from functools import wraps
 
 import click
@@ -12,8 +15,10 @@ from dateutil.parser import parse as dateutil_parse
 from flask.cli import with_appcontext
 from werkzeug.local import LocalProxy
 
+from .benchmark import EventsBenchmark, in_memory_search
 from .proxies import current_stats
-from .tasks import aggregate_events, process_events
+from .status import get_status
+from .tasks import aggregate_events, process_events, prune_events
 
 
 def lazy_result(f):
@@ -89,6 +94,65 @@ def _events_process(event_types=None, eager=False):
         click.secho("Events processing task sent...", fg="yellow")
 
 
+@events.command("spool-info")
+@with_appcontext
+def _events_spool_info():
+    """Show the content of the local events spool."""
+    spool = current_stats.event_spool
+    if spool is None:
+        raise click.ClickException("The events spool is not enabled.")
+    info = spool.stats()
+    click.echo(
+        "{}: {} segment(s), {} bytes".format(spool.path, info["segments"], info["size"])
+    )
+    for event_type, count in sorted(info["events"].items()):
+        click.echo(" - {}: {}".format(event_type, count))
+
+
+@events.command("spool-drain")
+@click.option("--batch-size", default=1000)
+@with_appcontext
+def _events_spool_drain(batch_size=1000):
+    """Publish the events of the local spool."""
+    if current_stats.event_spool is None:
+        raise click.ClickException("The events spool is not enabled.")
+    count = current_stats.drain_spool(batch_size=batch_size)
+    click.secho("{} spooled events published.".format(count), fg="green")
+
+
+@events.command("prune")
+@click.argument("event-types", nargs=-1, callback=_validate_event_type)
+@click.option("--dry-run", is_flag=True, help="Only list the prunable indices.")
+@click.option(
+    "--force-merge/--no-force-merge",
+    default=True,
+    help="Force-merge the finished aggregations indices.",
+)
+@click.option("--eager", "-e", is_flag=True)
+@with_appcontext
+def _events_prune(event_types=None, dry_run=False, force_merge=True, eager=False):
+    """Delete the raw events indices which have been aggregated."""
+    event_types = list(event_types or current_stats.events)
+    prune_task = prune_events.si(event_types, dry_run=dry_run, force_merge=force_merge)
+
+    if eager or dry_run:
+        for event_type, result in prune_task.apply(throw=True).result:
+            click.echo("{}:".format(event_type))
+            for index in result["pruned"]:
+                click.echo(
+                    " - {} {}".format("prunable" if dry_run else "pruned", index)
+                )
+            for index in result["merged"]:
+                click.echo(
+                    " - {} {}".format("mergeable" if dry_run else "merged", index)
+                )
+        if not dry_run:
+            click.secho("Events pruned successfully.", fg="green")
+    else:
+        prune_task.delay()
+        click.secho("Events pruning task sent...", fg="yellow")
+
+
 @stats.group()
 def aggregations():
     """Aggregation management commands."""
@@ -99,6 +163,16 @@ def aggregations():
 @click.option("--start-date", callback=_parse_date)
 @click.option("--end-date", callback=_parse_date)
 @click.option("--update-bookmark", "-b", is_flag=True)
+@click.option(
+    "--backfill",
+    is_flag=True,
+    help="Disable the refresh of the aggregations indices until the end.",
+)
+@click.option(
+    "--drop-replicas",
+    is_flag=True,
+    help="Remove the replicas of the aggregations indices until the end.",
+)
 @click.option("--eager", "-e", is_flag=True)
 @with_appcontext
 def _aggregations_process(
@@ -106,6 +180,8 @@ def _aggregations_process(
     start_date=None,
     end_date=None,
     update_bookmark=False,
+    backfill=False,
+    drop_replicas=False,
     eager=False,
 ):
     """Process stats aggregations."""
@@ -117,6 +193,8 @@ def _aggregations_process(
         start_date=start_date.isoformat() if start_date else None,
         end_date=end_date.isoformat() if end_date else None,
         update_bookmark=update_bookmark,
+        backfill=backfill,
+        drop_replicas=backfill and drop_replicas,
     )
 
     if eager:
@@ -160,3 +238,153 @@ def _aggregations_list_bookmarks(
         click.echo("{}:".format(a))
         for b in bookmarks:
             click.echo(" - {}".format(b.date))
+
+
+@aggregations.command("rebuild-totals")
+@aggr_arg
+@click.confirmation_option(
+    prompt="Are you sure you want to rebuild the totals of the aggregations?"
+)
+@with_appcontext
+def _aggregations_rebuild_totals(aggregation_types=None):
+    """Rebuild the all-time totals from the computed aggregations.
+
+    The aggregations should not be processed while their totals are rebuilt.
+    """
+    aggregation_types = aggregation_types or current_stats.aggregations
+    for a in aggregation_types:
+        aggr_cfg = current_stats.aggregations[a]
+        aggregator = aggr_cfg.cls(name=aggr_cfg.name, **aggr_cfg.params)
+        if not aggregator.totals:
+            continue
+        count = aggregator.rebuild_totals()
+        click.echo("{}: {} totals rebuilt".format(a, count))
+
+
+@stats.group()
+def benchmark():
+    """Benchmark commands."""
+
+
+def _format_latencies(latencies):
+    return ", ".join("{} {}ms".format(k, v) for k, v in latencies.items())
+
+
+@benchmark.command("run")
+@click.argument("event-type")
+@click.option("--events", "-n", default=10000, help="Number of synthetic events.")
+@click.option(
+    "--start-date",
+    callback=_parse_date,
+    help="Date of the first event (default: 2000-01-01).",
+)
+@click.option("--days", default=1, help="Number of days spanned by the events.")
+@click.option("--batch-size", default=500, help="Number of events per publishing.")
+@click.option("--queries", default=100, help="Number of runs of each query.")
+@click.option("--seed", default=0, help="Seed of the synthetic events.")
+@click.option(
+    "--in-memory",
+    is_flag=True,
+    help="Use an in-memory search client instead of the search cluster.",
+)
+@click.option(
+    "--json",
+    "json_path",
+    type=click.Path(dir_okay=False, writable=True),
+    help="File to which the reports are written.",
+)
+@click.confirmation_option(
+    prompt="The synthetic events are processed along with the queued events, "
+    "and deleted afterwards with their aggregations. "
+    "Are you sure you want to run the benchmark?"
+)
+@with_appcontext
+def _benchmark_run(
+    event_type,
+    events=10000,
+    start_date=None,
+    days=1,
+    batch_size=500,
+    queries=100,
+    seed=0,
+    in_memory=False,
+    json_path=None,
+):
+    """Benchmark the processing, aggregations and queries of an event type."""
+    if event_type not in current_stats.events:
+        raise click.BadParameter(
+            "Invalid event type: {}. Valid values: {}".format(
+                event_type, ", ".join(current_stats.events)
+            ),
+            param_hint="EVENT_TYPE",
+        )
+    if start_date and not start_date.tzinfo:
+        start_date = start_date.replace(tzinfo=timezone.utc)
+    runner = EventsBenchmark(
+        event_type,
+        events=events,
+        start_date=start_date,
+        days=days,
+        batch_size=batch_size,
+        queries=queries,
+        seed=seed,
+    )
+    with in_memory_search() if in_memory else nullcontext():
+        try:
+            reports = runner.run()
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    for report in reports:
+        line = "{stage}: {count} {unit} in {seconds}s".format(**report)
+        if report["per_second"] is not None:
+            line += " ({}/s)".format(report["per_second"])
+        if report.get("errors"):
+            line += ", {} errors".format(report["errors"])
+        click.echo(line)
+        if report["latencies"]:
+            click.echo("    latency: " + _format_latencies(report["latencies"]))
+        for name, latencies in report.get("queries", {}).items():
+            click.echo("    {}: {}".format(name, _format_latencies(latencies)))
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+def _format_seconds(seconds):
+    return "{}s".format(seconds) if seconds is not None else "unknown"
+
+
+@stats.command("status")
+@click.option("--json", "as_json", is_flag=True, help="Print the status in JSON.")
+@with_appcontext
+def _status(as_json=False):
+    """Report the backlog of the events and the lag of the aggregations."""
+    status = get_status()
+    if as_json:
+        click.echo(json.dumps(status, indent=2))
+        return
+
+    click.echo("events:")
+    for event_type, event in status["events"].items():
+        depth = event["queue_depth"]
+        click.echo(
+            " - {}: {} queued, oldest queued event age {}, "
+            "latest event {} (age {})".format(
+                event_type,
+                depth if depth is not None else "unknown",
+                _format_seconds(event["oldest_queued_event_age"]),
+                event["latest_event"] or "none",
+                _format_seconds(event["latest_event_age"]),
+            )
+        )
+    click.echo("aggregations:")
+    for name, aggregation in status["aggregations"].items():
+        click.echo(
+            " - {}: bookmark {}, lag {}, catch-up {}".format(
+                name,
+                aggregation["bookmark"] or "none",
+                _format_seconds(aggregation["lag"]),
+                _format_seconds(aggregation["catch_up"]),
+            )
+        )
@@ -0,0 +1,127 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Coalescing of identical concurrent statistics queries."""
+
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from copy import deepcopy
+
+
+class _Call(object):
+    """An in-flight query shared by all the requests waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class QueryCoalescer(object):
+    """Single-flight execution of identical statistics queries.
+
+    The first request for a given statistic and set of parameters runs the
+    query, while identical requests arriving in the meantime wait for its
+    result instead of hitting the search cluster again.
+
+    Within a process the waiting is done on a thread event. If a ``cache`` is
+    given, the coalescing also works across processes: the leader takes a
+    short-lived lock in the cache and stores its result there, and the leaders
+    of the other processes poll for it instead of running the query.
+    """
+
+    def __init__(self, cache=None, timeout=10, poll_interval=0.05):
+        """Constructor.
+
+        :param cache: optional cache (e.g. ``current_cache``) used to share
+            locks and results between processes.
+        :param timeout: lifetime in seconds of the cache lock and result, and
+            the maximum time to wait for another process' result.
+        :param poll_interval: interval in seconds between two checks for the
+            result of another process.
+        """
+        self.cache = cache
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.hits = Counter()
+        """Number of queries per statistic served with the result of another."""
+
+    @staticmethod
+    def build_key(stat, params):
+        """Build the normalized key of a query."""
+        normalized = json.dumps(
+            {"stat": stat, "params": params or {}}, sort_keys=True, default=str
+        )
+        return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+    def run(self, stat, params, func):
+        """Run ``func`` once for all concurrent identical queries.
+
+        :param stat: name of the queried statistic.
+        :param params: parameters of the query.
+        :param func: function without arguments running the query.
+        :returns: the result of the query.
+        """
+        key = self.build_key(stat, params)
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            with self._lock:
+                self.hits[stat] += 1
+            return deepcopy(call.result)
+
+        try:
+            call.result = self._run_shared(stat, key, func)
+            # the result is shared with the followers, which may still be
+            # copying it while the caller post-processes its own copy
+            return deepcopy(call.result)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run_shared(self, stat, key, func):
+        """Run the query, coalescing it with the other processes if possible."""
+        if self.cache is None:
+            return func()
+
+        lock_key = "stats:query-lock:{}".format(key)
+        result_key = "stats:query-result:{}".format(key)
+        if self.cache.add(lock_key, True, timeout=self.timeout):
+            try:
+                result = func()
+                self.cache.set(result_key, result, timeout=self.timeout)
+                return result
+            finally:
+                self.cache.delete(lock_key)
+
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            # the result is stored before the lock is released, so checking the
+            # lock first guarantees we don't miss a result that was just set
+            locked = self.cache.get(lock_key)
+            result = self.cache.get(result_key)
+            if result is not None:
+                with self._lock:
+                    self.hits[stat] += 1
+                return result
+            if not locked:
+                # the other process finished without storing a result
+                break
+        return func()
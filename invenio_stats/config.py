@@ -6,7 +6,12 @@
 
 from kombu import Exchange
 
-from .utils import default_permission_factory
+from .utils import (
+    default_metrics_permission_factory,
+    default_permission_factory,
+    default_profiling_permission_factory,
+    default_status_permission_factory,
+)
 
 STATS_REGISTER_RECEIVERS = True
 """Enable the registration of signal receivers.
@@ -35,6 +40,28 @@ is the name of the emitted event.
     during the creation of the event, meaning that if the signal is sent during
     a request they will increase the response time.
 
+``payload_codec``: codec of the messages of the event's queue, ``"json"`` (the
+    default), ``"msgpack"`` or ``"compact"``. The ``"compact"`` codec stores the
+    values of the ``payload_fields`` by position instead of repeating their
+    keys in every message. Both binary codecs require the ``msgpack`` library.
+    The consumers decode each message with the codec it was published with, so
+    the codec can be changed while messages are queued.
+
+``payload_fields``: list of the fields stored by position by the ``"compact"``
+    codec.
+
+``payload_previous_fields``: lists of the ``payload_fields`` used before,
+    whose compact messages are still decoded. When changing the fields during a
+    rolling deployment, list the previous ones here so that the consumers
+    decode the messages of the producers which are not yet updated. The
+    messages which can't be decoded are logged and skipped by the consumers.
+
+``sampler``: sampling policy of the events, e.g.
+    :py:class:`~invenio_stats.sampling.FixedRateSampler` or
+    :py:class:`~invenio_stats.sampling.AdaptiveRateSampler`. The kept events
+    get a ``weight`` field, which the aggregations sum up instead of counting
+    the events.
+
 You can find a sampe of STATS_EVENT configuration in the `registrations.py`
 """
 
@@ -43,6 +70,27 @@ STATS_AGGREGATIONS = {}
 
 
 STATS_QUERIES = {}
+"""Enabled statistics queries.
+
+Each key is the name of a statistic which can be requested through the REST
+API, and each value contains the query's ``cls`` and its constructor
+``params`` (which include the ``timeout`` and ``request_timeout`` of the
+search requests, see :py:class:`~invenio_stats.queries.Query`), and
+optionally:
+
+``permission_factory``: permission factory of the statistic, used by the
+    default ``STATS_PERMISSION_FACTORY``.
+
+``aggregations``: names of the aggregations whose results the query reads. By
+    default, these are the aggregations writing to the query's ``index``. The
+    latest bookmark of these aggregations is used to compute the ``ETag`` of
+    the responses, and the ``Last-Modified`` header of the GET responses.
+
+``max_age``: number of seconds during which the GET responses for the
+    statistic can be cached by clients, sent in the ``Cache-Control`` header.
+    The POST responses are not cached, but can be revalidated by sending their
+    ``ETag`` in the ``If-None-Match`` header of the same request.
+"""
 
 
 STATS_PERMISSION_FACTORY = default_permission_factory
@@ -72,6 +120,19 @@ STATS_REGISTER_INDEX_TEMPLATES = False
 Default behaviour will register the templates as search templates.
 """
 
+STATS_TEMPLATES_VARIANT = None
+"""Variant of the events and aggregations templates, e.g. ``"performance"``.
+
+The templates are looked up in the ``<variant>`` subpackage of the templates
+of each event and aggregation, falling back to the default templates if it
+doesn't exist. The ``"performance"`` variant of the contrib templates sorts the
+indices on ``timestamp`` and ``unique_id``, disables the ``doc_values`` of the
+event fields which are only filtered on, and uses a 30s refresh interval. It
+only applies to the indices created after it is enabled. The finished
+aggregations indices can also be compressed with
+``STATS_EVENTS_PRUNE_CODEC``.
+"""
+
 STATS_EVENTS_UTC_DATETIME_ENABLED = False
 """Enable timezone-aware UTC datetimes for event timestamps.
 
@@ -79,3 +140,248 @@ When set to ``False`` (default), naive UTC datetimes are used (tzinfo is
 stripped via ``datetime.replace(tzinfo=None)``). Set to ``True`` to use
 timezone-aware UTC datetimes with explicit UTC timezone information.
 """
+
+STATS_QUERY_COALESCING = False
+"""Coalesce identical concurrent statistics queries.
+
+Disabled by default. When set to ``True``, concurrent requests for the same
+statistic with the same parameters are served by a single search query: the
+first request runs it and the others wait for its result.
+"""
+
+STATS_QUERY_COALESCING_CACHE = False
+"""Coalesce identical statistics queries across processes.
+
+When set to ``True``, a short-lived lock and the query result are shared via
+Invenio-Cache, so that identical queries running in different processes (e.g.
+different API workers) are also coalesced.
+"""
+
+STATS_QUERY_COALESCING_TIMEOUT = 10
+"""Lifetime in seconds of the coalescing lock and of the shared result.
+
+This is also the maximum time a process waits for the result of another one,
+before running the query itself.
+
+The bookmarks from which the ``ETag`` of the responses are derived are also
+cached for this time.
+"""
+
+STATS_EXPORT_PAGE_SIZE = 1000
+"""Number of rows fetched per search query when exporting a statistic."""
+
+STATS_QUERY_PROFILING_PERMISSION_FACTORY = default_profiling_permission_factory
+"""Permission factory of the statistics queries profiling.
+
+Requests to the statistics REST API with the ``profile`` query argument (e.g.
+``POST /stats?profile=1``) get the timings of each statistic (build, search,
+post-processing, permission check), the search ``took`` and transport times
+and the shard counts in the ``_profile`` field of the response. With
+``profile=search``, the search engine's ``profile`` output is included too.
+
+This function has the same signature as ``STATS_PERMISSION_FACTORY``. By
+default, profiling is denied to everyone.
+"""
+
+STATS_QUERY_PROFILING_LOG = False
+"""Log the profile of every statistics query.
+
+When set to ``True``, all the statistics queries are profiled and their timings
+are logged as ``INFO`` records, with the profile in the ``stats_profile``
+attribute of the record.
+"""
+
+STATS_QUERY_STALE_RESULTS = False
+"""Serve the last result of a statistic when the search cluster is unavailable.
+
+When set to ``True``, the results of the statistics queries are kept in the
+cache. If a query then fails because the search cluster is unavailable (e.g.
+connection errors or timeouts), the last result of the statistic is returned
+with ``"stale": true`` instead of failing the whole response. Statistics
+without any kept result are returned as an ``error`` message.
+
+Query timeouts are configured per statistic with the ``timeout`` and
+``request_timeout`` parameters of the query class.
+"""
+
+STATS_QUERY_STALE_RESULTS_TIMEOUT = 86400
+"""Number of seconds during which the last result of a statistic is kept."""
+
+STATS_EMIT_BUFFER = False
+"""Publish the events emitted by the signal receivers in the background.
+
+When set to ``True``, the events are not published to the queue by the
+request's thread, but buffered and published in batches by a background
+thread of each process. The buffered events are lost if the process is killed.
+"""
+
+STATS_EMIT_BUFFER_SIZE = 10000
+"""Maximum number of buffered events per process."""
+
+STATS_EMIT_BUFFER_BATCH_SIZE = 100
+"""Number of buffered events after which they are published."""
+
+STATS_EMIT_BUFFER_FLUSH_INTERVAL = 1.0
+"""Maximum time in seconds during which an event is buffered."""
+
+STATS_EMIT_BUFFER_OVERFLOW = "drop"
+"""Policy applied to the new events when the buffer is full.
+
+- ``"drop"``: the events are discarded.
+- ``"block"``: the request waits until there is room in the buffer.
+- ``"spill"``: the events are published directly by the request's thread.
+"""
+
+STATS_EVENTS_SPOOL_PATH = None
+"""Directory of the local spool of events, disabled by default.
+
+When set, the events which could not be published to the message queues (e.g.
+because the broker is unreachable) are appended to a spool on the local disk
+instead of being lost. The spool is drained with the ``invenio stats events
+spool-drain`` command or the ``invenio_stats.tasks.drain_events_spool`` task,
+which must run on the same host.
+"""
+
+STATS_EVENTS_SPOOL_SEGMENT_SIZE = 16 * 1024 * 1024
+"""Size in bytes of the spool segment files."""
+
+STATS_EVENTS_SPOOL_LATENCY = 0.5
+"""Latency budget in seconds of publishing events.
+
+When publishing fails or takes longer than this, the next events are spooled
+directly for ``STATS_EVENTS_SPOOL_COOLDOWN`` seconds.
+"""
+
+STATS_EVENTS_SPOOL_COOLDOWN = 30
+"""Number of seconds during which the events are spooled directly."""
+
+STATS_EVENTS_RETENTION_DAYS = 365
+"""Minimum age in days of the raw events deleted by ``prune_events``.
+
+The ``invenio_stats.tasks.prune_events`` task (and the ``invenio stats events
+prune`` command) deletes the raw events indices whose events are older than
+this, and have been aggregated by all the aggregations of their event.
+"""
+
+STATS_EVENTS_PRUNE_SNAPSHOT_REPOSITORY = None
+"""Snapshot repository in which the raw events are saved before being pruned."""
+
+STATS_EVENTS_PRUNE_EXPORT_PATH = None
+"""Directory to which the raw events are exported before being pruned."""
+
+STATS_EVENTS_PRUNE_CODEC = None
+"""Codec of the aggregations indices force-merged by ``prune_events``.
+
+E.g. ``"best_compression"``, to compress the aggregations indices of the
+periods which are over, without its CPU cost on the indices still written to.
+As the codec of an open index can't be changed, each index is cloned with the
+codec into ``<index>-<codec>``, which then replaces it under its name and
+aliases. The index can be searched meanwhile, but not written to.
+"""
+
+STATS_EVENTS_BACKLOG_HIGH_WATERMARK = None
+"""Depth of an event's queue above which the emitted events are shed.
+
+Disabled by default. When the depth of the queue exceeds this number of
+messages, the ``STATS_EVENTS_BACKLOG_POLICY`` decides which events are still
+emitted. The decisions are counted per event type, reason and outcome in
+``current_stats.backlog_decisions``.
+"""
+
+STATS_EVENTS_BACKLOG_CRITICAL_WATERMARK = None
+"""Depth of an event's queue above which the emitted events are sampled."""
+
+STATS_EVENTS_BACKLOG_SAMPLING_RATE = 0.1
+"""Probability of emitting an event above the critical watermark."""
+
+STATS_EVENTS_BACKLOG_LOW_PRIORITY = []
+"""Event types which are not emitted above the high watermark."""
+
+STATS_EVENTS_BACKLOG_POLICY = "invenio_stats.backpressure.BacklogPolicy"
+"""Class of the policy shedding the events, built with the watermarks."""
+
+STATS_EVENTS_BACKLOG_CHECK_INTERVAL = 5
+"""Number of seconds during which the depth of a queue is kept in memory.
+
+The depth is not retrieved from the broker when events are emitted, but read
+from the cache, where it is recorded by the ``refresh_queue_depths`` task and
+by ``process_events``.
+"""
+
+STATS_EVENTS_BACKLOG_DEPTH_TIMEOUT = 60
+"""Number of seconds after which a recorded depth of a queue is discarded.
+
+The events are not shed while the depth of their queue is unknown, e.g. when
+the ``refresh_queue_depths`` task is not run more often than this.
+"""
+
+STATS_BENCHMARK_EVENT_FACTORIES = {
+    "file-download": "invenio_stats.benchmark.file_download_event",
+    "record-view": "invenio_stats.benchmark.record_view_event",
+}
+"""Factories of the synthetic events of ``invenio stats benchmark``.
+
+Each factory is called with a random number generator and the timestamp of
+the event, and returns the event as built by the event builders of its type.
+"""
+
+STATS_METRICS = False
+"""Enable the metrics of the events processing, aggregations and queries.
+
+The metrics are exported in the Prometheus text format by the
+``/stats/metrics`` endpoint, and can be pushed to a pushgateway by the tasks.
+"""
+
+STATS_METRICS_PERMISSION_FACTORY = default_metrics_permission_factory
+"""Permission factory of the ``/stats/metrics`` endpoint.
+
+The function is called without arguments, and returns the permission needed
+to get the metrics, e.g. checking a token sent by the Prometheus server. By
+default, the metrics are denied to everyone.
+"""
+
+STATS_METRICS_PUSHGATEWAY_URL = None
+"""URL of the Prometheus pushgateway to which the tasks push their metrics."""
+
+STATS_METRICS_PUSHGATEWAY_JOB = "invenio-stats"
+"""Name of the job of the metrics pushed to the pushgateway."""
+
+STATS_METRICS_PUSHGATEWAY_INSTANCE = None
+"""Name of the instance of the metrics pushed to the pushgateway.
+
+By default, the host name. The metrics of each process of a Celery worker are
+pushed to the group of the instance and of the index of the process in the
+pool, which outlive the restarts of the workers. The workers running on the
+same host should thus have different instance names.
+"""
+
+STATS_TRACING_EXPORTER = None
+"""Exporter of the sampled spans of the events and aggregations.
+
+Tracing is disabled by default. The exporter is an object with an
+``export(span)`` method, its import path, or a function building it from the
+application, e.g.::
+
+    from invenio_stats.tracing import FileExporter
+
+    STATS_TRACING_EXPORTER = FileExporter("/var/log/invenio/stats-spans.jsonl")
+"""
+
+STATS_TRACING_SAMPLING_RATE = 0.01
+"""Probability of sampling the trace of an emitted event, batch or interval."""
+
+STATS_STATUS_ENDPOINT = False
+"""Enable the ``/stats/status`` endpoint, reporting the lag of the statistics.
+
+The status is also reported by the ``invenio stats status`` command.
+"""
+
+STATS_STATUS_PERMISSION_FACTORY = default_status_permission_factory
+"""Permission factory of the ``/stats/status`` endpoint.
+
+The function is called without arguments, and returns the permission needed
+to get the status. By default, the status is denied to everyone.
+"""
+
+STATS_STATUS_RECENT_RUNS = 10
+"""Number of recent runs of an aggregation used to estimate its throughput."""
@@ -0,0 +1,4 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""File download aggregations OpenSearch v2 index templates, tuned for aggregations."""
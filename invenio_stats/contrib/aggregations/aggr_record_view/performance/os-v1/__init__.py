@@ -0,0 +1,4 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Record view aggregations OpenSearch v1 index templates, tuned for aggregations."""
@@ -0,0 +1,4 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Record view aggregations Elasticsearch v7 index templates, tuned for aggregations."""
@@ -22,6 +22,19 @@ EVENTS_CONFIG = {
         "params": {
             "preprocessors": [flag_robots, anonymize_user, build_file_unique_id]
         },
+        "payload_fields": [
+            "timestamp",
+            "bucket_id",
+            "file_id",
+            "file_key",
+            "size",
+            "referrer",
+            "ip_address",
+            "user_agent",
+            "user_id",
+            "session_id",
+            "weight",
+        ],
     },
     "record-view": {
         "templates": "invenio_stats.contrib.record_view",
@@ -33,6 +46,18 @@ EVENTS_CONFIG = {
         "params": {
             "preprocessors": [flag_robots, anonymize_user, build_record_unique_id]
         },
+        "payload_fields": [
+            "timestamp",
+            "record_id",
+            "pid_type",
+            "pid_value",
+            "referrer",
+            "ip_address",
+            "user_agent",
+            "user_id",
+            "session_id",
+            "weight",
+        ],
     },
 }
 
@@ -4,20 +4,41 @@
 
 """Invenio module for collecting statistics."""
 
-from collections import namedtuple
+import random
+import threading
+import time
+from collections import Counter, namedtuple
 
 from invenio_base.utils import load_or_import_from_config, obj_or_import_string
+from invenio_cache import current_cache
 from invenio_queues.proxies import current_queues
+from invenio_search import current_search_client
 from werkzeug.utils import cached_property
 
 from . import config
+from .bookmark import BookmarkAPI
+from .buffering import EventBuffer
+from .coalescing import QueryCoalescer
+from .metrics import Metrics, collect_state, push_grouping_key
+from .payloads import build_payload_codec
 from .receivers import build_event_emitter, register_receivers
+from .spool import EventSpool
+from .status import record_published, record_queue_depth, recorded_queue_depth
+from .tracing import Tracer
 
-_Event = namedtuple("Event", ["name", "queue", "templates", "cls", "params"])
+_Event = namedtuple(
+    "Event",
+    ["name", "queue", "templates", "cls", "params", "payload_codec", "sampler"],
+    defaults=(None, None),
+)
 
 _Aggregation = namedtuple("Aggregation", ["name", "templates", "cls", "params"])
 
-_Query = namedtuple("Query", ["name", "cls", "permission_factory", "params"])
+_Query = namedtuple(
+    "Query",
+    ["name", "cls", "permission_factory", "params", "aggregations", "max_age"],
+    defaults=(None, None),
+)
 
 
 class _InvenioStatsState(object):
@@ -28,6 +49,12 @@ class _InvenioStatsState(object):
         self.exchange = app.config["STATS_MQ_EXCHANGE"]
         self._event_emitters = {}
         self._query_objects = {}
+        self._spool_until = 0
+        self._queue_depths = {}
+        self._backlog_lock = threading.Lock()
+        self.backlog_decisions = Counter()
+        """Number of events per ``(event type, reason, outcome)`` of the
+        backlog policy's decisions."""
 
     @property
     def events_config(self):
@@ -63,6 +90,59 @@ class _InvenioStatsState(object):
 
         return self._query_objects[query_name]
 
+    def get_query_aggregations(self, query_name):
+        """Get the names of the aggregations whose results the query reads.
+
+        Unless explicitly configured via the ``aggregations`` key of the query,
+        these are the aggregations writing to the query's index.
+        """
+        query = self.queries[query_name]
+        if query.aggregations is not None:
+            return query.aggregations
+
+        index = query.params.get("index")
+        return [
+            name
+            for name, agg in self.aggregations.items()
+            if index
+            in (
+                "stats-{}".format(agg.params.get("event")),
+                "stats-totals-{}".format(agg.params.get("event")),
+            )
+        ]
+
+    def get_aggregation_bookmark(self, aggregation_name, cached=False):
+        """Get the latest bookmark of an aggregation.
+
+        The bookmarks index is not created if it doesn't exist yet.
+
+        :param cached: reuse the bookmark read during the last
+            ``STATS_QUERY_COALESCING_TIMEOUT`` seconds, so that the bookmarks
+            are not searched on every request.
+        :returns: the date, or ``None`` if the aggregation hasn't run yet.
+        """
+        cache_key = "stats:bookmark:{}".format(aggregation_name)
+        if cached:
+            # the bookmark is wrapped, so that "no bookmark" is cached too
+            cached_bookmark = current_cache.get(cache_key)
+            if cached_bookmark is not None:
+                return cached_bookmark[0]
+
+        agg = self.aggregations[aggregation_name]
+        bookmark_api = BookmarkAPI(
+            agg.params.get("client") or current_search_client,
+            agg.name,
+            agg.params.get("interval", "day"),
+        )
+        bookmark = bookmark_api.find_bookmark(refresh_time=0)
+        if cached:
+            current_cache.set(
+                cache_key,
+                (bookmark,),
+                timeout=self.app.config["STATS_QUERY_COALESCING_TIMEOUT"],
+            )
+        return bookmark
+
     @cached_property
     def events(self):
         """Configured events."""
@@ -79,6 +159,12 @@ class _InvenioStatsState(object):
                 templates=event["templates"],
                 cls=obj_or_import_string(event["cls"]),
                 params={"queue": queue, **event.get("params", {})},
+                payload_codec=build_payload_codec(
+                    event.get("payload_codec", "json"),
+                    event.get("payload_fields"),
+                    event.get("payload_previous_fields", ()),
+                ),
+                sampler=obj_or_import_string(event.get("sampler")),
             )
 
         return result
@@ -115,19 +201,259 @@ class _InvenioStatsState(object):
                 cls=obj_or_import_string(query["cls"]),
                 params=query.get("params", {}),
                 permission_factory=query.get("permission_factory"),
+                aggregations=query.get("aggregations"),
+                max_age=query.get("max_age"),
             )
 
         return result
 
+    @cached_property
+    def query_coalescer(self):
+        """Coalescer of identical concurrent queries, if enabled."""
+        if not self.app.config["STATS_QUERY_COALESCING"]:
+            return None
+        return QueryCoalescer(
+            cache=(
+                current_cache
+                if self.app.config["STATS_QUERY_COALESCING_CACHE"]
+                else None
+            ),
+            timeout=self.app.config["STATS_QUERY_COALESCING_TIMEOUT"],
+        )
+
+    @cached_property
+    def emit_buffer(self):
+        """Buffer of the emitted events, if enabled."""
+        if not self.app.config["STATS_EMIT_BUFFER"]:
+            return None
+        return EventBuffer(
+            self.app,
+            self.publish,
+            max_size=self.app.config["STATS_EMIT_BUFFER_SIZE"],
+            batch_size=self.app.config["STATS_EMIT_BUFFER_BATCH_SIZE"],
+            flush_interval=self.app.config["STATS_EMIT_BUFFER_FLUSH_INTERVAL"],
+            overflow=self.app.config["STATS_EMIT_BUFFER_OVERFLOW"],
+        )
+
+    @cached_property
+    def metrics(self):
+        """Metrics of the events processing, aggregations and queries, if enabled."""
+        if not self.app.config["STATS_METRICS"]:
+            return None
+        return Metrics(collectors=[lambda: collect_state(self)])
+
+    @cached_property
+    def tracer(self):
+        """Tracer of the events and aggregations, if an exporter is configured."""
+        exporter = obj_or_import_string(self.app.config["STATS_TRACING_EXPORTER"])
+        if exporter is None:
+            return None
+        if callable(exporter):
+            exporter = exporter(self.app)
+        return Tracer(
+            exporter, sampling_rate=self.app.config["STATS_TRACING_SAMPLING_RATE"]
+        )
+
+    def push_metrics(self):
+        """Push the metrics to the configured Prometheus pushgateway, if any."""
+        url = self.app.config["STATS_METRICS_PUSHGATEWAY_URL"]
+        if self.metrics is None or not url:
+            return
+        try:
+            self.metrics.push(
+                url,
+                self.app.config["STATS_METRICS_PUSHGATEWAY_JOB"],
+                grouping_key=push_grouping_key(
+                    self.app.config["STATS_METRICS_PUSHGATEWAY_INSTANCE"]
+                ),
+            )
+        except Exception:
+            self.app.logger.warning(
+                "Could not push the statistics metrics to %s", url, exc_info=True
+            )
+
     @cached_property
     def permission_factory(self):
         """Load default permission factory for Buckets collections."""
         return load_or_import_from_config("STATS_PERMISSION_FACTORY", app=self.app)
 
+    @cached_property
+    def profiling_permission_factory(self):
+        """Load the permission factory of the queries profiling."""
+        return load_or_import_from_config(
+            "STATS_QUERY_PROFILING_PERMISSION_FACTORY", app=self.app
+        )
+
+    @cached_property
+    def metrics_permission_factory(self):
+        """Load the permission factory of the metrics endpoint."""
+        return load_or_import_from_config(
+            "STATS_METRICS_PERMISSION_FACTORY", app=self.app
+        )
+
+    @cached_property
+    def status_permission_factory(self):
+        """Load the permission factory of the status endpoint."""
+        return load_or_import_from_config(
+            "STATS_STATUS_PERMISSION_FACTORY", app=self.app
+        )
+
+    @cached_property
+    def event_spool(self):
+        """Local spool of the events which could not be published, if enabled."""
+        path = self.app.config["STATS_EVENTS_SPOOL_PATH"]
+        if not path:
+            return None
+        return EventSpool(
+            path, segment_size=self.app.config["STATS_EVENTS_SPOOL_SEGMENT_SIZE"]
+        )
+
+    @cached_property
+    def backlog_policy(self):
+        """Policy shedding the emitted events of backlogged queues, if enabled."""
+        high_watermark = self.app.config["STATS_EVENTS_BACKLOG_HIGH_WATERMARK"]
+        if high_watermark is None:
+            return None
+        return obj_or_import_string(self.app.config["STATS_EVENTS_BACKLOG_POLICY"])(
+            high_watermark,
+            critical_watermark=self.app.config[
+                "STATS_EVENTS_BACKLOG_CRITICAL_WATERMARK"
+            ],
+            sampling_rate=self.app.config["STATS_EVENTS_BACKLOG_SAMPLING_RATE"],
+            low_priority=self.app.config["STATS_EVENTS_BACKLOG_LOW_PRIORITY"],
+        )
+
+    def refresh_queue_depth(self, event_type):
+        """Get the number of messages in an event's queue from the broker.
+
+        The queue is declared passively, thus this is called in the background,
+        e.g. by the ``refresh_queue_depths`` task, and the depth is recorded
+        for :meth:`queue_depth`.
+
+        :returns: the depth, or ``None`` if it can't be retrieved.
+        """
+        try:
+            queue = current_queues.queues["stats-{}".format(event_type)]
+            _, depth, _ = queue.queue.queue_declare(passive=True)
+        except Exception:
+            self.app.logger.warning(
+                "Could not get the depth of the queue of %s events",
+                event_type,
+                exc_info=True,
+            )
+            return None
+        record_queue_depth(
+            event_type,
+            depth,
+            timeout=self.app.config["STATS_EVENTS_BACKLOG_DEPTH_TIMEOUT"],
+            app=self.app,
+        )
+        interval = self.app.config["STATS_EVENTS_BACKLOG_CHECK_INTERVAL"]
+        self._queue_depths[event_type] = (time.monotonic() + interval, depth)
+        return depth
+
+    def queue_depth(self, event_type):
+        """Get the last recorded number of messages in an event's queue.
+
+        The broker is not called, as the events are emitted in the requests:
+        the depth recorded by :meth:`refresh_queue_depth` is read from the
+        cache, and kept for ``STATS_EVENTS_BACKLOG_CHECK_INTERVAL`` seconds.
+
+        :returns: the depth, or ``None`` if it is unknown.
+        """
+        now = time.monotonic()
+        cached = self._queue_depths.get(event_type)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        depth = recorded_queue_depth(event_type, app=self.app)
+        interval = self.app.config["STATS_EVENTS_BACKLOG_CHECK_INTERVAL"]
+        self._queue_depths[event_type] = (now + interval, depth)
+        return depth
+
+    def apply_backlog_policy(self, event_type, event):
+        """Apply the backlog policy to an event about to be emitted.
+
+        :returns: the event, or ``None`` if it is dropped.
+        """
+        policy = self.backlog_policy
+        if policy is None:
+            return event
+        depth = self.queue_depth(event_type)
+        if depth is None:
+            return event
+
+        reason, rate = policy(event_type, event, depth)
+        kept = rate >= 1 or random.random() < rate
+        with self._backlog_lock:
+            self.backlog_decisions[
+                (event_type, reason, "kept" if kept else "dropped")
+            ] += 1
+        if not kept:
+            return None
+        if rate < 1:
+            event["weight"] = event.get("weight", 1) / rate
+        return event
+
+    def _send(self, event_type, events):
+        """Send events to their queue, encoded with the queue's payload codec."""
+        queue = current_queues.queues["stats-{}".format(event_type)]
+        codec = self.events[event_type].payload_codec
+        if codec.serializer == "json":
+            queue.publish(events)
+        else:
+            with queue.create_producer() as producer:
+                for event in events:
+                    producer.publish(codec.encode(event), serializer=codec.serializer)
+        record_published(event_type, app=self.app)
+
     def publish(self, event_type, events):
-        """Publish events."""
+        """Publish events.
+
+        If the events spool is enabled, the events are spooled when publishing
+        fails. If publishing fails or exceeds its latency budget, the events
+        are also spooled without trying to publish them for a while.
+        """
         assert event_type in self.events
-        current_queues.queues["stats-{}".format(event_type)].publish(events)
+        spool = self.event_spool
+        if spool is None:
+            self._send(event_type, events)
+            return
+
+        if time.monotonic() < self._spool_until:
+            spool.append(event_type, events)
+            return
+
+        cooldown = self.app.config["STATS_EVENTS_SPOOL_COOLDOWN"]
+        start = time.monotonic()
+        try:
+            self._send(event_type, events)
+        except Exception:
+            self.app.logger.warning(
+                "Spooling %d events of type %s, publishing failed",
+                len(events),
+                event_type,
+                exc_info=True,
+            )
+            spool.append(event_type, events)
+            self._spool_until = time.monotonic() + cooldown
+            return
+
+        if time.monotonic() - start > self.app.config["STATS_EVENTS_SPOOL_LATENCY"]:
+            self.app.logger.warning(
+                "Publishing events of type %s is slow, spooling the next events",
+                event_type,
+            )
+            self._spool_until = time.monotonic() + cooldown
+
+    def drain_spool(self, batch_size=1000):
+        """Publish the events of the local spool.
+
+        :returns: the number of published events.
+        """
+        if self.event_spool is None:
+            return 0
+        return self.event_spool.drain(self._send, batch_size=batch_size)
 
     def consume(self, event_type, no_ack=True, payload=True):
         """Comsume all pending events."""
@@ -0,0 +1,1791 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""In-memory stand-ins of the search engine and of the events queues.
+
+:class:`InMemorySearchClient` implements the subset of the search client API
+used by Invenio-Stats, so that the indexers, aggregations, bookmarks and
+queries can be run, profiled and benchmarked without a search cluster:
+
+- the ``index``, ``create``, ``delete`` and ``update`` operations, one by one
+  or in bulk, and the ``get`` and ``mget`` lookups. The scripts of the updates
+  are run by their Python implementation in ``scripts``, e.g. the one of the
+  aggregations' totals;
+- searches (and scrolls) with ``bool``, ``term``, ``terms``, ``range``,
+  ``exists`` and ``ids`` queries, the date math of the search engine, sorting
+  and paging;
+- the ``terms``, ``composite`` and ``date_histogram`` bucket aggregations,
+  and the ``cardinality``, ``top_hits``, ``sum``, ``min``, ``max``, ``avg``,
+  ``value_count``, ``stats``, ``extended_stats`` and ``percentiles`` metrics;
+- the management of the indices, aliases and (legacy or composable) index
+  templates, which are applied when an index is created by a write.
+
+It is not a search engine, though: the documents are searched by scanning
+them (only the ranges of dates are looked up in sorted indexes), the mappings
+are ignored and values are compared as dates when they look like ones, the
+``cardinality`` is exact and the writes are immediately visible, i.e. without
+refresh.
+
+The time spent and the number of calls of each API method are recorded in
+``timings`` and ``calls``, e.g. to tell the time spent in the search engine
+from the time spent processing its results.
+
+:class:`InMemoryQueue` is the matching stand-in of an events queue, consuming
+a list (or any iterable) of events.
+"""
+
+import bisect
+import json
+import re
+import time
+import uuid
+import zlib
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from fnmatch import fnmatchcase
+from functools import lru_cache, wraps
+from math import sqrt
+from types import SimpleNamespace
+
+from dateutil import parser
+from dateutil.relativedelta import relativedelta
+from invenio_search.engine import search
+
+from .aggregations import TOTALS_SCRIPT
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+DAY_MS = 86400000
+
+DATE_RE = re.compile(
+    r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}(?::\d{2}(?::\d{2}(?:[.,]\d+)?)?)?)?"
+    r"(?:Z|[+-]\d{2}(?::?\d{2})?)?"
+)
+"""Format of the string values which are compared as dates."""
+
+DATE_MATH_RE = re.compile(r"([+\-/])(\d*)([yMwdhHms])")
+
+DATE_MATH_UNITS = {
+    "y": "year",
+    "M": "month",
+    "w": "week",
+    "d": "day",
+    "h": "hour",
+    "H": "hour",
+    "m": "minute",
+    "s": "second",
+}
+
+CALENDAR_DELTAS = {
+    "second": relativedelta(seconds=1),
+    "minute": relativedelta(minutes=1),
+    "hour": relativedelta(hours=1),
+    "day": relativedelta(days=1),
+    "week": relativedelta(weeks=1),
+    "month": relativedelta(months=1),
+    "quarter": relativedelta(months=3),
+    "year": relativedelta(years=1),
+}
+
+CALENDAR_INTERVALS = {
+    **{unit: unit for unit in CALENDAR_DELTAS},
+    "1s": "second",
+    "1m": "minute",
+    "1h": "hour",
+    "1d": "day",
+    "1w": "week",
+    "1M": "month",
+    "1q": "quarter",
+    "1y": "year",
+}
+
+FIXED_UNITS_MS = {"ms": 1, "s": 1000, "m": 60000, "h": 3600000, "d": DAY_MS}
+
+_ROUNDED_FIELDS = ("month", "day", "hour", "minute", "second", "microsecond")
+
+_ROUNDING_START = {
+    "year": 0,
+    "month": 1,
+    "day": 2,
+    "hour": 3,
+    "minute": 4,
+    "second": 5,
+}
+
+_SHARDS = {"total": 1, "successful": 1, "skipped": 0, "failed": 0}
+
+
+def _error(cls, status, error, reason):
+    """Build an exception of the search client."""
+    return cls(status, error, {"error": {"type": error, "reason": reason}})
+
+
+def _unsupported(what):
+    return _error(
+        search.exceptions.RequestError,
+        400,
+        "parsing_exception",
+        "{} is not supported by the in-memory client".format(what),
+    )
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _to_ms(dt):
+    """Convert a datetime to milliseconds since the epoch."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
+
+def _from_ms(ms):
+    """Convert milliseconds since the epoch to a datetime."""
+    return EPOCH + timedelta(milliseconds=ms)
+
+
+def _format_ms(ms):
+    """Format a date like the search engine's default date format."""
+    return _from_ms(ms).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+@lru_cache(maxsize=2**16)
+def _parse_date(value):
+    """Parse a date string into milliseconds, or ``None`` if it isn't one."""
+    if not DATE_RE.fullmatch(value):
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            dt = parser.isoparse(value)
+        except ValueError:
+            return None
+    return _to_ms(dt)
+
+
+def _date(value):
+    """Get the date of a value in milliseconds, or ``None`` if it isn't one."""
+    if isinstance(value, str):
+        return _parse_date(value)
+    if isinstance(value, datetime):
+        return _to_ms(value)
+    if isinstance(value, date):
+        return _to_ms(datetime(value.year, value.month, value.day))
+    return None
+
+
+def _is_date_expression(value):
+    """Check if a query value is a date or a date math expression."""
+    if isinstance(value, (datetime, date)):
+        return True
+    return isinstance(value, str) and (
+        value.startswith("now") or "||" in value or _parse_date(value) is not None
+    )
+
+
+def _floor(dt, unit):
+    """Round a datetime down to a calendar unit."""
+    if unit == "week":
+        dt -= timedelta(days=dt.weekday())
+        unit = "day"
+    elif unit == "quarter":
+        dt = dt.replace(month=3 * ((dt.month - 1) // 3) + 1)
+        unit = "month"
+    return dt.replace(
+        **{
+            field: 1 if field in ("month", "day") else 0
+            for field in _ROUNDED_FIELDS[_ROUNDING_START[unit] :]
+        }
+    )
+
+
+def _floor_ms(ms, unit):
+    """Round milliseconds since the epoch down to a calendar unit."""
+    if unit == "second":
+        return ms - ms % 1000
+    if unit == "minute":
+        return ms - ms % 60000
+    if unit == "hour":
+        return ms - ms % 3600000
+    if unit == "day":
+        return ms - ms % DAY_MS
+    if unit == "week":
+        # the epoch was a Thursday
+        day = ms // DAY_MS
+        return (day - (day + 3) % 7) * DAY_MS
+    return _to_ms(_floor(_from_ms(ms), unit))
+
+
+def _date_math(value, round_up=False):
+    """Evaluate a date or date math expression into milliseconds.
+
+    As in the search engine, the roundings go up to the last millisecond of
+    the period with ``round_up``, i.e. for the ``gt`` and ``lte`` bounds.
+    """
+    if not isinstance(value, str):
+        return _date(value)
+    if value.startswith("now"):
+        dt, operations = datetime.now(timezone.utc), value[3:]
+    else:
+        anchor, _, operations = value.partition("||")
+        ms = _parse_date(anchor)
+        if ms is None:
+            raise _error(
+                search.exceptions.RequestError,
+                400,
+                "parse_exception",
+                "failed to parse date field [{}]".format(value),
+            )
+        dt = _from_ms(ms)
+    for operator, amount, unit in DATE_MATH_RE.findall(operations):
+        unit = DATE_MATH_UNITS[unit]
+        if operator == "/":
+            dt = _floor(dt, unit)
+            if round_up:
+                dt = dt + CALENDAR_DELTAS[unit] - timedelta(milliseconds=1)
+        else:
+            delta = CALENDAR_DELTAS[unit] * int(amount or 1)
+            dt = dt + delta if operator == "+" else dt - delta
+    return _to_ms(dt)
+
+
+def _date_range(bounds):
+    """Get the inclusive bounds in milliseconds of a range of dates."""
+    low = high = None
+    if "gte" in bounds:
+        low = _date_math(bounds["gte"])
+    if "gt" in bounds:
+        low = _date_math(bounds["gt"], round_up=True) + 1
+    if "lte" in bounds:
+        high = _date_math(bounds["lte"], round_up=True)
+    if "lt" in bounds:
+        high = _date_math(bounds["lt"]) - 1
+    return low, high
+
+
+def _totals_script(ctx, params):
+    """Apply the increments of an aggregation run to a total.
+
+    Python implementation of :data:`~invenio_stats.aggregations.TOTALS_SCRIPT`.
+    """
+    source = ctx["_source"]
+    runs = source.setdefault("runs", [])
+    if params["run_id"] in runs:
+        ctx["op"] = "noop"
+        return
+    for field, increment in params["increments"].items():
+        source[field] = (source.get(field) or 0) + increment
+    source.update(params["fields"])
+    runs.append(params["run_id"])
+    if len(runs) > params["max_runs"]:
+        runs.pop(0)
+
+
+SCRIPTS = {TOTALS_SCRIPT: _totals_script}
+"""Python implementations of the update scripts, by source."""
+
+
+class _Doc(object):
+    """Stored document."""
+
+    __slots__ = ("index", "id", "source", "version")
+
+    def __init__(self, index, id, source, version=1):
+        self.index = index
+        self.id = id
+        self.source = source
+        self.version = version
+
+
+def _values(doc, field):
+    """Get the values of a (dotted) field of a document."""
+    if field == "_index":
+        return [doc.index]
+    if field == "_id":
+        return [doc.id]
+    value = doc.source.get(field)
+    if value is None and "." in field:
+        value = doc.source
+        for part in field.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [v for v in value if v is not None]
+    return [value]
+
+
+def _dates(doc, field):
+    """Get the date values of a field of a document, in milliseconds."""
+    dates = []
+    for value in _values(doc, field):
+        ms = value if isinstance(value, (int, float)) else _date(value)
+        if ms is not None:
+            dates.append(ms)
+    return dates
+
+
+def _first_value(doc, field):
+    """Get the first value of a field as a sortable value."""
+    values = _values(doc, field)
+    if not values:
+        return None
+    value = values[0]
+    if isinstance(value, str):
+        ms = _parse_date(value)
+        if ms is not None:
+            return ms
+    return value
+
+
+def _filter_source(source, includes):
+    """Filter the fields of a document source, like ``_source`` does."""
+    if includes is True or includes is None:
+        return dict(source)
+    if includes is False:
+        return None
+    if isinstance(includes, dict):
+        excludes = set(_as_list(includes.get("excludes")))
+        includes = includes.get("includes")
+        source = {k: v for k, v in source.items() if k not in excludes}
+        if not includes:
+            return source
+    includes = _as_list(includes)
+    return {
+        k: v
+        for k, v in source.items()
+        if any(k == f or fnmatchcase(k, f) for f in includes)
+    }
+
+
+def _hit(doc, includes=None, sort_values=None):
+    """Build the search hit of a document."""
+    hit = {"_index": doc.index, "_id": doc.id, "_score": None}
+    source = _filter_source(doc.source, includes)
+    if source is not None:
+        hit["_source"] = source
+    if sort_values is not None:
+        hit["sort"] = sort_values
+    return hit
+
+
+def _sort_specs(sort):
+    """Normalize a sort definition into a list of (field, descending)."""
+    specs = []
+    for spec in _as_list(sort):
+        if isinstance(spec, str):
+            field, _, order = spec.partition(":")
+            specs.append((field, order == "desc" or field == "_score"))
+            continue
+        for field, order in spec.items():
+            if isinstance(order, dict):
+                order = order.get("order", "asc")
+            specs.append((field, order == "desc"))
+    return [(field, desc) for field, desc in specs if field not in ("_doc", "_score")]
+
+
+def _sort_key(field, desc):
+    """Build the sort key of a field, the missing values being sorted last."""
+    missing = (0,) if desc else (1,)
+    present = 1 if desc else 0
+
+    def key(doc):
+        value = _first_value(doc, field)
+        return missing if value is None else (present, value)
+
+    return key
+
+
+def _sort_docs(docs, sort):
+    """Sort documents, and return them with the sort specifications."""
+    specs = _sort_specs(sort)
+    docs = list(docs)
+    # stable sorts, from the last sorting field to the first one
+    for field, desc in reversed(specs):
+        docs.sort(key=_sort_key(field, desc), reverse=desc)
+    return docs, specs
+
+
+def _term_key(value):
+    """Get the bucket key of a term, and its string representation if any."""
+    if isinstance(value, bool):
+        return int(value), {"key_as_string": "true" if value else "false"}
+    return value, {}
+
+
+def _flatten_settings(settings, prefix=""):
+    """Flatten nested index settings, prefixing them with ``index.``."""
+    flat = {}
+    for key, value in (settings or {}).items():
+        key = prefix + key
+        if isinstance(value, dict):
+            flat.update(_flatten_settings(value, key + "."))
+        else:
+            flat[key] = value
+    if not prefix:
+        flat = {
+            (k if k.startswith("index.") else "index." + k): (
+                v if v is None or isinstance(v, str) else json.dumps(v)
+            )
+            for k, v in flat.items()
+        }
+    return flat
+
+
+def _nest_settings(flat):
+    """Nest flat index settings."""
+    nested = {}
+    for key, value in flat.items():
+        node = nested
+        *parents, leaf = key.split(".")
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[leaf] = value
+    return nested
+
+
+def _merge(target, source):
+    """Merge a partial document into a document."""
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+def _timed(method):
+    """Record the calls and the time spent in an API method."""
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        client = getattr(self, "client", self)
+        key = "{}{}".format(getattr(self, "namespace", ""), name)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            client.timings[key] += time.perf_counter() - start
+            client.calls[key] += 1
+
+    return wrapper
+
+
+class _Index(object):
+    """Documents, settings and aliases of an index."""
+
+    def __init__(self, name, settings=None, mappings=None):
+        self.name = name
+        self.docs = {}
+        self.settings = {
+            "index.number_of_shards": "1",
+            "index.number_of_replicas": "1",
+            "index.provided_name": name,
+            **_flatten_settings(settings),
+        }
+        self.mappings = mappings or {}
+        self.created = time.time()
+        self._sorted = {}
+
+    def put(self, id, source):
+        previous = self.docs.get(id)
+        version = previous.version + 1 if previous else 1
+        self.docs[id] = _Doc(self.name, id, source, version)
+        self._sorted.clear()
+        return previous is None, version
+
+    def remove(self, id):
+        doc = self.docs.pop(id, None)
+        if doc is not None:
+            self._sorted.clear()
+        return doc
+
+    def date_range(self, field, low, high):
+        """Get the documents with a date of a field within inclusive bounds."""
+        if field not in self._sorted:
+            entries = sorted(
+                ((ms, doc) for doc in self.docs.values() for ms in _dates(doc, field)),
+                key=lambda entry: entry[0],
+            )
+            self._sorted[field] = (
+                [ms for ms, _ in entries],
+                [doc for _, doc in entries],
+            )
+        keys, docs = self._sorted[field]
+        start = 0 if low is None else bisect.bisect_left(keys, low)
+        end = len(keys) if high is None else bisect.bisect_right(keys, high)
+        if end - start == len(docs):
+            return list(self.docs.values())
+        # multi-valued fields could list a document several times
+        return list({id(doc): doc for doc in docs[start:end]}.values())
+
+
+class _IndicesClient(object):
+    """Indices management API of the in-memory client."""
+
+    namespace = "indices."
+
+    def __init__(self, client):
+        self.client = client
+
+    @_timed
+    def exists(self, index, **kwargs):
+        """Check if indices or aliases exist."""
+        return bool(self.client._resolve(index, allow_missing=True))
+
+    @_timed
+    def create(self, index, body=None, **kwargs):
+        """Create an index."""
+        if index in self.client._indices:
+            raise _error(
+                search.exceptions.RequestError,
+                400,
+                "resource_already_exists_exception",
+                "index [{}] already exists".format(index),
+            )
+        self.client._create_index(index, body or {})
+        return {"acknowledged": True, "shards_acknowledged": True, "index": index}
+
+    @_timed
+    def delete(self, index, ignore_unavailable=False, **kwargs):
+        """Delete indices."""
+        names = self.client._resolve(index, allow_missing=ignore_unavailable)
+        for name in names:
+            del self.client._indices[name]
+            for indices in self.client._aliases.values():
+                indices.pop(name, None)
+        return {"acknowledged": True}
+
+    @_timed
+    def refresh(self, index=None, **kwargs):
+        """Refresh indices, which is a no-op as the writes are visible."""
+        self.client._resolve(index, allow_missing=True)
+        return {"_shards": _SHARDS}
+
+    @_timed
+    def flush(self, index=None, **kwargs):
+        """Flush indices, which is a no-op."""
+        return {"_shards": _SHARDS}
+
+    @_timed
+    def forcemerge(self, index=None, **kwargs):
+        """Force-merge indices, which is a no-op."""
+        self.client._resolve(index, allow_missing=True)
+        return {"_shards": _SHARDS}
+
+    @_timed
+    def get_settings(self, index=None, name=None, flat_settings=False, **kwargs):
+        """Get the settings of indices."""
+        result = {}
+        for index_name in self.client._resolve(index):
+            settings = self.client._indices[index_name].settings
+            if name:
+                settings = {
+                    k: v
+                    for k, v in settings.items()
+                    if any(fnmatchcase(k, n) for n in name.split(","))
+                }
+            result[index_name] = {
+                "settings": (
+                    dict(settings) if flat_settings else _nest_settings(settings)
+                )
+            }
+        return result
+
+    @_timed
+    def put_settings(self, body, index=None, **kwargs):
+        """Update the settings of indices."""
+        for name in self.client._resolve(index):
+            settings = self.client._indices[name].settings
+            for key, value in _flatten_settings(body).items():
+                if value is None:
+                    settings.pop(key, None)
+                else:
+                    settings[key] = value
+        return {"acknowledged": True}
+
+    @_timed
+    def put_template(self, name, body, **kwargs):
+        """Create or update a legacy index template."""
+        self.client._templates[name] = {
+            "index_patterns": _as_list(body.get("index_patterns")),
+            "order": body.get("order", 0),
+            "settings": body.get("settings", {}),
+            "mappings": body.get("mappings", {}),
+            "aliases": body.get("aliases", {}),
+        }
+        return {"acknowledged": True}
+
+    @_timed
+    def put_index_template(self, name, body, **kwargs):
+        """Create or update a composable index template."""
+        template = body.get("template", {})
+        self.client._templates[name] = {
+            "index_patterns": _as_list(body.get("index_patterns")),
+            "order": body.get("priority", 0),
+            "settings": template.get("settings", {}),
+            "mappings": template.get("mappings", {}),
+            "aliases": template.get("aliases", {}),
+        }
+        return {"acknowledged": True}
+
+    @_timed
+    def exists_template(self, name, **kwargs):
+        """Check if index templates exist."""
+        return any(fnmatchcase(t, name) for t in self.client._templates)
+
+    exists_index_template = exists_template
+
+    @_timed
+    def delete_template(self, name, **kwargs):
+        """Delete an index template."""
+        if self.client._templates.pop(name, None) is None:
+            raise _error(
+                search.exceptions.NotFoundError,
+                404,
+                "index_template_missing_exception",
+                "index_template [{}] missing".format(name),
+            )
+        return {"acknowledged": True}
+
+    delete_index_template = delete_template
+
+    @_timed
+    def exists_alias(self, name, index=None, **kwargs):
+        """Check if aliases exist."""
+        indices = (
+            set(self.client._resolve(index, allow_missing=True)) if index else None
+        )
+        return any(
+            fnmatchcase(alias, n) and (indices is None or set(targets) & indices)
+            for alias, targets in self.client._aliases.items()
+            for n in name.split(",")
+            if targets
+        )
+
+    @_timed
+    def get_alias(self, index=None, name=None, **kwargs):
+        """Get the aliases of indices."""
+        indices = self.client._resolve(index, allow_missing=True) if index else None
+        names = name.split(",") if isinstance(name, str) else name
+        result = {}
+        for alias, targets in self.client._aliases.items():
+            if names and not any(fnmatchcase(alias, n) for n in names):
+                continue
+            for target, options in targets.items():
+                if indices is None or target in indices:
+                    aliases = result.setdefault(target, {"aliases": {}})["aliases"]
+                    aliases[alias] = dict(options)
+        if indices:
+            for target in indices:
+                result.setdefault(target, {"aliases": {}})
+        if not result:
+            raise _error(
+                search.exceptions.NotFoundError,
+                404,
+                "aliases_not_found_exception",
+                "aliases [{}] missing".format(name or index),
+            )
+        return result
+
+    @_timed
+    def put_alias(self, index, name, body=None, **kwargs):
+        """Add indices to an alias."""
+        for target in self.client._resolve(index):
+            self.client._aliases[name][target] = dict(body or {})
+        return {"acknowledged": True}
+
+    @_timed
+    def delete_alias(self, index, name, **kwargs):
+        """Remove indices from an alias."""
+        for target in self.client._resolve(index):
+            self.client._aliases[name].pop(target, None)
+        return {"acknowledged": True}
+
+    @_timed
+    def update_aliases(self, body, **kwargs):
+        """Add and remove aliases."""
+        for action in body.get("actions", []):
+            for operation, params in action.items():
+                indices = self.client._resolve(
+                    params.get("indices") or params.get("index")
+                )
+                aliases = _as_list(params.get("aliases") or params.get("alias"))
+                for alias in aliases:
+                    for target in indices:
+                        if operation == "add":
+                            options = {}
+                            if "is_write_index" in params:
+                                options["is_write_index"] = params["is_write_index"]
+                            self.client._aliases[alias][target] = options
+                        elif operation == "remove":
+                            self.client._aliases[alias].pop(target, None)
+                        else:
+                            raise _unsupported("The {} alias action".format(operation))
+        return {"acknowledged": True}
+
+    @_timed
+    def rollover(self, alias, body=None, new_index=None, dry_run=False, **kwargs):
+        """Roll over the write index of an alias.
+
+        Only the ``max_docs`` and ``max_age`` conditions are evaluated.
+        """
+        old_index = self.client._write_index(alias)
+        index = self.client._indices[old_index]
+        conditions = (body or {}).get("conditions", {})
+        results = {}
+        if "max_docs" in conditions:
+            results["[max_docs: {}]".format(conditions["max_docs"])] = (
+                len(index.docs) >= conditions["max_docs"]
+            )
+        if "max_age" in conditions:
+            max_age = conditions["max_age"]
+            seconds = float(re.match(r"[\d.]+", max_age).group()) * (
+                FIXED_UNITS_MS[re.sub(r"[\d.]+", "", max_age)] / 1000
+            )
+            results["[max_age: {}]".format(max_age)] = (
+                time.time() - index.created >= seconds
+            )
+        rolled_over = not conditions or any(results.values())
+        if new_index is None:
+            match = re.search(r"-(\d+)$", old_index)
+            if match is None:
+                raise _error(
+                    search.exceptions.RequestError,
+                    400,
+                    "illegal_argument_exception",
+                    "index name [{}] does not match pattern '^.*-\\d+$'".format(
+                        old_index
+                    ),
+                )
+            number = int(match.group(1)) + 1
+            new_index = "{}-{:0{}d}".format(
+                old_index[: match.start()], number, len(match.group(1))
+            )
+        if rolled_over and not dry_run:
+            self.client._create_index(new_index, {})
+            targets = self.client._aliases[alias]
+            targets[old_index] = {"is_write_index": False}
+            targets[new_index] = {"is_write_index": True}
+        return {
+            "acknowledged": rolled_over and not dry_run,
+            "old_index": old_index,
+            "new_index": new_index,
+            "rolled_over": rolled_over and not dry_run,
+            "dry_run": dry_run,
+            "conditions": results,
+        }
+
+    @_timed
+    def stats(self, index=None, metric=None, **kwargs):
+        """Get the number of documents of indices."""
+        indices = {}
+        for name in self.client._resolve(index, allow_missing=True):
+            count = len(self.client._indices[name].docs)
+            indices[name] = {"total": {"docs": {"count": count, "deleted": 0}}}
+        total = sum(i["total"]["docs"]["count"] for i in indices.values())
+        return {
+            "_all": {"total": {"docs": {"count": total, "deleted": 0}}},
+            "indices": indices,
+        }
+
+
+class InMemorySearchClient(object):
+    """Search client keeping the documents in memory.
+
+    .. code-block:: python
+
+        client = InMemorySearchClient()
+        aggregator = StatAggregator("file-download-agg", "file-download",
+                                    client=client, field="file_id")
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._indices = {}
+        self._aliases = defaultdict(dict)
+        self._templates = {}
+        self._scrolls = {}
+        self.indices = _IndicesClient(self)
+        self.transport = SimpleNamespace(serializer=search.serializer.JSONSerializer())
+        self.timings = Counter()
+        """Time in seconds spent in each API method."""
+        self.calls = Counter()
+        """Number of calls of each API method."""
+        self.scripts = dict(SCRIPTS)
+        """Python implementations of the update scripts, by source."""
+
+    def reset_stats(self):
+        """Reset the recorded timings and numbers of calls."""
+        self.timings.clear()
+        self.calls.clear()
+
+    def _create_index(self, name, body):
+        """Create an index, applying the matching index templates."""
+        settings, mappings, aliases = {}, {}, {}
+        templates = sorted(
+            (
+                template
+                for template in self._templates.values()
+                if any(fnmatchcase(name, p) for p in template["index_patterns"])
+            ),
+            key=lambda template: template["order"],
+        )
+        for template in templates + [body]:
+            settings = _merge(settings, _flatten_settings(template.get("settings")))
+            mappings = _merge(mappings, template.get("mappings") or {})
+            aliases.update(template.get("aliases") or {})
+        index = self._indices[name] = _Index(name, settings, mappings)
+        for alias, options in aliases.items():
+            self._aliases[alias][name] = dict(options)
+        return index
+
+    def _resolve(self, index, allow_missing=False):
+        """Resolve an index expression into the names of the indices."""
+        if index is None or index in ("", "_all", "*", []):
+            return list(self._indices)
+        names = []
+        for expression in _as_list(index):
+            for part in expression.split(","):
+                if part in self._indices:
+                    matches = [part]
+                elif self._aliases.get(part):
+                    matches = list(self._aliases[part])
+                elif "*" in part:
+                    matches = [n for n in self._indices if fnmatchcase(n, part)] + [
+                        target
+                        for alias, targets in self._aliases.items()
+                        if fnmatchcase(alias, part)
+                        for target in targets
+                    ]
+                else:
+                    if not allow_missing:
+                        raise _error(
+                            search.exceptions.NotFoundError,
+                            404,
+                            "index_not_found_exception",
+                            "no such index [{}]".format(part),
+                        )
+                    matches = []
+                names.extend(m for m in matches if m not in names)
+        return names
+
+    def _write_index(self, name):
+        """Get the index written through an index name or alias."""
+        if name in self._indices:
+            return name
+        targets = self._aliases.get(name)
+        if targets:
+            writes = [
+                t for t, options in targets.items() if options.get("is_write_index")
+            ]
+            if writes:
+                return writes[0]
+            if len(targets) == 1:
+                return next(iter(targets))
+            raise _error(
+                search.exceptions.RequestError,
+                400,
+                "illegal_argument_exception",
+                "no write index is defined for alias [{}]".format(name),
+            )
+        return None
+
+    def _target_index(self, name):
+        """Get the index written through a name, creating it if needed."""
+        target = self._write_index(name)
+        if target is None:
+            self._create_index(name, {})
+            target = name
+        return self._indices[target]
+
+    def _write(self, operation, meta, source):
+        """Apply a write operation, and return the result of the operation."""
+        index = self._target_index(meta["_index"])
+        doc_id = meta.get("_id")
+        result = {"_index": index.name, "_id": doc_id, "_shards": _SHARDS}
+
+        if operation in ("index", "create"):
+            if doc_id is None:
+                doc_id = result["_id"] = uuid.uuid4().hex
+            elif operation == "create" and doc_id in index.docs:
+                return dict(
+                    result,
+                    status=409,
+                    error={
+                        "type": "version_conflict_engine_exception",
+                        "reason": "[{}]: version conflict, document already "
+                        "exists".format(doc_id),
+                    },
+                )
+            created, version = index.put(doc_id, source)
+            return dict(
+                result,
+                _version=version,
+                result="created" if created else "updated",
+                status=201 if created else 200,
+            )
+
+        if operation == "delete":
+            doc = index.remove(doc_id)
+            if doc is None:
+                return dict(result, result="not_found", status=404)
+            return dict(result, _version=doc.version + 1, result="deleted", status=200)
+
+        if operation == "update":
+            current = index.docs.get(doc_id)
+            if "script" in source:
+                return self._script_update(index, result, current, source)
+            if current is not None:
+                updated = _merge(
+                    json.loads(json.dumps(current.source)), source.get("doc", {})
+                )
+            elif source.get("doc_as_upsert"):
+                updated = source.get("doc", {})
+            elif "upsert" in source:
+                updated = source["upsert"]
+            else:
+                return dict(
+                    result,
+                    status=404,
+                    error={
+                        "type": "document_missing_exception",
+                        "reason": "[{}]: document missing".format(doc_id),
+                    },
+                )
+            created, version = index.put(doc_id, updated)
+            return dict(
+                result,
+                _version=version,
+                result="created" if created else "updated",
+                status=201 if created else 200,
+            )
+
+        raise _unsupported("The {} operation".format(operation))
+
+    def _script_update(self, index, result, current, body):
+        """Apply a scripted update, and return the result of the operation."""
+        script = body["script"]
+        run = self.scripts.get(script.get("source"))
+        if run is None:
+            return dict(
+                result,
+                status=400,
+                error={
+                    "type": "illegal_argument_exception",
+                    "reason": "the script is not supported by the in-memory client",
+                },
+            )
+        if current is not None:
+            source = json.loads(json.dumps(current.source))
+        elif "upsert" not in body:
+            return dict(
+                result,
+                status=404,
+                error={
+                    "type": "document_missing_exception",
+                    "reason": "[{}]: document missing".format(result["_id"]),
+                },
+            )
+        elif body.get("scripted_upsert"):
+            source = json.loads(json.dumps(body["upsert"]))
+        else:
+            created, version = index.put(result["_id"], body["upsert"])
+            return dict(result, _version=version, result="created", status=201)
+
+        ctx = {"_source": source, "op": "update"}
+        run(ctx, script.get("params", {}))
+        if ctx["op"] == "noop":
+            if current is not None:
+                result["_version"] = current.version
+            return dict(result, result="noop", status=200)
+        created, version = index.put(result["_id"], ctx["_source"])
+        return dict(
+            result,
+            _version=version,
+            result="created" if created else "updated",
+            status=201 if created else 200,
+        )
+
+    def _copy(self, body):
+        """Copy a document like a round-trip to the search engine would."""
+        serializer = self.transport.serializer
+        return serializer.loads(serializer.dumps(body))
+
+    @_timed
+    def ping(self, **kwargs):
+        """Check if the search engine is available."""
+        return True
+
+    @_timed
+    def info(self, **kwargs):
+        """Get the information of the search engine."""
+        return {
+            "name": "in-memory",
+            "version": {"distribution": "in-memory", "number": "2.0.0"},
+        }
+
+    @_timed
+    def bulk(self, body, index=None, **kwargs):
+        """Apply write operations.
+
+        :param body: the operations, as NDJSON or as a list of dicts.
+        """
+        start = time.perf_counter()
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        if isinstance(body, str):
+            lines = [
+                self.transport.serializer.loads(line) for line in body.splitlines()
+            ]
+        else:
+            lines = [self._copy(line) for line in body]
+
+        items = []
+        lines = iter(lines)
+        for action in lines:
+            ((operation, meta),) = action.items()
+            meta = dict(meta)
+            meta.setdefault("_index", index)
+            source = None if operation == "delete" else next(lines)
+            result = self._write(operation, meta, source)
+            items.append({operation: result})
+        return {
+            "took": int((time.perf_counter() - start) * 1000),
+            "errors": any(
+                "error" in item for result in items for item in result.values()
+            ),
+            "items": items,
+        }
+
+    @_timed
+    def index(self, index, body, id=None, op_type="index", **kwargs):
+        """Index a document."""
+        result = self._write(op_type, {"_index": index, "_id": id}, self._copy(body))
+        if "error" in result:
+            raise _error(
+                search.exceptions.ConflictError,
+                result["status"],
+                result["error"]["type"],
+                result["error"]["reason"],
+            )
+        result.pop("status")
+        return result
+
+    def create(self, index, id, body, **kwargs):
+        """Create a document, failing if it already exists."""
+        return self.index(index, body, id=id, op_type="create", **kwargs)
+
+    @_timed
+    def update(self, index, id, body, **kwargs):
+        """Update a document."""
+        result = self._write("update", {"_index": index, "_id": id}, self._copy(body))
+        if "error" in result:
+            cls = (
+                search.exceptions.NotFoundError
+                if result["status"] == 404
+                else search.exceptions.RequestError
+            )
+            raise _error(
+                cls,
+                result["status"],
+                result["error"]["type"],
+                result["error"]["reason"],
+            )
+        result.pop("status")
+        return result
+
+    @_timed
+    def delete(self, index, id, **kwargs):
+        """Delete a document."""
+        names = self._resolve(index)
+        for name in names:
+            doc = self._indices[name].remove(id)
+            if doc is not None:
+                return {"_index": name, "_id": id, "result": "deleted"}
+        raise _error(
+            search.exceptions.NotFoundError,
+            404,
+            "not_found",
+            "document [{}] not found".format(id),
+        )
+
+    def _get(self, index, id, includes=None):
+        """Get a document from an index or alias."""
+        for name in self._resolve(index, allow_missing=True):
+            doc = self._indices[name].docs.get(id)
+            if doc is not None:
+                result = _hit(doc, includes)
+                result.pop("_score")
+                return dict(result, _version=doc.version, found=True)
+        return {"_index": index, "_id": id, "found": False}
+
+    @_timed
+    def get(self, index, id, _source=None, **kwargs):
+        """Get a document."""
+        self._resolve(index)
+        doc = self._get(index, id, _source)
+        if not doc["found"]:
+            raise search.exceptions.NotFoundError(404, "not_found", doc)
+        return doc
+
+    @_timed
+    def exists(self, index, id, **kwargs):
+        """Check if a document exists."""
+        return self._get(index, id)["found"]
+
+    @_timed
+    def mget(self, body, index=None, _source=None, **kwargs):
+        """Get several documents."""
+        specs = body.get("docs") or [{"_id": id} for id in body.get("ids", [])]
+        return {
+            "docs": [
+                self._get(
+                    spec.get("_index", index),
+                    spec["_id"],
+                    spec.get("_source", _source),
+                )
+                for spec in specs
+            ]
+        }
+
+    def _compile(self, query):
+        """Compile a query into a predicate on documents."""
+        if not query:
+            return lambda doc: True
+        ((kind, spec),) = query.items()
+
+        if kind == "match_all":
+            return lambda doc: True
+        if kind == "match_none":
+            return lambda doc: False
+
+        if kind == "bool":
+            required = [
+                self._compile(clause)
+                for clause in _as_list(spec.get("must")) + _as_list(spec.get("filter"))
+            ]
+            excluded = [
+                self._compile(clause) for clause in _as_list(spec.get("must_not"))
+            ]
+            optional = [
+                self._compile(clause) for clause in _as_list(spec.get("should"))
+            ]
+            minimum = spec.get("minimum_should_match", 0 if required else 1)
+            if not optional:
+                minimum = 0
+
+            def bool_query(doc):
+                return (
+                    all(predicate(doc) for predicate in required)
+                    and not any(predicate(doc) for predicate in excluded)
+                    and (
+                        not minimum
+                        or sum(1 for predicate in optional if predicate(doc))
+                        >= int(minimum)
+                    )
+                )
+
+            return bool_query
+
+        if kind == "ids":
+            ids = set(spec.get("values", []))
+            return lambda doc: doc.id in ids
+
+        if kind == "exists":
+            return lambda doc: bool(_values(doc, spec["field"]))
+
+        ((field, value),) = spec.items()
+
+        if kind == "term":
+            if isinstance(value, dict):
+                value = value["value"]
+            if _is_date_expression(value):
+                low, high = _date_math(value), _date_math(value, round_up=True)
+                return lambda doc: any(low <= ms <= high for ms in _dates(doc, field))
+            return lambda doc: value in _values(doc, field)
+
+        if kind == "terms":
+            terms = set(value)
+            return lambda doc: any(v in terms for v in _values(doc, field))
+
+        if kind == "range":
+            bounds = {
+                op: bound
+                for op, bound in value.items()
+                if op in ("gt", "gte", "lt", "lte") and bound is not None
+            }
+            if any(_is_date_expression(bound) for bound in bounds.values()):
+                low, high = _date_range(bounds)
+                return lambda doc: any(
+                    (low is None or ms >= low) and (high is None or ms <= high)
+                    for ms in _dates(doc, field)
+                )
+
+            def in_range(value):
+                try:
+                    return (
+                        ("gt" not in bounds or value > bounds["gt"])
+                        and ("gte" not in bounds or value >= bounds["gte"])
+                        and ("lt" not in bounds or value < bounds["lt"])
+                        and ("lte" not in bounds or value <= bounds["lte"])
+                    )
+                except TypeError:
+                    return False
+
+            return lambda doc: any(in_range(v) for v in _values(doc, field))
+
+        raise _unsupported("The {} query".format(kind))
+
+    def _date_bounds(self, query):
+        """Find a range of dates of a field constraining all matched documents.
+
+        :returns: a tuple (field, low, high) of inclusive bounds, or ``None``.
+        """
+        if not query:
+            return None
+        ((kind, spec),) = query.items()
+        if kind == "bool":
+            for clause in _as_list(spec.get("filter")) + _as_list(spec.get("must")):
+                bounds = self._date_bounds(clause)
+                if bounds is not None:
+                    return bounds
+            return None
+        if kind == "term":
+            ((field, value),) = spec.items()
+            if isinstance(value, dict):
+                value = value["value"]
+            if _is_date_expression(value):
+                return field, _date_math(value), _date_math(value, round_up=True)
+        if kind == "range":
+            ((field, value),) = spec.items()
+            bounds = {
+                op: bound
+                for op, bound in value.items()
+                if op in ("gt", "gte", "lt", "lte") and bound is not None
+            }
+            if bounds and all(_is_date_expression(b) for b in bounds.values()):
+                return (field, *_date_range(bounds))
+        return None
+
+    def _match(self, index, query):
+        """Get the documents of indices matching a query."""
+        names = self._resolve(index)
+        predicate = self._compile(query)
+        bounds = self._date_bounds(query)
+        docs = []
+        for name in names:
+            index = self._indices[name]
+            candidates = index.date_range(*bounds) if bounds else index.docs.values()
+            docs.extend(doc for doc in candidates if predicate(doc))
+        return docs
+
+    @_timed
+    def count(self, index=None, body=None, **kwargs):
+        """Count the documents matching a query."""
+        docs = self._match(index, (body or {}).get("query"))
+        return {"count": len(docs), "_shards": _SHARDS}
+
+    @_timed
+    def search(
+        self,
+        index=None,
+        body=None,
+        scroll=None,
+        size=None,
+        from_=None,
+        sort=None,
+        _source=None,
+        **kwargs,
+    ):
+        """Search documents, and aggregate them.
+
+        With ``scroll``, the matched documents are kept so that they can be
+        paged through with :py:meth:`scroll`.
+        """
+        start = time.perf_counter()
+        body = body or {}
+        docs = self._match(index, body.get("query"))
+        size = body.get("size", 10) if size is None else size
+        from_ = body.get("from", 0) if from_ is None else from_
+        sort = body.get("sort") if sort is None else sort
+        includes = body.get("_source") if _source is None else _source
+
+        aggs = body.get("aggs") or body.get("aggregations")
+        aggregations = self._aggregate(aggs, docs) if aggs else None
+
+        hits = []
+        if size or scroll:
+            sorted_docs, specs = _sort_docs(docs, sort) if sort else (docs, [])
+            hits = [
+                _hit(
+                    doc,
+                    includes,
+                    [_first_value(doc, field) for field, _ in specs] if specs else None,
+                )
+                for doc in sorted_docs[from_:]
+            ]
+
+        response = {
+            "took": 0,
+            "timed_out": False,
+            "_shards": _SHARDS,
+            "hits": {
+                "total": {"value": len(docs), "relation": "eq"},
+                "max_score": None,
+                "hits": hits[:size],
+            },
+        }
+        if aggregations is not None:
+            response["aggregations"] = aggregations
+        if scroll:
+            scroll_id = uuid.uuid4().hex
+            self._scrolls[scroll_id] = (hits, size, size)
+            response["_scroll_id"] = scroll_id
+        response["took"] = int((time.perf_counter() - start) * 1000)
+        return response
+
+    @_timed
+    def scroll(self, body=None, scroll_id=None, **kwargs):
+        """Get the next page of a scrolled search."""
+        scroll_id = scroll_id or (body or {}).get("scroll_id")
+        if scroll_id not in self._scrolls:
+            raise _error(
+                search.exceptions.NotFoundError,
+                404,
+                "search_context_missing_exception",
+                "No search context found for id [{}]".format(scroll_id),
+            )
+        hits, position, size = self._scrolls[scroll_id]
+        self._scrolls[scroll_id] = (hits, position + size, size)
+        return {
+            "_scroll_id": scroll_id,
+            "took": 0,
+            "timed_out": False,
+            "_shards": _SHARDS,
+            "hits": {
+                "total": {"value": len(hits), "relation": "eq"},
+                "max_score": None,
+                "hits": hits[position : position + size],
+            },
+        }
+
+    @_timed
+    def clear_scroll(self, body=None, scroll_id=None, **kwargs):
+        """Clear scrolled searches."""
+        scroll_ids = _as_list(scroll_id or (body or {}).get("scroll_id"))
+        for scroll_id in scroll_ids:
+            self._scrolls.pop(scroll_id, None)
+        return {"succeeded": True, "num_freed": len(scroll_ids)}
+
+    def _aggregate(self, aggs, docs):
+        """Compute aggregations over documents."""
+        result = {}
+        for name, spec in aggs.items():
+            spec = dict(spec)
+            sub_aggs = spec.pop("aggs", None) or spec.pop("aggregations", None) or {}
+            spec.pop("meta", None)
+            ((kind, params),) = spec.items()
+            handler = getattr(self, "_agg_{}".format(kind), None)
+            if handler is None:
+                raise _unsupported("The {} aggregation".format(kind))
+            result[name] = handler(params, docs, sub_aggs)
+        return result
+
+    def _bucket(self, key, docs, sub_aggs, **extra):
+        """Build an aggregation bucket."""
+        return {
+            "key": key,
+            **extra,
+            "doc_count": len(docs),
+            **self._aggregate(sub_aggs, docs),
+        }
+
+    def _agg_terms(self, params, docs, sub_aggs):
+        """Compute a ``terms`` aggregation.
+
+        The partitions of the terms are computed with a CRC32 hash, instead of
+        the search engine's murmur3 one.
+        """
+        field = params["field"]
+        missing = params.get("missing")
+        groups = defaultdict(list)
+        for doc in docs:
+            values = _values(doc, field)
+            if not values and missing is not None:
+                values = [missing]
+            for value in set(values) if len(values) > 1 else values:
+                groups[value].append(doc)
+
+        include = params.get("include")
+        if isinstance(include, dict) and "partition" in include:
+            partition, count = include["partition"], include["num_partitions"]
+            groups = {
+                value: group
+                for value, group in groups.items()
+                if zlib.crc32(str(value).encode("utf-8")) % count == partition
+            }
+        elif isinstance(include, (list, str)):
+            included = (
+                (lambda v: v in include)
+                if isinstance(include, list)
+                else (lambda v: re.fullmatch(include, str(v)) is not None)
+            )
+            groups = {v: g for v, g in groups.items() if included(v)}
+        exclude = params.get("exclude")
+        if exclude:
+            excluded = (
+                (lambda v: v in exclude)
+                if isinstance(exclude, list)
+                else (lambda v: re.fullmatch(exclude, str(v)) is not None)
+            )
+            groups = {v: g for v, g in groups.items() if not excluded(v)}
+
+        min_doc_count = params.get("min_doc_count", 1)
+        groups = [(v, g) for v, g in groups.items() if len(g) >= min_doc_count]
+        size = params.get("size", 10)
+        order = params.get("order") or {"_count": "desc"}
+        order = order[0] if isinstance(order, list) else order
+        ((order_key, direction),) = order.items()
+
+        if order_key in ("_count", "_key", "_term"):
+            if order_key == "_count":
+                # ties are sorted by ascending terms
+                groups.sort(key=lambda group: group[0])
+                groups.sort(
+                    key=lambda group: len(group[1]), reverse=direction == "desc"
+                )
+            else:
+                groups.sort(key=lambda group: group[0], reverse=direction == "desc")
+            # only the sub-aggregations of the returned buckets are computed
+            buckets = [self._term_bucket(v, g, sub_aggs) for v, g in groups[:size]]
+        else:
+            metric, _, value_key = order_key.partition(".")
+            buckets = [self._term_bucket(v, g, sub_aggs) for v, g in groups]
+            buckets.sort(
+                key=lambda bucket: bucket[metric][value_key or "value"] or 0,
+                reverse=direction == "desc",
+            )
+            buckets = buckets[:size]
+
+        return {
+            "doc_count_error_upper_bound": 0,
+            "sum_other_doc_count": len(docs)
+            - sum(bucket["doc_count"] for bucket in buckets),
+            "buckets": buckets,
+        }
+
+    def _term_bucket(self, value, docs, sub_aggs):
+        """Build the bucket of a term."""
+        key, extra = _term_key(value)
+        return self._bucket(key, docs, sub_aggs, **extra)
+
+    def _agg_composite(self, params, docs, sub_aggs):
+        """Compute a ``composite`` aggregation of ``terms`` sources."""
+        sources = []
+        for source in params.get("sources", []):
+            ((name, spec),) = source.items()
+            ((kind, options),) = spec.items()
+            if kind != "terms":
+                raise _unsupported("The {} composite source".format(kind))
+            sources.append((name, options))
+
+        groups = defaultdict(list)
+        for doc in docs:
+            keys = [()]
+            for _, options in sources:
+                values = _values(doc, options["field"])
+                if not values:
+                    if not options.get("missing_bucket"):
+                        keys = []
+                        break
+                    values = [None]
+                keys = [key + (value,) for key in keys for value in set(values)]
+            for key in keys:
+                groups[key].append(doc)
+
+        def sortable(key):
+            return tuple(
+                (
+                    (0,)
+                    if value is None
+                    else (
+                        (1, value)
+                        if options.get("order", "asc") == "asc"
+                        else (1, _Reversed(value))
+                    )
+                )
+                for value, (_, options) in zip(key, sources)
+            )
+
+        keys = sorted(groups, key=sortable)
+        after = params.get("after")
+        if after:
+            after_key = sortable(tuple(after.get(name) for name, _ in sources))
+            keys = [key for key in keys if sortable(key) > after_key]
+        keys = keys[: params.get("size", 10)]
+
+        buckets = [
+            self._bucket(
+                {name: value for (name, _), value in zip(sources, key)},
+                groups[key],
+                sub_aggs,
+            )
+            for key in keys
+        ]
+        result = {"buckets": buckets}
+        if buckets:
+            result["after_key"] = dict(buckets[-1]["key"])
+        return result
+
+    def _agg_date_histogram(self, params, docs, sub_aggs):
+        """Compute a ``date_histogram`` aggregation (in UTC)."""
+        field = params["field"]
+        interval = (
+            params.get("calendar_interval")
+            or params.get("fixed_interval")
+            or params.get("interval")
+        )
+        unit = CALENDAR_INTERVALS.get(interval)
+        if unit is None:
+            match = re.fullmatch(r"(\d+)(ms|s|m|h|d)", str(interval))
+            if match is None:
+                raise _unsupported("The {} interval".format(interval))
+            step = int(match.group(1)) * FIXED_UNITS_MS[match.group(2)]
+
+            def floor(ms):
+                return ms - ms % step
+
+            def next_key(key):
+                return key + step
+
+        else:
+
+            def floor(ms):
+                return _floor_ms(ms, unit)
+
+            def next_key(key):
+                return _to_ms(_from_ms(key) + CALENDAR_DELTAS[unit])
+
+        groups = defaultdict(list)
+        for doc in docs:
+            for key in {floor(ms) for ms in _dates(doc, field)}:
+                groups[key].append(doc)
+
+        keys = sorted(groups)
+        min_doc_count = params.get("min_doc_count", 0)
+        if keys and min_doc_count == 0:
+            filled, key = [], keys[0]
+            while key <= keys[-1]:
+                filled.append(key)
+                key = next_key(key)
+            keys = filled
+        if params.get("order", {}).get("_key") == "desc":
+            keys.reverse()
+
+        return {
+            "buckets": [
+                self._bucket(
+                    key, groups.get(key, []), sub_aggs, key_as_string=_format_ms(key)
+                )
+                for key in keys
+                if len(groups.get(key, [])) >= min_doc_count
+            ]
+        }
+
+    def _numbers(self, params, docs):
+        """Get the numeric values of a metric's field, and if they are dates."""
+        field = params["field"]
+        missing = params.get("missing")
+        numbers, is_date = [], False
+        for doc in docs:
+            values = _values(doc, field) or ([] if missing is None else [missing])
+            for value in values:
+                if isinstance(value, bool):
+                    numbers.append(int(value))
+                elif isinstance(value, (int, float)):
+                    numbers.append(value)
+                elif isinstance(value, str):
+                    ms = _parse_date(value)
+                    if ms is not None:
+                        is_date = True
+                        numbers.append(ms)
+                    else:
+                        try:
+                            numbers.append(float(value))
+                        except ValueError:
+                            pass
+        return numbers, is_date
+
+    @staticmethod
+    def _metric(value, is_date):
+        result = {"value": None if value is None else float(value)}
+        if is_date and value is not None:
+            result["value_as_string"] = _format_ms(value)
+        return result
+
+    def _agg_sum(self, params, docs, sub_aggs):
+        numbers, _ = self._numbers(params, docs)
+        return {"value": float(sum(numbers))}
+
+    def _agg_min(self, params, docs, sub_aggs):
+        numbers, is_date = self._numbers(params, docs)
+        return self._metric(min(numbers) if numbers else None, is_date)
+
+    def _agg_max(self, params, docs, sub_aggs):
+        numbers, is_date = self._numbers(params, docs)
+        return self._metric(max(numbers) if numbers else None, is_date)
+
+    def _agg_avg(self, params, docs, sub_aggs):
+        numbers, is_date = self._numbers(params, docs)
+        return self._metric(sum(numbers) / len(numbers) if numbers else None, is_date)
+
+    def _agg_value_count(self, params, docs, sub_aggs):
+        return {"value": sum(len(_values(doc, params["field"])) for doc in docs)}
+
+    def _agg_cardinality(self, params, docs, sub_aggs):
+        """Compute an exact ``cardinality`` aggregation."""
+        field = params["field"]
+        missing = params.get("missing")
+        values = set()
+        for doc in docs:
+            doc_values = _values(doc, field)
+            if not doc_values and missing is not None:
+                doc_values = [missing]
+            values.update(
+                json.dumps(v, sort_keys=True) if isinstance(v, (dict, list)) else v
+                for v in doc_values
+            )
+        return {"value": len(values)}
+
+    def _agg_stats(self, params, docs, sub_aggs):
+        numbers, _ = self._numbers(params, docs)
+        if not numbers:
+            return {"count": 0, "min": None, "max": None, "avg": None, "sum": 0.0}
+        return {
+            "count": len(numbers),
+            "min": float(min(numbers)),
+            "max": float(max(numbers)),
+            "avg": sum(numbers) / len(numbers),
+            "sum": float(sum(numbers)),
+        }
+
+    def _agg_extended_stats(self, params, docs, sub_aggs):
+        result = self._agg_stats(params, docs, sub_aggs)
+        numbers, _ = self._numbers(params, docs)
+        if not numbers:
+            return dict(result, sum_of_squares=None, variance=None, std_deviation=None)
+        squares = sum(n * n for n in numbers)
+        variance = max(squares / len(numbers) - result["avg"] ** 2, 0)
+        return dict(
+            result,
+            sum_of_squares=float(squares),
+            variance=variance,
+            std_deviation=sqrt(variance),
+        )
+
+    def _agg_percentiles(self, params, docs, sub_aggs):
+        """Compute exact ``percentiles``, interpolated linearly."""
+        numbers, _ = self._numbers(params, docs)
+        numbers.sort()
+        values = {}
+        for percent in params.get("percents", [1, 5, 25, 50, 75, 95, 99]):
+            if not numbers:
+                values[str(float(percent))] = None
+                continue
+            rank = (len(numbers) - 1) * percent / 100
+            lower = int(rank)
+            upper = min(lower + 1, len(numbers) - 1)
+            values[str(float(percent))] = float(
+                numbers[lower] + (numbers[upper] - numbers[lower]) * (rank - lower)
+            )
+        return {"values": values}
+
+    def _agg_top_hits(self, params, docs, sub_aggs):
+        """Compute a ``top_hits`` aggregation."""
+        size = params.get("size", 3)
+        total = len(docs)
+        sort = params.get("sort")
+        if sort:
+            specs = _sort_specs(sort)
+            if size == 1 and len(specs) == 1 and docs:
+                # avoid sorting the whole bucket for the latest document
+                field, desc = specs[0]
+                present = [d for d in docs if _first_value(d, field) is not None]
+                if present:
+                    pick = max if desc else min
+                    docs = [pick(present, key=lambda d: _first_value(d, field))]
+            else:
+                docs, specs = _sort_docs(docs, sort)
+        else:
+            specs = []
+        return {
+            "hits": {
+                "total": {"value": total, "relation": "eq"},
+                "max_score": None,
+                "hits": [
+                    _hit(
+                        doc,
+                        params.get("_source"),
+                        (
+                            [_first_value(doc, field) for field, _ in specs]
+                            if specs
+                            else None
+                        ),
+                    )
+                    for doc in docs[:size]
+                ],
+            }
+        }
+
+
+class _Reversed(object):
+    """Value sorted in descending order."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+    def __gt__(self, other):
+        return self.value < other.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class InMemoryMessage(object):
+    """Message of an in-memory queue, whose payload is already decoded."""
+
+    content_type = "application/json"
+
+    def __init__(self, payload):
+        """Constructor."""
+        self.payload = payload
+
+
+class InMemoryQueue(object):
+    """Events queue consuming an iterable of events, without a broker."""
+
+    def __init__(self, events, routing_key="stats-record-view"):
+        """Constructor.
+
+        :param events: events of the queue, consumed once if it is an iterator.
+        :param routing_key: routing key of the queue, e.g. ``stats-file-download``.
+        """
+        self.events = events
+        self.routing_key = routing_key
+
+    def consume(self, payload=True):
+        """Consume the events, or messages carrying them."""
+        if payload:
+            return iter(self.events)
+        return map(InMemoryMessage, self.events)
@@ -0,0 +1,273 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Metrics of the events processing, aggregations and queries.
+
+The metrics are kept in memory per process, and exported in the Prometheus
+text format, either scraped from the ``/stats/metrics`` endpoint or pushed to
+a Prometheus pushgateway, e.g. by the Celery workers after each task.
+"""
+
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from billiard.process import current_process
+from flask import current_app
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+"""Content type of the Prometheus text format."""
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+"""Upper bounds in seconds of the buckets of the histograms."""
+
+METRICS = {
+    "events_consumed_total": ("counter", "Events consumed from the queues."),
+    "events_filtered_total": ("counter", "Events discarded by a preprocessor."),
+    "events_flagged_total": ("counter", "Events flagged as robots or machines."),
+    "events_indexed_total": ("counter", "Events indexed in the search cluster."),
+    "events_failed_total": (
+        "counter",
+        "Events which failed to be processed or indexed.",
+    ),
+    "events_preprocessor_seconds": ("histogram", "Time spent per preprocessor."),
+    "aggregation_buckets_total": ("counter", "Aggregated buckets written."),
+    "aggregation_partitions_total": ("counter", "Partitions of aggregated terms."),
+    "aggregation_skipped_total": (
+        "counter",
+        "Buckets skipped as already aggregated before the bookmark.",
+    ),
+    "aggregation_bulk_seconds": (
+        "histogram",
+        "Time spent aggregating and writing an interval.",
+    ),
+    "query_seconds": ("histogram", "Time spent running the statistics queries."),
+    "query_cache_hits_total": (
+        "counter",
+        "Statistics served without running their query.",
+    ),
+    "query_errors_total": ("counter", "Statistics queries which failed."),
+    "backlog_decisions_total": (
+        "counter",
+        "Decisions of the backlog policy on the emitted events.",
+    ),
+    "emit_buffer_dropped_total": (
+        "counter",
+        "Emitted events dropped by the full buffer.",
+    ),
+    "spool_segments": ("gauge", "Segments of the local events spool."),
+    "spool_bytes": ("gauge", "Size of the local events spool."),
+}
+"""Type and description of the metrics, by name without namespace."""
+
+
+def _escape(value):
+    """Escape a label value of the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{{{}}}".format(",".join('{}="{}"'.format(k, _escape(v)) for k, v in labels))
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metrics(object):
+    """In-memory registry of metrics, exported in the Prometheus text format.
+
+    The counters and histograms are updated with :meth:`inc` and
+    :meth:`observe`. Metrics which are already counted elsewhere (e.g. the
+    decisions of the backlog policy) are read by ``collectors`` at export
+    time: functions returning ``(name, labels, value)`` samples.
+    """
+
+    def __init__(self, namespace="invenio_stats", buckets=None, collectors=None):
+        """Constructor.
+
+        :param namespace: prefix of the names of the exported metrics.
+        :param buckets: upper bounds in seconds of the histograms' buckets.
+        :param collectors: functions returning samples read at export time.
+        """
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        self.collectors = list(collectors or [])
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Reset the counters and histograms."""
+        with self._lock:
+            self._counters = defaultdict(float)
+            self._histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """Increment a counter."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, value, **labels):
+        """Observe a value, e.g. a duration in seconds, in a histogram."""
+        key = self._key(name, labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # the count of each bucket, then the sum of the values
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            histogram[index] += 1
+            histogram[-1] += value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of a block of code in a histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def samples(self):
+        """Get the samples of the metrics, by name.
+
+        :returns: a dictionary of ``name -> [(suffix, labels, value)]``.
+        """
+        samples = defaultdict(list)
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, list(v)) for k, v in self._histograms.items())
+        for (name, labels), value in counters:
+            samples[name].append(("", labels, value))
+        for (name, labels), histogram in histograms:
+            cumulated = 0
+            for bound, count in zip(self.buckets + (float("inf"),), histogram):
+                cumulated += count
+                samples[name].append(
+                    ("_bucket", labels + (("le", _format_value(bound)),), cumulated)
+                )
+            samples[name].append(("_sum", labels, histogram[-1]))
+            samples[name].append(("_count", labels, cumulated))
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                samples[name].append(("", tuple(sorted(labels.items())), value))
+        return samples
+
+    def render(self):
+        """Export the metrics in the Prometheus text format."""
+        lines = []
+        for name, samples in sorted(self.samples().items()):
+            full_name = "{}_{}".format(self.namespace, name)
+            metric_type, description = METRICS.get(name, ("untyped", name))
+            lines.append("# HELP {} {}".format(full_name, description))
+            lines.append("# TYPE {} {}".format(full_name, metric_type))
+            for suffix, labels, value in samples:
+                lines.append(
+                    "{}{}{} {}".format(
+                        full_name, suffix, _format_labels(labels), _format_value(value)
+                    )
+                )
+        return "\n".join(lines) + "\n"
+
+    def push(self, url, job, grouping_key=None, timeout=10):
+        """Push the metrics to a Prometheus pushgateway.
+
+        The metrics of the group are replaced, thus each process pushes to
+        its own group, by default the one of :func:`push_grouping_key`.
+
+        :param url: URL of the pushgateway.
+        :param job: name of the job of the pushed metrics.
+        :param grouping_key: labels of the group of the pushed metrics.
+        """
+        grouping_key = grouping_key or push_grouping_key()
+        path = "/metrics/job/{}".format(quote(job, safe=""))
+        for label, value in grouping_key.items():
+            path += "/{}/{}".format(label, quote(str(value), safe=""))
+        request = Request(
+            url.rstrip("/") + path,
+            data=self.render().encode("utf-8"),
+            headers={"Content-Type": CONTENT_TYPE},
+            method="PUT",
+        )
+        with urlopen(request, timeout=timeout) as response:
+            return response.status
+
+
+def push_grouping_key(instance=None):
+    """Get the pushgateway group of the metrics of the current process.
+
+    The group is identified by the instance, and by the index of the process
+    in the pool of the Celery worker, which is reused by the process replacing
+    it. A restarted worker thus pushes to the same groups, instead of leaving
+    new ones behind on the pushgateway.
+
+    :param instance: name of the instance, by default its host name.
+    """
+    index = getattr(current_process(), "index", None)
+    return {
+        "instance": instance or socket.gethostname(),
+        "process": str(index) if index is not None else "main",
+    }
+
+
+def current_metrics():
+    """Get the metrics of the application, if enabled.
+
+    The aggregators can be run without the extension, e.g. in scripts, in
+    which case nothing is measured.
+    """
+    state = current_app.extensions.get("invenio-stats")
+    return state.metrics if state is not None else None
+
+
+def collect_state(state):
+    """Get the samples of the metrics counted by the extension's state."""
+    samples = []
+    for (event_type, reason, outcome), count in list(state.backlog_decisions.items()):
+        samples.append(
+            (
+                "backlog_decisions_total",
+                {"event_type": event_type, "reason": reason, "outcome": outcome},
+                count,
+            )
+        )
+    # don't start the buffer just to tell that it's empty
+    emit_buffer = state.__dict__.get("emit_buffer")
+    if emit_buffer is not None:
+        samples.append(("emit_buffer_dropped_total", {}, emit_buffer.dropped))
+    coalescer = state.__dict__.get("query_coalescer")
+    if coalescer is not None:
+        for stat, count in list(coalescer.hits.items()):
+            samples.append(
+                ("query_cache_hits_total", {"stat": stat, "cache": "coalesced"}, count)
+            )
+    spool = state.event_spool
+    if spool is not None:
+        segments = spool.segments()
+        size = 0
+        for segment in segments:
+            try:
+                size += os.path.getsize(segment)
+            except FileNotFoundError:
+                # drained in the meantime
+                continue
+        samples.append(("spool_segments", {}, len(segments)))
+        samples.append(("spool_bytes", {}, size))
+    return samples
@@ -0,0 +1,152 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Codecs of the event payloads sent through the statistics queues.
+
+Each message carries the content type of the codec it was published with, and
+is decoded accordingly by the consumers. Changing the codec of a queue is thus
+backward compatible: the messages published before the change, e.g. as JSON,
+are still decoded.
+
+The compact payloads are identified by the version of their layout and a hash
+of their fields, so that the consumers only decode the schemas they know. The
+schemas of the fields used before a change can be kept with the
+``payload_previous_fields`` of the event, e.g. during a rolling deployment.
+"""
+
+import hashlib
+
+from kombu.serialization import registry
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+COMPACT_SERIALIZER = "stats-compact"
+"""Name of the kombu serializer of the compact payloads."""
+
+COMPACT_CONTENT_TYPE = "application/x-invenio-stats-compact"
+"""Content type of the compact payloads."""
+
+COMPACT_VERSION = 1
+"""Version of the layout of the compact payloads, first byte of their schema."""
+
+_schemas = {}
+"""Fields of the compact payloads, by schema identifier."""
+
+
+class UnknownPayloadSchema(ValueError):
+    """Compact payload of a schema unknown to the consumer."""
+
+
+def schema_id(fields):
+    """Identifier of the schema of the compact payloads of some fields."""
+    digest = hashlib.sha1("\0".join(fields).encode("utf-8")).digest()
+    return bytes([COMPACT_VERSION]) + digest[:4]
+
+
+class PayloadCodec(object):
+    """Codec publishing the events as they are, with a kombu serializer."""
+
+    def __init__(self, serializer="json"):
+        """Constructor.
+
+        :param serializer: name of the kombu serializer of the messages.
+        """
+        if serializer not in registry.name_to_type:
+            raise ValueError("Unknown payload serializer {}".format(serializer))
+        if serializer == "msgpack" and msgpack is None:
+            raise RuntimeError(
+                "The msgpack payload codec requires the msgpack library."
+            )
+        self.serializer = serializer
+
+    def encode(self, event):
+        """Encode an event into the body of a message."""
+        return event
+
+
+class CompactPayloadCodec(PayloadCodec):
+    """Schema-aware codec packing the events as tuples of values.
+
+    The values of the schema's fields are stored by position, after the schema
+    identifier and a bitmask of the fields present in the event, so that the
+    keys are not repeated in every message. The fields which are not part of
+    the schema are kept in a trailing dict.
+
+    The consumers must know the schema, i.e. use the same events configuration
+    as the producers, or list the producers' fields in their previous fields.
+    """
+
+    def __init__(self, fields, previous_fields=()):
+        """Constructor.
+
+        :param fields: names of the fields stored by position.
+        :param previous_fields: lists of the fields of the previous schemas,
+            whose payloads are still decoded.
+        """
+        if msgpack is None:
+            raise RuntimeError(
+                "The compact payload codec requires the msgpack library."
+            )
+        super().__init__(COMPACT_SERIALIZER)
+        self.fields = tuple(fields)
+        self._field_set = frozenset(self.fields)
+        self.schema_id = schema_id(self.fields)
+        _schemas[self.schema_id] = self.fields
+        for fields in previous_fields:
+            _schemas[schema_id(fields)] = tuple(fields)
+
+    def encode(self, event):
+        """Encode an event into a tuple of values."""
+        mask = 0
+        values = []
+        for position, field in enumerate(self.fields):
+            if field in event:
+                mask |= 1 << position
+                values.append(event[field])
+        extra = {k: v for k, v in event.items() if k not in self._field_set}
+        return [self.schema_id, mask, values, extra]
+
+
+def decode_compact(body):
+    """Decode a compact payload into an event."""
+    schema, mask, values, extra = body
+    fields = _schemas.get(schema)
+    if fields is None:
+        raise UnknownPayloadSchema("Unknown payload schema {}".format(schema.hex()))
+    values = iter(values)
+    event = {
+        field: next(values)
+        for position, field in enumerate(fields)
+        if mask & (1 << position)
+    }
+    event.update(extra)
+    return event
+
+
+def build_payload_codec(codec="json", fields=None, previous_fields=()):
+    """Build the payload codec of an event's queue.
+
+    :param codec: ``"json"``, ``"msgpack"``, ``"compact"`` or the name of any
+        other registered kombu serializer.
+    :param fields: fields stored by position by the compact codec.
+    :param previous_fields: lists of the fields of the previous schemas of the
+        compact codec.
+    """
+    if codec == "compact":
+        if not fields:
+            raise ValueError("The compact payload codec requires payload fields.")
+        return CompactPayloadCodec(fields, previous_fields)
+    return PayloadCodec(codec)
+
+
+if msgpack is not None:
+    registry.register(
+        COMPACT_SERIALIZER,
+        lambda body: msgpack.packb(body, use_bin_type=True),
+        lambda data: decode_compact(msgpack.unpackb(data, raw=False)),
+        content_type=COMPACT_CONTENT_TYPE,
+        content_encoding="binary",
+    )
@@ -8,7 +8,7 @@
 import hashlib
 from datetime import datetime, timezone
 from functools import partial
-from time import mktime
+from time import mktime, perf_counter
 
 from counter_robots import is_machine, is_robot
 from dateutil import parser
@@ -18,6 +18,8 @@ from invenio_search import current_search_client
 from invenio_search.engine import search
 from invenio_search.utils import prefix_index
 
+from .metrics import current_metrics
+from .tracing import NOOP_SPAN, NOOP_TRACER, TRACE_FIELD, TracedBatches, current_tracer
 from .utils import get_anonymization_salt, get_geoip
 
 
@@ -145,6 +147,9 @@ class EventsIndexer(object):
     default_preprocessors = [flag_robots, anonymize_user]
     """Default preprocessors ran on every event."""
 
+    chunk_size = 50
+    """Number of events indexed per bulk request."""
+
     def __init__(
         self,
         queue,
@@ -153,6 +158,7 @@ class EventsIndexer(object):
         client=None,
         preprocessors=None,
         double_click_window=10,
+        rollover=None,
     ):
         """Initialize indexer.
 
@@ -165,10 +171,21 @@ class EventsIndexer(object):
             event before it is indexed. Each function should return the
             processed event. If it returns None, the event is filtered and
             won't be indexed.
+        :param rollover: conditions of the rollover of the events indices,
+            e.g. ``{"max_size": "50gb", "max_docs": 100000000}``. If set, the
+            events are written through the ``<index>-write`` alias instead of
+            in one index per ``suffix`` period, and the write index is rolled
+            over after each run once one of the conditions is met. The new
+            indices are named ``<index>-000001``, ``<index>-000002``... so that
+            they are read through the same alias as the date-suffixed ones.
+            Note that duplicate events (e.g. double clicks) are only merged if
+            they are written to the same index.
         """
         self.queue = queue
         self.client = client or current_search_client
         self.index = prefix_index("{0}-{1}".format(prefix, self.queue.routing_key))
+        # the queues are named after their events, e.g. "stats-record-view"
+        self.event_type = self.queue.routing_key.split("stats-", 1)[-1]
         self.suffix = suffix
 
         # load the preprocessors
@@ -178,20 +195,118 @@ class EventsIndexer(object):
             else self.default_preprocessors
         )
         self.double_click_window = double_click_window
+        self.rollover = rollover
+        self.write_alias = "{0}-write".format(self.index)
+
+    def _measured_preprocess(self, msg, metrics, tracer=None, context=None, batch=None):
+        """Preprocess an event, measuring and tracing each preprocessor.
+
+        :param metrics: metrics of the processing, if enabled.
+        :param tracer: tracer of the processing, if enabled.
+        :param context: context of the trace of the event, if it was traced
+            when emitted.
+        :param batch: span of the batch in which the event is processed.
+        """
+        if metrics is not None:
+            metrics.inc("events_consumed_total", event_type=self.event_type)
+        for preproc in self.preprocessors:
+            name = getattr(preproc, "__name__", type(preproc).__name__)
+            span = NOOP_SPAN
+            if context is not None:
+                span = tracer.start_span(
+                    "events.preprocess",
+                    parent=context,
+                    links=[batch],
+                    event_type=self.event_type,
+                    preprocessor=name,
+                )
+            with span:
+                start = perf_counter()
+                msg = preproc(msg)
+                if metrics is not None:
+                    metrics.observe(
+                        "events_preprocessor_seconds",
+                        perf_counter() - start,
+                        event_type=self.event_type,
+                        preprocessor=name,
+                    )
+                if msg is None:
+                    span.set_attribute("filtered", True)
+            if msg is None:
+                if metrics is not None:
+                    metrics.inc(
+                        "events_filtered_total",
+                        event_type=self.event_type,
+                        preprocessor=name,
+                    )
+                return None
+        if metrics is None:
+            return msg
+        for flag in ("robot", "machine"):
+            if msg.get("is_{}".format(flag)):
+                metrics.inc(
+                    "events_flagged_total", event_type=self.event_type, flag=flag
+                )
+        return msg
+
+    def _decode(self, messages, metrics):
+        """Decode the consumed messages, skipping those which can't be decoded.
+
+        The messages are decoded one by one so that e.g. a message of an
+        unknown payload schema doesn't abort the consumption of the queue.
+        """
+        for message in messages:
+            try:
+                payload = message.payload
+            except Exception:
+                if metrics is not None:
+                    metrics.inc("events_failed_total", event_type=self.event_type)
+                current_app.logger.exception(
+                    "Error while decoding event message of type %s",
+                    message.content_type,
+                )
+                continue
+            yield payload
 
     def actionsiter(self):
         """Iterator."""
-        for msg in self.queue.consume():
+        metrics = current_metrics()
+        tracer = current_tracer()
+        messages = self._decode(self.queue.consume(payload=False), metrics)
+        if tracer is not NOOP_TRACER:
+            messages = TracedBatches(
+                tracer,
+                messages,
+                "events.batch",
+                self.chunk_size,
+                event_type=self.event_type,
+            )
+        for msg in messages:
             try:
-                for preproc in self.preprocessors:
-                    msg = preproc(msg)
-                    if msg is None:
-                        break
+                context = batch = None
+                if tracer is not NOOP_TRACER:
+                    context, batch = messages.context, messages.span
+                else:
+                    # the events may be emitted by an application tracing them
+                    msg.pop(TRACE_FIELD, None)
+                if metrics is None and context is None:
+                    for preproc in self.preprocessors:
+                        msg = preproc(msg)
+                        if msg is None:
+                            break
+                else:
+                    msg = self._measured_preprocess(
+                        msg, metrics, tracer, context, batch
+                    )
                 if msg is None:
                     continue
 
                 ts = parser.parse(msg.get("timestamp"))
-                suffix = ts.strftime(self.suffix)
+                index = (
+                    self.write_alias
+                    if self.rollover
+                    else "{0}-{1}".format(self.index, ts.strftime(self.suffix))
+                )
 
                 # Truncate timestamp to keep only seconds.
                 # This is to improve search engine performances.
@@ -207,14 +322,52 @@ class EventsIndexer(object):
                 yield {
                     "_id": hash_id(ts.isoformat(), msg),
                     "_op_type": "index",
-                    "_index": "{0}-{1}".format(self.index, suffix),
+                    "_index": index,
                     "_source": msg,
                 }
             except Exception:
+                if metrics is not None:
+                    metrics.inc("events_failed_total", event_type=self.event_type)
                 current_app.logger.exception("Error while processing event")
 
+    def ensure_write_index(self):
+        """Create the first rolled over index, if there is no write index."""
+        if self.client.indices.exists_alias(name=self.write_alias):
+            return
+        try:
+            self.client.indices.create(
+                index="{0}-000001".format(self.index),
+                body={"aliases": {self.write_alias: {"is_write_index": True}}},
+            )
+        except search.exceptions.RequestError:
+            # the index was created concurrently
+            if not self.client.indices.exists_alias(name=self.write_alias):
+                raise
+
     def run(self):
         """Process events queue."""
-        return search.helpers.bulk(
-            self.client, self.actionsiter(), stats_only=True, chunk_size=50
-        )
+        if self.rollover:
+            self.ensure_write_index()
+        metrics = current_metrics()
+        try:
+            result = search.helpers.bulk(
+                self.client,
+                self.actionsiter(),
+                stats_only=True,
+                chunk_size=self.chunk_size,
+            )
+        except search.helpers.BulkIndexError as e:
+            if metrics is not None:
+                metrics.inc(
+                    "events_failed_total", len(e.errors), event_type=self.event_type
+                )
+            raise
+        if metrics is not None:
+            indexed, failed = result
+            metrics.inc("events_indexed_total", indexed, event_type=self.event_type)
+            metrics.inc("events_failed_total", failed, event_type=self.event_type)
+        if self.rollover:
+            self.client.indices.rollover(
+                alias=self.write_alias, body={"conditions": self.rollover}
+            )
+        return result
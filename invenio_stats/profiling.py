@@ -0,0 +1,137 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Profiling of statistics queries.
+
+The profile of the query being run is kept in a context variable, so that the
+query objects, which are shared between requests, don't hold any state. Query
+classes record their stages with :py:func:`profile_stage` and run their search
+requests through :py:func:`profiled_search` or :py:func:`profiled_execute`,
+which are no-ops when no profile is active.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current_profile = ContextVar("invenio_stats_query_profile", default=None)
+
+
+class QueryProfile(object):
+    """Timings of the run of a statistic query."""
+
+    def __init__(self, stat, search_profile=False):
+        """Constructor.
+
+        :param stat: name of the profiled statistic.
+        :param search_profile: if True, the search engine's ``profile`` output
+            is included in the profile.
+        """
+        self.stat = stat
+        self.search_profile = search_profile
+        self.timings = {}
+        self.searches = []
+
+    @contextmanager
+    def activate(self):
+        """Make this profile the one recording the current query."""
+        token = _current_profile.set(self)
+        try:
+            yield self
+        finally:
+            _current_profile.reset(token)
+
+    @contextmanager
+    def timer(self, stage):
+        """Measure the time spent in a stage, in milliseconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.timings[stage] = self.timings.get(stage, 0) + elapsed
+
+    def add_search(self, response, elapsed):
+        """Record a search request.
+
+        :param response: the search response, as a dict.
+        :param elapsed: total time of the request in milliseconds.
+        """
+        took = response.get("took")
+        entry = {
+            "took": took,
+            "transport": round(elapsed - took, 3) if took is not None else None,
+            "shards": response.get("_shards"),
+        }
+        if "profile" in response:
+            entry["profile"] = response["profile"]
+        self.searches.append(entry)
+
+    def to_dict(self, search_profile=True):
+        """Dump the profile.
+
+        :param search_profile: if False, the search engine's ``profile``
+            output is left out.
+        """
+        return {
+            "stat": self.stat,
+            "timings": {stage: round(t, 3) for stage, t in self.timings.items()},
+            "searches": [
+                (
+                    entry
+                    if search_profile
+                    else {k: v for k, v in entry.items() if k != "profile"}
+                )
+                for entry in self.searches
+            ],
+        }
+
+
+def get_current_profile():
+    """Get the profile of the query being run, if any."""
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_stage(stage):
+    """Measure a stage of the current query, if it is profiled."""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    with profile.timer(stage):
+        yield
+
+
+def profiled_search(client, **kwargs):
+    """Run a search request with the raw client, recording it if profiled."""
+    profile = _current_profile.get()
+    if profile is None:
+        return client.search(**kwargs)
+
+    if profile.search_profile:
+        kwargs["body"] = {**kwargs["body"], "profile": True}
+    start = time.perf_counter()
+    with profile.timer("search"):
+        response = client.search(**kwargs)
+    profile.add_search(response, (time.perf_counter() - start) * 1000)
+    return response
+
+
+def profiled_execute(search):
+    """Execute a DSL search, recording it if profiled.
+
+    :returns: the search response, as a dict.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return search.execute().to_dict()
+
+    if profile.search_profile:
+        search = search.extra(profile=True)
+    start = time.perf_counter()
+    with profile.timer("search"):
+        response = search.execute().to_dict()
+    profile.add_search(response, (time.perf_counter() - start) * 1000)
+    return response
@@ -3,29 +3,71 @@
 
 """Query processing classes."""
 
-from datetime import datetime
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta, timezone
 
 import dateutil.parser
+from dateutil.relativedelta import relativedelta
+from invenio_cache import current_cache
 from invenio_search import current_search_client
-from invenio_search.engine import dsl
-from invenio_search.utils import build_alias_name
+from invenio_search.engine import dsl, search
+from invenio_search.utils import build_alias_name, prefix_index
 
+from .aggregations import filter_robots
+from .bookmark import format_range_dt
 from .errors import InvalidRequestInputError
+from .profiling import profile_stage, profiled_execute, profiled_search
+from .proxies import current_stats
 from .utils import format_datetime_iso
 
 
 class Query(object):
     """Search query."""
 
-    def __init__(self, name, index, client=None, *args, **kwargs):
+    def __init__(
+        self,
+        name,
+        index,
+        client=None,
+        timeout=None,
+        request_timeout=None,
+        *args,
+        **kwargs,
+    ):
         """Constructor.
 
         :param index: queried index.
         :param client: search client used to query.
+        :param timeout: time (e.g. ``"2s"``, or a number of seconds) after which
+            the search engine returns the results collected so far. Such
+            partial results are flagged with ``timed_out``.
+        :param request_timeout: time in seconds after which the requests to the
+            search engine are aborted.
         """
         self.name = name
         self.index = build_alias_name(index)
         self.client = client or current_search_client
+        if isinstance(timeout, (int, float)):
+            timeout = "{}ms".format(int(timeout * 1000))
+        self.timeout = timeout
+        self.request_timeout = request_timeout
+
+    @property
+    def request_params(self):
+        """Parameters of the requests sent with the raw search client."""
+        if self.request_timeout:
+            return {"request_timeout": self.request_timeout}
+        return {}
+
+    def with_timeouts(self, search):
+        """Apply the timeouts of the query to a DSL search."""
+        if self.timeout:
+            search = search.extra(timeout=self.timeout)
+        if self.request_timeout:
+            search = search.params(request_timeout=self.request_timeout)
+        return search
 
     def extract_date(self, date):
         """Extract date from string if necessary.
@@ -46,12 +88,278 @@ class Query(object):
         raise NotImplementedError()
 
 
+def encode_cursor(after_key):
+    """Encode the key of the last exported bucket into a cursor token."""
+    return urlsafe_b64encode(json.dumps(after_key).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Decode a cursor token into the key of the last exported bucket."""
+    try:
+        return json.loads(urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise InvalidRequestInputError("Invalid export cursor.")
+
+
+class RecentEvents(object):
+    """Raw events of an aggregation which have not been aggregated yet.
+
+    Aggregations trail the raw events by up to their run interval. Queries
+    reading the aggregations can use this class to also count the raw events
+    indexed since the latest bookmark of the aggregation, with a cheap search
+    on the events index which is merged in their results.
+
+    Only the metrics summed up by the query (i.e. ``sum``) and computed by the
+    aggregation (or its ``count``) can be completed with the raw events.
+    """
+
+    def __init__(self, aggregation, max_window=86400):
+        """Constructor.
+
+        :param aggregation: name of the aggregation owning the queried index.
+        :param max_window: maximum age in seconds of the raw events which are
+            taken into account, bounding the cost of the raw events search if
+            the aggregation is lagging behind.
+        """
+        self.aggregation_name = aggregation
+        self.max_window = timedelta(seconds=max_window)
+
+    @property
+    def aggregation(self):
+        """Configuration of the aggregation."""
+        return current_stats.aggregations[self.aggregation_name]
+
+    def raw_field(self, field):
+        """Get the raw events field from which an aggregated field is built."""
+        params = self.aggregation.params
+        if field == params.get("field"):
+            return field
+        source = params.get("copy_fields", {}).get(field)
+        return source if isinstance(source, str) else None
+
+    def raw_metric(self, field):
+        """Get the raw events metric from which an aggregated field is built.
+
+        :returns: ``"count"`` for the count of events, the metric tuple of the
+            aggregation, or ``None`` if the field isn't computed from events.
+        """
+        if field == "count":
+            return "count"
+        return self.aggregation.params.get("metric_fields", {}).get(field)
+
+    def as_aggregated_doc(self, doc):
+        """Convert a raw event into the shape of an aggregation document."""
+        params = self.aggregation.params
+        result = {params.get("field"): doc.get(params.get("field"))}
+        for destination, source in params.get("copy_fields", {}).items():
+            if isinstance(source, str) and source in doc:
+                result[destination] = doc[source]
+        return result
+
+    def build_search(self, client, start_date, end_date, filters):
+        """Build the search over the events which are not aggregated yet.
+
+        :param filters: Dict of "aggregated field" -> "value" to filter on.
+        :returns: the search, or ``None`` if the events can't be filtered.
+        """
+        params = self.aggregation.params
+        raw_filters = {self.raw_field(f): value for f, value in filters.items()}
+        if None in raw_filters:
+            return None
+
+        now = datetime.now(timezone.utc)
+        lower_limit = now - self.max_window
+        bookmark = current_stats.get_aggregation_bookmark(self.aggregation_name)
+        if bookmark:
+            lower_limit = max(lower_limit, bookmark)
+        if start_date:
+            lower_limit = max(lower_limit, _as_utc(start_date))
+        time_range = {"gt": format_datetime_iso(lower_limit)}
+        if end_date:
+            # include the whole aggregation interval of the end date, in the
+            # same way as the aggregation documents are included
+            time_range["lte"] = format_range_dt(end_date, params.get("interval", "day"))
+
+        event_index = params.get("event_index") or "events-stats-{}".format(
+            params["event"]
+        )
+        recent_query = dsl.Search(using=client, index=prefix_index(event_index))[
+            0:0
+        ].filter("range", timestamp=time_range)
+
+        query_modifiers = params.get("query_modifiers")
+        for modifier in [filter_robots] if query_modifiers is None else query_modifiers:
+            recent_query = modifier(recent_query)
+
+        for field, value in raw_filters.items():
+            recent_query = recent_query.filter("term", **{field: value})
+
+        return recent_query
+
+    def apply_metrics(self, agg, metric_fields):
+        """Add the raw events metrics of the summed query metrics to an agg.
+
+        The ``count`` is the sum of the events' sampling weights, if the
+        aggregation uses them.
+        """
+        weight_field = self.aggregation.params.get("weight_field", "weight")
+        for destination, (metric, field, opts) in metric_fields.items():
+            raw_metric = self.raw_metric(field)
+            if metric == "sum" and raw_metric == "count" and weight_field:
+                agg.metric(destination, "sum", field=weight_field, missing=1)
+            elif metric == "sum" and raw_metric not in (None, "count"):
+                raw_type, raw_field, raw_opts = raw_metric
+                agg.metric(destination, raw_type, field=raw_field, **raw_opts)
+
+    def as_aggregated_result(self, node, metric_fields, doc_count=None):
+        """Convert a raw events search result into aggregated results' shape.
+
+        The count of events is set as the value of the metrics summing up the
+        aggregated ``count`` (unless it was computed from the events' weights),
+        and the other metrics which can't be computed from the raw events are
+        set to 0.
+        """
+        doc_count = node.get("doc_count", doc_count)
+        for destination, (metric, field, _) in metric_fields.items():
+            is_count = metric == "sum" and field == "count"
+            if is_count and destination in node:
+                node[destination]["value"] = round(node[destination]["value"])
+            elif doc_count is not None and destination not in node:
+                node[destination] = {"value": doc_count if is_count else 0}
+
+        for hit in node.get("top_hit", {}).get("hits", {}).get("hits", []):
+            hit["_source"] = self.as_aggregated_doc(hit["_source"])
+
+        for value in node.values():
+            if isinstance(value, dict) and "buckets" in value:
+                for bucket in value["buckets"]:
+                    self.as_aggregated_result(bucket, metric_fields)
+        return node
+
+    @staticmethod
+    def merge(result, recent_result, metric_fields):
+        """Add the summed metrics of recent events' results to a result."""
+        for destination, (metric, _, _) in metric_fields.items():
+            if metric == "sum" and destination in recent_result:
+                result[destination] = (result.get(destination) or 0) + (
+                    recent_result.get(destination) or 0
+                )
+
+        if recent_result.get("buckets"):
+            buckets = {b["key"]: b for b in result.setdefault("buckets", [])}
+            for recent_bucket in recent_result["buckets"]:
+                bucket = buckets.get(recent_bucket["key"])
+                if bucket is None:
+                    result["buckets"].append(recent_bucket)
+                else:
+                    RecentEvents.merge(bucket, recent_bucket, metric_fields)
+        return result
+
+
+def _build_filters(time_field, start_date, end_date, required_filters, params):
+    """Build the filters of a precompiled search request body."""
+    filters = []
+    if start_date is not None or end_date is not None:
+        time_range = {}
+        if start_date is not None:
+            time_range["gte"] = format_datetime_iso(start_date)
+        if end_date is not None:
+            time_range["lte"] = format_datetime_iso(end_date)
+        filters.append({"range": {time_field: time_range}})
+
+    for query_param, filtered_field in required_filters.items():
+        if query_param in params:
+            filters.append({"term": {filtered_field: params[query_param]}})
+
+    return filters
+
+
+def _build_body(aggs, filters):
+    """Build a search request body from precompiled aggregations."""
+    body = {"size": 0}
+    if aggs:
+        body["aggs"] = aggs
+    if filters:
+        body["query"] = {"bool": {"filter": filters}}
+    return body
+
+
+def _as_utc(dt):
+    """Consider naive datetimes as UTC."""
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+_interval_steps = {
+    "day": relativedelta(days=1),
+    "week": relativedelta(weeks=1),
+    "month": relativedelta(months=1),
+    "quarter": relativedelta(months=3),
+    "year": relativedelta(years=1),
+}
+
+
+def _period_start(day, interval):
+    """Get the first day of the histogram bucket containing a day."""
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    if interval == "quarter":
+        return day.replace(month=3 * ((day.month - 1) // 3) + 1, day=1)
+    if interval == "year":
+        return day.replace(month=1, day=1)
+    return day
+
+
+def _count_periods(first_day, last_day, interval):
+    """Count the histogram buckets between two days."""
+    first = _period_start(first_day, interval)
+    last = _period_start(last_day, interval)
+    if interval in ("day", "week"):
+        return (last - first).days // _interval_steps[interval].days + 1
+    months = (last.year - first.year) * 12 + last.month - first.month
+    return months // (_interval_steps[interval].months or 12) + 1
+
+
+def _day_of_key(key):
+    """Get the day of a histogram bucket key (in milliseconds)."""
+    return datetime.fromtimestamp(key / 1000, tz=timezone.utc).date()
+
+
+def _key_of_day(day):
+    """Get the histogram bucket key (in milliseconds) of a day."""
+    return (
+        int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+        * 1000
+    )
+
+
+def _combine_metric(metric, value, other):
+    """Combine the values of a metric from two buckets."""
+    if value is None or other is None:
+        return other if value is None else value
+    if metric == "min":
+        return min(value, other)
+    if metric == "max":
+        return max(value, other)
+    return value + other
+
+
 class DateHistogramQuery(Query):
-    """Search date histogram query."""
+    """Search date histogram query.
+
+    If a ``cache_timeout`` is set, the daily histogram over the whole history
+    of each set of parameters is fetched once and cached, and the histograms
+    of all the intervals and date ranges are computed from it, provided that
+    the metrics can be combined (i.e. are ``sum``, ``min`` or ``max``).
+    """
 
     allowed_intervals = ["year", "quarter", "month", "week", "day"]
     """Allowed intervals for the histogram aggregation."""
 
+    derivable_metrics = {"sum", "min", "max"}
+    """Metrics whose daily values can be combined into coarser intervals."""
+
     def __init__(
         self,
         time_field="timestamp",
@@ -59,6 +367,11 @@ class DateHistogramQuery(Query):
         query_modifiers=None,
         required_filters=None,
         metric_fields=None,
+        recent_events_aggregation=None,
+        max_recent_window=86400,
+        cache_timeout=None,
+        fill_gaps=False,
+        max_buckets=None,
         *args,
         **kwargs,
     ):
@@ -74,8 +387,28 @@ class DateHistogramQuery(Query):
             "filtered field".
         :param metric_fields: Dict of "destination field" ->
             tuple("metric type", "source field", "metric_options").
+        :param recent_events_aggregation: name of the aggregation owning the
+            queried index. If set, the raw events which have not been
+            aggregated yet are included in the results (see
+            :py:class:`RecentEvents`).
+        :param max_recent_window: maximum age in seconds of the included raw
+            events.
+        :param cache_timeout: if set, the daily histogram is cached for this
+            number of seconds, and the other intervals are derived from it.
+        :param fill_gaps: if True, empty buckets are added for the intervals
+            without any data between the start and end dates (or the first
+            and last buckets).
+        :param max_buckets: maximum number of buckets. If the requested
+            interval would produce more buckets, the next coarser interval
+            is used instead. Unless the daily histogram is cached, this is
+            only possible when both the start and end dates are given.
         """
         super(DateHistogramQuery, self).__init__(*args, **kwargs)
+        self.recent_events = (
+            RecentEvents(recent_events_aggregation, max_recent_window)
+            if recent_events_aggregation
+            else None
+        )
         self.time_field = time_field
         self.copy_fields = copy_fields or {}
         self.query_modifiers = query_modifiers or []
@@ -105,6 +438,28 @@ class DateHistogramQuery(Query):
                 )
             )
 
+        self.cache_timeout = cache_timeout
+        self.fill_gaps = fill_gaps
+        self.max_buckets = max_buckets
+        self.derive_intervals = cache_timeout is not None and all(
+            metric in self.derivable_metrics
+            for metric, _, _ in self.metric_fields.values()
+        )
+
+        # The aggregations don't depend on the request parameters, so they are
+        # compiled once and only the filters are built for each request. Query
+        # modifiers and overridden ``build_query`` methods can change the
+        # whole query, in which case the DSL is used for each request.
+        self.compiled_aggs = None
+        if (
+            not self.query_modifiers
+            and type(self).build_query is DateHistogramQuery.build_query
+        ):
+            self.compiled_aggs = {
+                interval: self.build_query(interval, None, None).to_dict().get("aggs")
+                for interval in self.allowed_intervals
+            }
+
     def validate_arguments(self, interval, start_date, end_date, **kwargs):
         """Validate query arguments."""
         if interval not in self.allowed_intervals:
@@ -151,6 +506,51 @@ class DateHistogramQuery(Query):
 
         return agg_query
 
+    def execute_query(self, interval, start_date, end_date, **kwargs):
+        """Execute the search query.
+
+        :returns: the search response, as a dict.
+        """
+        if self.compiled_aggs is None:
+            with profile_stage("build"):
+                agg_query = self.build_query(interval, start_date, end_date, **kwargs)
+            return profiled_execute(self.with_timeouts(agg_query))
+
+        with profile_stage("build"):
+            filters = _build_filters(
+                self.time_field, start_date, end_date, self.required_filters, kwargs
+            )
+            body = _build_body(self.compiled_aggs[interval], filters)
+            if self.timeout:
+                body["timeout"] = self.timeout
+        return profiled_search(
+            self.client, index=self.index, body=body, **self.request_params
+        )
+
+    def build_recent_events_query(self, interval, start_date, end_date, **kwargs):
+        """Build the search query over the recent raw events."""
+        recent_query = self.recent_events.build_search(
+            self.client,
+            start_date,
+            end_date,
+            {
+                filtered_field: kwargs[query_param]
+                for query_param, filtered_field in self.required_filters.items()
+                if query_param in kwargs
+            },
+        )
+        if recent_query is None:
+            return None
+
+        base_agg = recent_query.aggs.bucket(
+            "histogram", "date_histogram", field="timestamp", interval=interval
+        )
+        self.recent_events.apply_metrics(base_agg, self.metric_fields)
+        if self.copy_fields:
+            base_agg.metric("top_hit", "top_hits", size=1, sort={"timestamp": "desc"})
+
+        return recent_query
+
     def process_query_result(self, query_result, interval, start_date, end_date):
         """Build the result using the query result."""
 
@@ -183,18 +583,175 @@ class DateHistogramQuery(Query):
             "buckets": [build_buckets(b) for b in buckets],
         }
 
+    def select_interval(self, interval, first_day, last_day):
+        """Select the finest interval not producing more than ``max_buckets``."""
+        if not self.max_buckets or first_day is None or last_day is None:
+            return interval
+
+        intervals = self.allowed_intervals[::-1]
+        idx = intervals.index(interval)
+        while (
+            idx < len(intervals) - 1
+            and _count_periods(first_day, last_day, intervals[idx]) > self.max_buckets
+        ):
+            idx += 1
+        return intervals[idx]
+
+    def get_daily_series(self, **kwargs):
+        """Get the (cached) daily buckets over the whole history.
+
+        :returns: a tuple (list of daily buckets, True if the search timed
+            out). Partial series are not cached.
+        """
+        normalized = json.dumps([self.name, kwargs], sort_keys=True, default=str)
+        cache_key = "stats:daily-series:{}".format(
+            hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        )
+        series = current_cache.get(cache_key)
+        if series is not None:
+            return series, False
+
+        query_result = self.execute_query("day", None, None, **kwargs)
+        with profile_stage("process"):
+            series = self.process_query_result(query_result, "day", None, None)[
+                "buckets"
+            ]
+        timed_out = query_result.get("timed_out", False)
+        if not timed_out:
+            current_cache.set(cache_key, series, timeout=self.cache_timeout)
+        return series, timed_out
+
+    def derive_buckets(self, series, interval, start_date, end_date):
+        """Compute the buckets of an interval from the daily buckets."""
+        start_key = _as_utc(start_date).timestamp() * 1000 if start_date else None
+        end_key = _as_utc(end_date).timestamp() * 1000 if end_date else None
+        buckets = {}
+        for daily in series:
+            if (start_key is not None and daily["key"] < start_key) or (
+                end_key is not None and daily["key"] > end_key
+            ):
+                continue
+            period = _period_start(_day_of_key(daily["key"]), interval)
+            bucket = buckets.get(period)
+            if bucket is None:
+                buckets[period] = bucket = dict(daily)
+                if interval != "day":
+                    bucket["key"] = _key_of_day(period)
+                    bucket["date"] = period.strftime("%Y-%m-%dT00:00:00.000Z")
+                continue
+
+            for destination, (metric, _, _) in self.metric_fields.items():
+                bucket[destination] = _combine_metric(
+                    metric, bucket[destination], daily[destination]
+                )
+            # the copied fields come from the latest document
+            for destination in self.copy_fields:
+                if destination in daily:
+                    bucket[destination] = daily[destination]
+
+        return list(buckets.values())
+
+    def fill_gap_buckets(self, buckets, interval, start_date, end_date):
+        """Add empty buckets for the intervals without any data."""
+        first_day = start_date.date() if start_date else None
+        last_day = end_date.date() if end_date else None
+        if buckets:
+            first_day = first_day or _day_of_key(buckets[0]["key"])
+            last_day = last_day or _day_of_key(buckets[-1]["key"])
+        if first_day is None or last_day is None:
+            return buckets
+
+        by_key = {bucket["key"]: bucket for bucket in buckets}
+        filled = []
+        period = _period_start(first_day, interval)
+        while period <= last_day:
+            key = _key_of_day(period)
+            bucket = by_key.get(key)
+            if bucket is None:
+                bucket = {
+                    "key": key,
+                    "date": period.strftime("%Y-%m-%dT00:00:00.000Z"),
+                }
+                for destination, (metric, _, _) in self.metric_fields.items():
+                    bucket[destination] = 0 if metric == "sum" else None
+            filled.append(bucket)
+            period += _interval_steps[interval]
+        return filled
+
     def run(self, interval="day", start_date=None, end_date=None, **kwargs):
         """Run the query."""
         start_date = self.extract_date(start_date) if start_date else None
         end_date = self.extract_date(end_date) if end_date else None
         self.validate_arguments(interval, start_date, end_date, **kwargs)
 
-        agg_query = self.build_query(interval, start_date, end_date, **kwargs)
-        query_result = agg_query.execute().to_dict()
-        res = self.process_query_result(query_result, interval, start_date, end_date)
+        first_day = start_date.date() if start_date else None
+        last_day = end_date.date() if end_date else None
+        if self.derive_intervals:
+            series, timed_out = self.get_daily_series(**kwargs)
+            if series:
+                first_day = first_day or _day_of_key(series[0]["key"])
+                last_day = last_day or _day_of_key(series[-1]["key"])
+            interval = self.select_interval(interval, first_day, last_day)
+            with profile_stage("process"):
+                buckets = self.derive_buckets(series, interval, start_date, end_date)
+                res = {
+                    "interval": interval,
+                    "key_type": "date",
+                    "start_date": start_date.isoformat() if start_date else None,
+                    "end_date": end_date.isoformat() if end_date else None,
+                    # like the date histogram aggregation, add the empty buckets
+                    # between the first and last ones
+                    "buckets": self.fill_gap_buckets(buckets, interval, None, None),
+                }
+            if timed_out:
+                res["timed_out"] = True
+        else:
+            interval = self.select_interval(interval, first_day, last_day)
+            query_result = self.execute_query(interval, start_date, end_date, **kwargs)
+            with profile_stage("process"):
+                res = self.process_query_result(
+                    query_result, interval, start_date, end_date
+                )
+            if query_result.get("timed_out"):
+                res["timed_out"] = True
+
+        if self.recent_events:
+            self.add_recent_events(res, interval, start_date, end_date, **kwargs)
+        if self.fill_gaps:
+            res["buckets"] = self.fill_gap_buckets(
+                res["buckets"], interval, start_date, end_date
+            )
 
         return res
 
+    def add_recent_events(self, res, interval, start_date, end_date, **kwargs):
+        """Merge the raw events which have not been aggregated yet."""
+        with profile_stage("build"):
+            recent_query = self.build_recent_events_query(
+                interval, start_date, end_date, **kwargs
+            )
+        if recent_query is None:
+            return
+        try:
+            recent_result = profiled_execute(self.with_timeouts(recent_query))
+        except search.exceptions.NotFoundError:
+            # no events have been indexed yet
+            return
+        if recent_result.get("timed_out"):
+            res["timed_out"] = True
+        with profile_stage("process"):
+            self.recent_events.as_aggregated_result(
+                recent_result["aggregations"], self.metric_fields
+            )
+            self.recent_events.merge(
+                res,
+                self.process_query_result(
+                    recent_result, interval, start_date, end_date
+                ),
+                self.metric_fields,
+            )
+            res["buckets"].sort(key=lambda bucket: bucket["key"])
+
 
 class TermsQuery(Query):
     """Search sum query."""
@@ -208,6 +765,8 @@ class TermsQuery(Query):
         aggregated_fields=None,
         metric_fields=None,
         max_bucket_size=10000,
+        recent_events_aggregation=None,
+        max_recent_window=86400,
         *args,
         **kwargs,
     ):
@@ -225,8 +784,19 @@ class TermsQuery(Query):
             terms aggregations.
         :param metric_fields: Dict of "destination field" ->
             tuple("metric type", "source field").
+        :param recent_events_aggregation: name of the aggregation owning the
+            queried index. If set, the raw events which have not been
+            aggregated yet are included in the results (see
+            :py:class:`RecentEvents`).
+        :param max_recent_window: maximum age in seconds of the included raw
+            events.
         """
         super(TermsQuery, self).__init__(*args, **kwargs)
+        self.recent_events = (
+            RecentEvents(recent_events_aggregation, max_recent_window)
+            if recent_events_aggregation
+            else None
+        )
         self.time_field = time_field
         self.copy_fields = copy_fields or {}
         self.query_modifiers = query_modifiers or []
@@ -235,6 +805,14 @@ class TermsQuery(Query):
         self.metric_fields = metric_fields or {"value": ("sum", "count", {})}
         self.max_bucket_size = max_bucket_size
 
+        # see DateHistogramQuery
+        self.compiled_aggs = None
+        if (
+            not self.query_modifiers
+            and type(self).build_query is TermsQuery.build_query
+        ):
+            self.compiled_aggs = self.build_query(None, None).to_dict().get("aggs")
+
     def validate_arguments(self, start_date, end_date, **kwargs):
         """Validate query arguments."""
         if not set(self.required_filters) <= set(kwargs):
@@ -284,6 +862,145 @@ class TermsQuery(Query):
 
         return agg_query
 
+    def execute_query(self, start_date, end_date, **kwargs):
+        """Execute the search query.
+
+        :returns: the search response, as a dict.
+        """
+        if self.compiled_aggs is None:
+            with profile_stage("build"):
+                agg_query = self.build_query(start_date, end_date, **kwargs)
+            return profiled_execute(self.with_timeouts(agg_query))
+
+        with profile_stage("build"):
+            filters = _build_filters(
+                self.time_field, start_date, end_date, self.required_filters, kwargs
+            )
+            body = _build_body(self.compiled_aggs, filters)
+            if self.timeout:
+                body["timeout"] = self.timeout
+        return profiled_search(
+            self.client, index=self.index, body=body, **self.request_params
+        )
+
+    def build_export_query(self, start_date, end_date, after, page_size, **kwargs):
+        """Build the search query of an export page.
+
+        Instead of nested ``terms`` aggregations, a ``composite`` aggregation
+        over the aggregated fields is used, which can be paged through.
+        """
+        agg_query = dsl.Search(using=self.client, index=self.index)[0:0]
+
+        if start_date is not None or end_date is not None:
+            time_range = {}
+            if start_date is not None:
+                time_range["gte"] = format_datetime_iso(start_date)
+            if end_date is not None:
+                time_range["lte"] = format_datetime_iso(end_date)
+            agg_query = agg_query.filter("range", **{self.time_field: time_range})
+
+        for modifier in self.query_modifiers:
+            agg_query = modifier(agg_query, **kwargs)
+
+        composite = {
+            "sources": [
+                {term: {"terms": {"field": term}}} for term in self.aggregated_fields
+            ],
+            "size": page_size,
+        }
+        if after:
+            composite["after"] = after
+        rows_agg = agg_query.aggs.bucket("rows", "composite", **composite)
+        for dst, (metric, field, opts) in self.metric_fields.items():
+            rows_agg.metric(dst, metric, field=field, **opts)
+
+        for query_param, filtered_field in self.required_filters.items():
+            if query_param in kwargs:
+                agg_query = agg_query.filter(
+                    "term", **{filtered_field: kwargs[query_param]}
+                )
+
+        return agg_query
+
+    def export(
+        self, start_date=None, end_date=None, cursor=None, page_size=1000, **kwargs
+    ):
+        """Export the metrics of every combination of the aggregated fields.
+
+        The results are fetched page by page, so that the memory usage doesn't
+        depend on the number of exported rows.
+
+        :param cursor: cursor token (see :py:func:`encode_cursor`) of the last
+            exported row, to resume an export.
+        :param page_size: number of rows fetched per search query.
+        :returns: a generator of tuples (list of rows, cursor token of the last
+            row of the list). Each row is a dict of the aggregated fields and
+            the metric values.
+        """
+        if not self.aggregated_fields:
+            raise InvalidRequestInputError(
+                f"Statistic {self.name} has no aggregated fields to export."
+            )
+        start_date = self.extract_date(start_date) if start_date else None
+        end_date = self.extract_date(end_date) if end_date else None
+        self.validate_arguments(start_date, end_date, **kwargs)
+        after = decode_cursor(cursor) if cursor else None
+
+        while True:
+            agg_query = self.build_export_query(
+                start_date, end_date, after, page_size, **kwargs
+            )
+            rows_agg = agg_query.execute().to_dict()["aggregations"]["rows"]
+            buckets = rows_agg["buckets"]
+            if not buckets:
+                return
+
+            rows = [
+                {
+                    **bucket["key"],
+                    **{
+                        metric: bucket[metric]["value"] for metric in self.metric_fields
+                    },
+                }
+                for bucket in buckets
+            ]
+            after = rows_agg.get("after_key", buckets[-1]["key"])
+            yield rows, encode_cursor(after)
+            if len(buckets) < page_size:
+                return
+
+    def build_recent_events_query(self, start_date, end_date, **kwargs):
+        """Build the search query over the recent raw events."""
+        recent_query = self.recent_events.build_search(
+            self.client,
+            start_date,
+            end_date,
+            {
+                filtered_field: kwargs[query_param]
+                for query_param, filtered_field in self.required_filters.items()
+                if query_param in kwargs
+            },
+        )
+        raw_fields = [self.recent_events.raw_field(f) for f in self.aggregated_fields]
+        if recent_query is None or None in raw_fields:
+            return None
+
+        recent_query = recent_query.extra(track_total_hits=True)
+        cur_agg = recent_query.aggs
+        self.recent_events.apply_metrics(cur_agg, self.metric_fields)
+        for term, raw_field in zip(self.aggregated_fields, raw_fields):
+            cur_agg = cur_agg.bucket(
+                term, "terms", field=raw_field, size=self.max_bucket_size
+            )
+            self.recent_events.apply_metrics(cur_agg, self.metric_fields)
+
+        if self.copy_fields:
+            recent_query.aggs.metric(
+                "top_hit", "top_hits", size=1, sort={"timestamp": "desc"}
+            )
+
+        return recent_query
+
     def process_query_result(self, query_result, start_date, end_date):
         """Build the result using the query result."""
 
@@ -331,13 +1048,278 @@ class TermsQuery(Query):
         end_date = self.extract_date(end_date) if end_date else None
         self.validate_arguments(start_date, end_date, **kwargs)
 
-        agg_query = self.build_query(start_date, end_date, **kwargs)
-        query_result = agg_query.execute().to_dict()
-        res = self.process_query_result(query_result, start_date, end_date)
+        query_result = self.execute_query(start_date, end_date, **kwargs)
+        with profile_stage("process"):
+            res = self.process_query_result(query_result, start_date, end_date)
+        if query_result.get("timed_out"):
+            res["timed_out"] = True
+
+        if self.recent_events:
+            with profile_stage("build"):
+                recent_query = self.build_recent_events_query(
+                    start_date, end_date, **kwargs
+                )
+            if recent_query is not None:
+                try:
+                    recent_result = profiled_execute(self.with_timeouts(recent_query))
+                except search.exceptions.NotFoundError:
+                    # no events have been indexed yet
+                    return res
+                if recent_result.get("timed_out"):
+                    res["timed_out"] = True
+                with profile_stage("process"):
+                    recent_result.setdefault("aggregations", {})
+                    self.recent_events.as_aggregated_result(
+                        recent_result["aggregations"],
+                        self.metric_fields,
+                        doc_count=recent_result["hits"]["total"]["value"],
+                    )
+                    self.recent_events.merge(
+                        res,
+                        self.process_query_result(recent_result, start_date, end_date),
+                        self.metric_fields,
+                    )
 
         return res
 
 
+class MultiKeyTermsQuery(Query):
+    """Search query returning the metrics of many keys at once.
+
+    This is useful for listings (e.g. search results) showing the statistics of
+    many records, which can then be fetched with a single search query instead
+    of one per record.
+    """
+
+    def __init__(
+        self,
+        key_field="unique_id",
+        key_param="keys",
+        time_field="timestamp",
+        query_modifiers=None,
+        metric_fields=None,
+        max_keys=100,
+        cache_timeout=None,
+        *args,
+        **kwargs,
+    ):
+        """Constructor.
+
+        :param key_field: field on which the keys are filtered and aggregated.
+        :param key_param: name of the query parameter holding the list of keys.
+        :param time_field: name of the timestamp field.
+        :param query_modifiers: List of functions accepting a ``query`` and
+            ``**kwargs`` (same as provided to the ``run`` method), that will
+            be applied to the aggregation query.
+        :param metric_fields: Dict of "destination field" ->
+            tuple("metric type", "source field", "metric_options").
+        :param max_keys: maximum number of keys which can be queried at once.
+        :param cache_timeout: if set, the results of each key are cached
+            separately for this number of seconds.
+        """
+        super(MultiKeyTermsQuery, self).__init__(*args, **kwargs)
+        self.key_field = key_field
+        self.key_param = key_param
+        self.time_field = time_field
+        self.query_modifiers = query_modifiers or []
+        self.metric_fields = metric_fields or {"value": ("sum", "count", {})}
+        self.max_keys = max_keys
+        self.cache_timeout = cache_timeout
+
+    def validate_arguments(self, keys, start_date, end_date, **kwargs):
+        """Validate query arguments."""
+        if not isinstance(keys, list) or not keys:
+            raise InvalidRequestInputError(
+                "Parameter {0} of query {1} should be a non-empty list.".format(
+                    self.key_param, self.name
+                )
+            )
+        if len(keys) > self.max_keys:
+            raise InvalidRequestInputError(
+                "Too many keys in query {0} (maximum {1}).".format(
+                    self.name, self.max_keys
+                )
+            )
+
+    def build_query(self, keys, start_date, end_date, **kwargs):
+        """Build the search query."""
+        agg_query = dsl.Search(using=self.client, index=self.index)[0:0]
+
+        if start_date is not None or end_date is not None:
+            time_range = {}
+            if start_date is not None:
+                time_range["gte"] = format_datetime_iso(start_date)
+            if end_date is not None:
+                time_range["lte"] = format_datetime_iso(end_date)
+            agg_query = agg_query.filter("range", **{self.time_field: time_range})
+
+        for modifier in self.query_modifiers:
+            agg_query = modifier(agg_query, **kwargs)
+
+        agg_query = agg_query.filter("terms", **{self.key_field: keys})
+        keys_agg = agg_query.aggs.bucket(
+            "keys", "terms", field=self.key_field, size=len(keys)
+        )
+        for dst, (metric, field, opts) in self.metric_fields.items():
+            keys_agg.metric(dst, metric, field=field, **opts)
+
+        return agg_query
+
+    def process_query_result(self, query_result, keys, start_date, end_date):
+        """Build the result of each key using the query result."""
+        results = {key: dict.fromkeys(self.metric_fields, 0) for key in keys}
+        for bucket in query_result["aggregations"]["keys"]["buckets"]:
+            results[str(bucket["key"])] = {
+                metric: bucket[metric]["value"] for metric in self.metric_fields
+            }
+        return results
+
+    def _cache_key(self, key, start_date, end_date, **kwargs):
+        """Build the cache key of a single key's result."""
+        normalized = json.dumps(
+            [self.name, key, start_date, end_date, kwargs], sort_keys=True, default=str
+        )
+        return "stats:query:{}".format(
+            hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        )
+
+    def run(self, start_date=None, end_date=None, **kwargs):
+        """Run the query."""
+        start_date = self.extract_date(start_date) if start_date else None
+        end_date = self.extract_date(end_date) if end_date else None
+        keys = kwargs.pop(self.key_param, None)
+        self.validate_arguments(keys, start_date, end_date, **kwargs)
+        # remove duplicates, but keep the order of the keys
+        keys = list(dict.fromkeys(str(key) for key in keys))
+
+        results = {}
+        cache_keys = {}
+        timed_out = False
+        if self.cache_timeout:
+            cache_keys = {
+                key: self._cache_key(key, start_date, end_date, **kwargs)
+                for key in keys
+            }
+            cached = current_cache.get_many(*cache_keys.values())
+            results = {
+                key: value for key, value in zip(keys, cached) if value is not None
+            }
+
+        missing_keys = [key for key in keys if key not in results]
+        if missing_keys:
+            with profile_stage("build"):
+                agg_query = self.build_query(
+                    missing_keys, start_date, end_date, **kwargs
+                )
+            query_result = profiled_execute(self.with_timeouts(agg_query))
+            with profile_stage("process"):
+                fetched = self.process_query_result(
+                    query_result, missing_keys, start_date, end_date
+                )
+            timed_out = query_result.get("timed_out", False)
+            # partial results are not cached
+            if self.cache_timeout and not timed_out:
+                current_cache.set_many(
+                    {cache_keys[key]: value for key, value in fetched.items()},
+                    timeout=self.cache_timeout,
+                )
+            results.update(fetched)
+
+        res = {
+            "start_date": start_date.isoformat() if start_date else None,
+            "end_date": end_date.isoformat() if end_date else None,
+            "type": "bucket",
+            "field": self.key_field,
+            "key_type": "terms",
+            "buckets": [{"key": key, **results[key]} for key in keys],
+        }
+        if timed_out:
+            res["timed_out"] = True
+        return res
+
+
+class TotalsQuery(Query):
+    """Query reading the all-time totals materialized by an aggregation.
+
+    See the ``totals`` parameter of
+    :py:class:`~invenio_stats.aggregations.StatAggregator`. The totals of a
+    single key are fetched with one GET request, and the totals of a list of
+    keys with one multi-GET request.
+    """
+
+    def __init__(
+        self,
+        key_param="unique_id",
+        metric_fields=None,
+        copy_fields=None,
+        max_keys=100,
+        *args,
+        **kwargs,
+    ):
+        """Constructor.
+
+        :param key_param: name of the query parameter holding the key (or list
+            of keys) of the totals.
+        :param metric_fields: Dict of "destination field" -> "source field"
+            in the totals document.
+        :param copy_fields: Dict of "destination field" -> "source field"
+            copied from the totals document into the result.
+        :param max_keys: maximum number of keys which can be queried at once.
+        """
+        super(TotalsQuery, self).__init__(*args, **kwargs)
+        self.key_param = key_param
+        self.metric_fields = metric_fields or {"value": "count"}
+        self.copy_fields = copy_fields or {}
+        self.max_keys = max_keys
+
+    def validate_arguments(self, key):
+        """Validate query arguments."""
+        if not key:
+            raise InvalidRequestInputError(
+                "Missing the required parameter {0} in query {1}".format(
+                    self.key_param, self.name
+                )
+            )
+        if isinstance(key, list) and len(key) > self.max_keys:
+            raise InvalidRequestInputError(
+                "Too many keys in query {0} (maximum {1}).".format(
+                    self.name, self.max_keys
+                )
+            )
+
+    def process_total(self, doc):
+        """Build the result of a totals document."""
+        result = {
+            destination: doc.get(source, 0)
+            for destination, source in self.metric_fields.items()
+        }
+        for destination, source in self.copy_fields.items():
+            if source in doc:
+                result[destination] = doc[source]
+        return result
+
+    def run(self, **kwargs):
+        """Run the query."""
+        key = kwargs.get(self.key_param)
+        self.validate_arguments(key)
+        if not isinstance(key, list):
+            doc = self.client.get(index=self.index, id=key, **self.request_params)
+            return self.process_total(doc["_source"])
+
+        keys = list(dict.fromkeys(str(k) for k in key))
+        docs = self.client.mget(
+            index=self.index, body={"ids": keys}, **self.request_params
+        )["docs"]
+        return {
+            "type": "bucket",
+            "key_type": "terms",
+            "buckets": [
+                {"key": k, **self.process_total(doc.get("_source", {}))}
+                for k, doc in zip(keys, docs)
+            ],
+        }
+
+
 # for backwards compatibility
 ESQuery = Query
 ESDateHistogramQuery = DateHistogramQuery
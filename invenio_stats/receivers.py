@@ -9,6 +9,7 @@ from flask import current_app
 from invenio_base.utils import obj_or_import_string
 
 from .proxies import current_stats
+from .tracing import TRACE_FIELD, start_span
 
 
 class EventEmitter(object):
@@ -24,13 +25,32 @@ class EventEmitter(object):
         # Send the event only if it is registered
         try:
             if self.name in current_stats.events:
-                event = {}
-                for builder in self.builders:
-                    event = builder(event, *args, **kwargs)
+                with start_span("stats.emit", event_type=self.name) as span:
+                    event = {}
+                    for builder in self.builders:
+                        event = builder(event, *args, **kwargs)
+                        if event is None:
+                            return
+
+                    sampler = current_stats.events[self.name].sampler
+                    if sampler is not None:
+                        weight = sampler(event)
+                        if weight is None:
+                            return
+                        event["weight"] = weight
+
+                    event = current_stats.apply_backlog_policy(self.name, event)
                     if event is None:
                         return
 
-                current_stats.publish(self.name, [event])
+                    if span.sampled:
+                        event[TRACE_FIELD] = span.traceparent
+
+                    emit_buffer = current_stats.emit_buffer
+                    if emit_buffer is not None:
+                        emit_buffer.put(self.name, event)
+                    else:
+                        current_stats.publish(self.name, [event])
 
         except Exception:
             current_app.logger.exception("Error building event")
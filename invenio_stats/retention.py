@@ -0,0 +1,257 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Retention of the raw events once they have been aggregated."""
+
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from invenio_search import current_search_client
+from invenio_search.engine import search
+from invenio_search.utils import prefix_index
+
+from .aggregations import INTERVAL_DELTAS, INTERVAL_ROUNDING
+from .bookmark import SUPPORTED_INTERVALS
+from .proxies import current_stats
+
+
+class EventsPruner(object):
+    """Delete the raw events indices which are not needed anymore.
+
+    An events index is pruned when all its events are older than the
+    retention window, and have been aggregated by every aggregation of the
+    event, i.e. are older than the interval of each aggregation's bookmark.
+    The pruned indices can be snapshotted or exported beforehand.
+
+    The aggregations indices of the periods which are over are also
+    force-merged to a single segment, as they won't be updated anymore, and
+    optionally rewritten with another codec.
+    """
+
+    def __init__(
+        self,
+        event,
+        client=None,
+        retention_days=365,
+        snapshot_repository=None,
+        export_path=None,
+        codec=None,
+    ):
+        """Constructor.
+
+        :param event: name of the event type.
+        :param client: search client.
+        :param retention_days: minimum age in days of the pruned events.
+        :param snapshot_repository: name of the snapshot repository in which
+            the pruned indices are snapshotted before being deleted.
+        :param export_path: directory to which the pruned indices are exported
+            as gzipped NDJSON files before being deleted.
+        :param codec: codec of the force-merged aggregations indices, e.g.
+            ``"best_compression"``.
+        """
+        self.event = event
+        self.client = client or current_search_client
+        self.retention = timedelta(days=retention_days)
+        self.snapshot_repository = snapshot_repository
+        self.export_path = export_path
+        self.codec = codec
+        self.event_index = prefix_index("events-stats-{}".format(event))
+
+    @property
+    def aggregations(self):
+        """Configured aggregations of the event."""
+        return [
+            agg
+            for agg in current_stats.aggregations.values()
+            if agg.params.get("event") == self.event
+        ]
+
+    def coverage(self):
+        """Get the date before which all events have been aggregated.
+
+        :returns: the date, or ``None`` if some aggregation hasn't run yet.
+        """
+        dates = []
+        for agg in self.aggregations:
+            bookmark = current_stats.get_aggregation_bookmark(agg.name)
+            if bookmark is None:
+                return None
+            interval = agg.params.get("interval", "day")
+            # the interval of the bookmark is aggregated again on the next run
+            dates.append(
+                bookmark.replace(
+                    **{
+                        unit: 1 if unit in ("month", "day") else 0
+                        for unit in INTERVAL_ROUNDING[interval]
+                    }
+                )
+            )
+        return min(dates) if dates else None
+
+    def _write_indices(self):
+        """Get the indices written through the rollover alias, if any."""
+        try:
+            return set(self.client.indices.get_alias(name=self.event_index + "-write"))
+        except search.exceptions.NotFoundError:
+            return set()
+
+    def prunable_indices(self, coverage, now=None):
+        """Get the events indices which can be deleted."""
+        now = now or datetime.now(timezone.utc)
+        cutoff = min(coverage, now - self.retention)
+        try:
+            result = self.client.search(
+                index=self.event_index,
+                body={
+                    "size": 0,
+                    "aggs": {
+                        "indices": {
+                            "terms": {"field": "_index", "size": 10000},
+                            "aggs": {"newest": {"max": {"field": "timestamp"}}},
+                        }
+                    },
+                },
+            )
+        except search.exceptions.NotFoundError:
+            return []
+
+        write_indices = self._write_indices()
+        indices = []
+        for bucket in result["aggregations"]["indices"]["buckets"]:
+            newest = bucket["newest"]["value"]
+            if bucket["key"] in write_indices or newest is None:
+                continue
+            newest = datetime.fromtimestamp(newest / 1000, tz=timezone.utc)
+            if newest < cutoff:
+                indices.append(bucket["key"])
+        return sorted(indices)
+
+    def finished_aggregation_indices(self, coverage):
+        """Get the aggregations indices of the periods which are over."""
+        prefix = prefix_index("stats-{}-".format(self.event))
+        try:
+            names = list(self.client.indices.get_alias(index=prefix + "*"))
+        except search.exceptions.NotFoundError:
+            return []
+
+        indices = set()
+        for agg in self.aggregations:
+            index_interval = agg.params.get("index_interval", "month")
+            for name in names:
+                try:
+                    start = datetime.strptime(
+                        name[len(prefix) :], SUPPORTED_INTERVALS[index_interval]
+                    ).replace(tzinfo=timezone.utc)
+                except ValueError:
+                    continue
+                if start + INTERVAL_DELTAS[index_interval] <= coverage:
+                    indices.add(name)
+        return sorted(indices)
+
+    def snapshot(self, indices):
+        """Snapshot indices in the snapshot repository."""
+        name = "{}-{}".format(
+            self.event_index, datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+        )
+        self.client.snapshot.create(
+            repository=self.snapshot_repository,
+            snapshot=name,
+            body={"indices": ",".join(indices), "include_global_state": False},
+            wait_for_completion=True,
+        )
+        return name
+
+    def export(self, index):
+        """Export the events of an index to a gzipped NDJSON file."""
+        os.makedirs(self.export_path, exist_ok=True)
+        path = os.path.join(self.export_path, "{}.ndjson.gz".format(index))
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for hit in search.helpers.scan(self.client, index=index):
+                f.write(json.dumps({"_id": hit["_id"], **hit["_source"]}) + "\n")
+        return path
+
+    def set_codec(self, index):
+        """Replace an index by a copy with the codec, if needed.
+
+        As the codec can only be changed on a closed index, the index is
+        cloned with the codec instead, and the clone replaces it, taking its
+        name as an alias, along with its aliases. The index stays searchable
+        meanwhile, only its writes are blocked. The segments of the clone are
+        rewritten with the codec by the next force-merge.
+
+        :returns: the name of the index with the codec.
+        """
+        settings = self.client.indices.get_settings(
+            index=index, name="index.codec", flat_settings=True
+        )
+        if settings[index]["settings"].get("index.codec") == self.codec:
+            return index
+
+        clone = "{0}-{1}".format(index, self.codec)
+        aliases = self.client.indices.get_alias(index=index)[index]["aliases"]
+        self.client.indices.put_settings(
+            index=index, body={"index": {"blocks": {"write": True}}}
+        )
+        try:
+            self.client.indices.clone(
+                index=index,
+                target=clone,
+                body={
+                    "settings": {
+                        "index.codec": self.codec,
+                        "index.blocks.write": None,
+                    }
+                },
+                wait_for_active_shards="all",
+            )
+        except Exception:
+            self.client.indices.put_settings(
+                index=index, body={"index": {"blocks": {"write": None}}}
+            )
+            raise
+        self.client.indices.update_aliases(
+            body={
+                "actions": [
+                    *(
+                        {"add": {"index": clone, "alias": alias, **spec}}
+                        for alias, spec in aliases.items()
+                    ),
+                    {"add": {"index": clone, "alias": index}},
+                    {"remove_index": {"index": index}},
+                ]
+            }
+        )
+        return clone
+
+    def run(self, dry_run=False, force_merge=True):
+        """Prune the events indices.
+
+        :param dry_run: only list the indices which would be pruned.
+        :param force_merge: force-merge the finished aggregations indices.
+        :returns: a dict of the pruned and force-merged indices.
+        """
+        result = {"pruned": [], "merged": []}
+        coverage = self.coverage()
+        if coverage is None:
+            return result
+
+        result["pruned"] = self.prunable_indices(coverage)
+        if force_merge:
+            result["merged"] = self.finished_aggregation_indices(coverage)
+        if dry_run:
+            return result
+
+        if result["pruned"]:
+            if self.snapshot_repository:
+                result["snapshot"] = self.snapshot(result["pruned"])
+            if self.export_path:
+                for index in result["pruned"]:
+                    self.export(index)
+            self.client.indices.delete(index=",".join(result["pruned"]))
+        for index in result["merged"]:
+            if self.codec:
+                index = self.set_codec(index)
+            self.client.indices.forcemerge(index=index, max_num_segments=1)
+        return result
@@ -0,0 +1,88 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Sampling policies of the emitted events.
+
+A sampler is called with each built event, and returns either ``None`` if the
+event is dropped, or the weight of the kept event, i.e. the inverse of its
+probability of being kept. The weight is stored in the event's ``weight``
+field and summed up by the aggregations instead of counting the events, so
+that the counts remain unbiased estimates.
+
+Note that the other metrics, e.g. the cardinality of the sessions, are computed
+on the sampled events only.
+"""
+
+import random
+import threading
+import time
+
+
+class FixedRateSampler(object):
+    """Keep a fixed fraction of the events."""
+
+    def __init__(self, rate):
+        """Constructor.
+
+        :param rate: probability of keeping an event, between 0 and 1.
+        """
+        if not 0 < rate <= 1:
+            raise ValueError("Sampling rate should be between 0 and 1.")
+        self.rate = rate
+
+    def __call__(self, event):
+        """Get the weight of a kept event, or ``None`` if it is dropped."""
+        if self.rate < 1 and random.random() >= self.rate:
+            return None
+        return 1 / self.rate
+
+
+class AdaptiveRateSampler(object):
+    """Keep all the events of a key up to a rate, and sample the hot keys.
+
+    Within each time window, the first ``max_rate * window`` events of a key
+    (e.g. of a downloaded file) are kept. Past this budget, the n-th event is
+    kept with a probability of ``budget / n``, so that the number of kept
+    events only grows logarithmically with the number of emitted ones.
+
+    The emit rates are tracked per process.
+    """
+
+    def __init__(self, key_fields, max_rate=1.0, window=60, max_keys=100000):
+        """Constructor.
+
+        :param key_fields: fields of the events identifying their key.
+        :param max_rate: number of events per second of a key which are
+            always kept.
+        :param window: duration in seconds of the windows over which the
+            events of each key are counted.
+        :param max_keys: maximum number of keys tracked in a window. When
+            exceeded, the counts are reset.
+        """
+        self.key_fields = key_fields
+        self.budget = max_rate * window
+        self.window = window
+        self.max_keys = max_keys
+        self._counts = {}
+        self._current_window = None
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        """Get the weight of a kept event, or ``None`` if it is dropped."""
+        key = tuple(event.get(field) for field in self.key_fields)
+        current_window = int(time.monotonic() // self.window)
+        with self._lock:
+            if (
+                current_window != self._current_window
+                or len(self._counts) >= self.max_keys
+            ):
+                self._counts = {}
+                self._current_window = current_window
+            count = self._counts[key] = self._counts.get(key, 0) + 1
+
+        if count <= self.budget:
+            return 1.0
+        rate = self.budget / count
+        if random.random() >= rate:
+            return None
+        return 1 / rate
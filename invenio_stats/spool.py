@@ -0,0 +1,131 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Durable local spool of events which could not be published."""
+
+import fcntl
+import json
+import mmap
+import os
+import threading
+from collections import Counter, defaultdict
+from glob import glob
+from time import time_ns
+
+
+class EventSpool(object):
+    """Append-only spool of events, stored in rotated segment files.
+
+    Each process appends to its own segment file, one JSON line per event,
+    until the segment reaches ``segment_size`` bytes. The segments are read
+    back through memory mapping and deleted once drained. Appending and
+    draining lock the segment file, so that several processes can share the
+    same spool directory.
+
+    Events are drained at least once: if publishing fails while draining a
+    segment, the whole segment is kept and will be replayed again.
+    """
+
+    suffix = ".spool"
+
+    def __init__(self, path, segment_size=16 * 1024 * 1024):
+        """Constructor.
+
+        :param path: directory of the segment files.
+        :param segment_size: size in bytes after which a new segment is used.
+        """
+        self.path = path
+        self.segment_size = segment_size
+        self._segment = None
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def _next_segment(self):
+        """Get the path of a new segment for the current process."""
+        self._sequence += 1
+        return os.path.join(
+            self.path,
+            "{:020d}-{}-{}{}".format(
+                time_ns(), os.getpid(), self._sequence, self.suffix
+            ),
+        )
+
+    def segments(self):
+        """List the segments, oldest first."""
+        return sorted(glob(os.path.join(self.path, "*" + self.suffix)))
+
+    def append(self, event_type, events):
+        """Append events to the spool."""
+        data = b"".join(
+            json.dumps([event_type, event]).encode("utf-8") + b"\n" for event in events
+        )
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            if self._segment is None:
+                self._segment = self._next_segment()
+            while True:
+                with open(self._segment, "ab") as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    if os.fstat(f.fileno()).st_nlink == 0:
+                        # the segment was drained while we were waiting for it
+                        self._segment = self._next_segment()
+                        continue
+                    f.write(data)
+                    f.flush()
+                    if f.tell() >= self.segment_size:
+                        self._segment = self._next_segment()
+                    return
+
+    @staticmethod
+    def _read(f):
+        """Read the events of a locked segment file."""
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b""):
+                if line.strip():
+                    yield json.loads(line)
+
+    def drain(self, publish, batch_size=1000):
+        """Publish the spooled events and delete the drained segments.
+
+        :param publish: function publishing a list of events of a given type,
+            of the form ``publish(event_type, events)``.
+        :param batch_size: maximum number of events published at once.
+        :returns: the number of published events.
+        """
+        count = 0
+        for segment in self.segments():
+            try:
+                f = open(segment, "rb")
+            except FileNotFoundError:
+                continue
+            with f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                if os.fstat(f.fileno()).st_nlink == 0:
+                    continue
+                batches = defaultdict(list)
+                for event_type, event in self._read(f):
+                    batches[event_type].append(event)
+                    count += 1
+                    if len(batches[event_type]) >= batch_size:
+                        publish(event_type, batches.pop(event_type))
+                for event_type, events in batches.items():
+                    publish(event_type, events)
+                os.unlink(segment)
+        return count
+
+    def stats(self):
+        """Get the number of segments, their size and events per type."""
+        events = Counter()
+        size = 0
+        segments = self.segments()
+        for segment in segments:
+            try:
+                with open(segment, "rb") as f:
+                    fcntl.flock(f, fcntl.LOCK_SH)
+                    size += os.fstat(f.fileno()).st_size
+                    events.update(event_type for event_type, _ in self._read(f))
+            except FileNotFoundError:
+                continue
+        return {"segments": len(segments), "size": size, "events": dict(events)}
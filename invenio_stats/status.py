@@ -0,0 +1,239 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Status of the events ingestion and of the aggregations.
+
+The status tells whether the processing of the events or the aggregations
+are falling behind, e.g. to scale the Celery workers or to alert before the
+statistics become stale:
+
+- per event type, the number of queued events, the age of the oldest one and
+  the date of the latest indexed event. The age of the oldest queued event is
+  estimated from the date of the first publishing since the queue was last
+  consumed, so that no message is taken from the queue;
+- per aggregation, the lag of its bookmark and the estimated time to catch up
+  with it, from the throughput of its recent runs.
+
+The durations are in seconds.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from dateutil import parser
+from flask import current_app
+from invenio_search import current_search_client
+from invenio_search.engine import dsl, search
+from invenio_search.utils import prefix_index
+
+from .proxies import current_stats
+
+RUNS_CACHE_KEY = "stats:aggregation-runs:{}"
+"""Cache key of the recent runs of an aggregation."""
+
+RUNS_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+"""Number of seconds during which the recent runs are kept."""
+
+QUEUED_CACHE_KEY = "stats:queued-since:{}"
+"""Cache key of the date of the first publishing to a queue since consumed."""
+
+QUEUE_DEPTH_CACHE_KEY = "stats:queue-depth:{}"
+"""Cache key of the depth of a queue, refreshed in the background."""
+
+
+def _parse_date(value):
+    """Parse a date, considering the naive dates as UTC."""
+    date = parser.parse(value)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date
+
+
+def _seconds(since, now):
+    if since is None:
+        return None
+    return round(max((now - since).total_seconds(), 0), 3)
+
+
+def _format(date):
+    return date.isoformat() if date is not None else None
+
+
+def _cache(app=None):
+    """Get the cache of the application, if any.
+
+    The aggregators can be run without the extensions, e.g. in scripts, in
+    which case their runs are not recorded.
+    """
+    extension = (app or current_app).extensions.get("invenio-cache")
+    return extension.cache if extension is not None else None
+
+
+def record_aggregation_run(aggregation, covered, elapsed):
+    """Record the throughput of a run of an aggregation.
+
+    :param aggregation: name of the aggregation.
+    :param covered: number of seconds of events aggregated by the run.
+    :param elapsed: duration of the run, in seconds.
+    """
+    cache = _cache()
+    if cache is None or elapsed <= 0:
+        return
+    key = RUNS_CACHE_KEY.format(aggregation)
+    runs = cache.get(key) or []
+    runs.append((covered, elapsed))
+    runs = runs[-current_app.config["STATS_STATUS_RECENT_RUNS"] :]
+    cache.set(key, runs, timeout=RUNS_CACHE_TIMEOUT)
+
+
+def aggregation_throughput(aggregation):
+    """Get the throughput of the recent runs of an aggregation.
+
+    :returns: the number of seconds of events aggregated per second, or
+        ``None`` if no run was recorded.
+    """
+    cache = _cache()
+    runs = cache.get(RUNS_CACHE_KEY.format(aggregation)) if cache else None
+    if not runs:
+        return None
+    elapsed = sum(elapsed for _, elapsed in runs)
+    return sum(covered for covered, _ in runs) / elapsed
+
+
+def record_published(event_type, app=None):
+    """Record that events were published to their queue.
+
+    Only the date of the first publishing since the queue was consumed is
+    kept.
+    """
+    cache = _cache(app)
+    if cache is None:
+        return
+    cache.add(
+        QUEUED_CACHE_KEY.format(event_type),
+        datetime.now(timezone.utc).isoformat(),
+        timeout=RUNS_CACHE_TIMEOUT,
+    )
+
+
+def record_queue_depth(event_type, depth, timeout, app=None):
+    """Record the depth of the queue of an event type.
+
+    :param timeout: number of seconds after which the depth is unknown, unless
+        it is recorded again.
+    """
+    cache = _cache(app)
+    if cache is None:
+        return
+    cache.set(QUEUE_DEPTH_CACHE_KEY.format(event_type), depth, timeout=timeout)
+
+
+def recorded_queue_depth(event_type, app=None):
+    """Get the recorded depth of the queue of an event type.
+
+    :returns: the depth, or ``None`` if it wasn't recorded.
+    """
+    cache = _cache(app)
+    return cache.get(QUEUE_DEPTH_CACHE_KEY.format(event_type)) if cache else None
+
+
+@contextmanager
+def consuming_queue(event_type):
+    """Record that the queue of an event type is being consumed.
+
+    The events published before are consumed, thus the date of the first
+    publishing is reset, unless the consumption fails.
+    """
+    cache = _cache()
+    if cache is None:
+        yield
+        return
+    key = QUEUED_CACHE_KEY.format(event_type)
+    previous = cache.get(key)
+    cache.delete(key)
+    try:
+        yield
+    except Exception:
+        if previous is not None:
+            cache.set(key, previous, timeout=RUNS_CACHE_TIMEOUT)
+        raise
+
+
+def oldest_queued_date(event_type):
+    """Get the date of the first publishing to a queue since it was consumed.
+
+    :returns: the date, or ``None`` if it wasn't recorded.
+    """
+    cache = _cache()
+    value = cache.get(QUEUED_CACHE_KEY.format(event_type)) if cache else None
+    return _parse_date(value) if value else None
+
+
+def latest_event_date(event_type):
+    """Get the date of the latest indexed event of a type."""
+    event = current_stats.events[event_type]
+    client = event.params.get("client") or current_search_client
+    latest_search = dsl.Search(
+        using=client, index=prefix_index("events-stats-{}".format(event_type))
+    ).extra(size=0)
+    latest_search.aggs.metric("latest", "max", field="timestamp")
+    try:
+        latest = latest_search.execute().aggregations.latest
+    except search.exceptions.NotFoundError:
+        return None
+    value = getattr(latest, "value_as_string", None)
+    return _parse_date(value) if value else None
+
+
+def events_status(event_type, now=None):
+    """Get the status of the ingestion of an event type."""
+    now = now or datetime.now(timezone.utc)
+    depth = current_stats.refresh_queue_depth(event_type)
+    oldest = oldest_queued_date(event_type) if depth else None
+    latest = latest_event_date(event_type)
+    return {
+        "queue_depth": depth,
+        "oldest_queued_event": _format(oldest),
+        "oldest_queued_event_age": _seconds(oldest, now),
+        "latest_event": _format(latest),
+        "latest_event_age": _seconds(latest, now),
+    }
+
+
+def aggregation_status(aggregation, now=None):
+    """Get the status of an aggregation.
+
+    The catch-up time is the estimated duration of a run aggregating all the
+    events since the bookmark, at the throughput of the recent runs.
+    """
+    now = now or datetime.now(timezone.utc)
+    config = current_stats.aggregations[aggregation]
+    aggregator = config.cls(name=config.name, **config.params)
+    bookmark = aggregator.bookmark_api.find_bookmark(refresh_time=0)
+    lag = _seconds(bookmark, now)
+    throughput = aggregation_throughput(aggregation)
+    return {
+        "event": config.params.get("event"),
+        "bookmark": _format(bookmark),
+        "lag": lag,
+        "throughput": round(throughput, 3) if throughput is not None else None,
+        "catch_up": (
+            round(lag / throughput, 3) if lag is not None and throughput else None
+        ),
+    }
+
+
+def get_status(now=None):
+    """Get the status of the events and of the aggregations."""
+    now = now or datetime.now(timezone.utc)
+    return {
+        "timestamp": now.isoformat(),
+        "events": {
+            event_type: events_status(event_type, now)
+            for event_type in current_stats.events
+        },
+        "aggregations": {
+            aggregation: aggregation_status(aggregation, now)
+            for aggregation in current_stats.aggregations
+        },
+    }
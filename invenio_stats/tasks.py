@@ -9,14 +9,21 @@ from datetime import timedelta, timezone
 
 from celery import shared_task
 from dateutil.parser import parse as dateutil_parse
+from flask import current_app
 
 from .proxies import current_stats
+from .retention import EventsPruner
+from .status import consuming_queue
 
 StatsEventTask = {
     "task": "invenio_stats.tasks.process_events",
     "schedule": timedelta(minutes=30),
     "args": [("record-view", "file-download")],
 }
+StatsQueueDepthTask = {
+    "task": "invenio_stats.tasks.refresh_queue_depths",
+    "schedule": timedelta(seconds=10),
+}
 StatsAggregationTask = {
     "task": "invenio_stats.tasks.aggregate_events",
     "schedule": timedelta(hours=1),
@@ -36,14 +43,31 @@ def process_events(event_types):
     for event_name in event_types:
         event_cfg = current_stats.events[event_name]
         processor = event_cfg.cls(**event_cfg.params)
-        results.append((event_name, processor.run()))
+        with consuming_queue(event_name):
+            results.append((event_name, processor.run()))
+        if current_stats.backlog_policy is not None:
+            current_stats.refresh_queue_depth(event_name)
 
+    current_stats.push_metrics()
     return results
 
 
+@shared_task
+def refresh_queue_depths(event_types=None):
+    """Record the depth of the events queues, read by the backlog policy."""
+    for event_name in event_types or current_stats.events:
+        current_stats.refresh_queue_depth(event_name)
+
+
 @shared_task
 def aggregate_events(
-    aggregations, start_date=None, end_date=None, update_bookmark=True
+    aggregations,
+    start_date=None,
+    end_date=None,
+    update_bookmark=True,
+    backfill=False,
+    drop_replicas=False,
+    update_totals=True,
 ):
     """Aggregate indexed events."""
     start_date = (
@@ -56,6 +80,40 @@ def aggregate_events(
     for aggr_name in aggregations:
         aggr_cfg = current_stats.aggregations[aggr_name]
         aggregator = aggr_cfg.cls(name=aggr_cfg.name, **aggr_cfg.params)
-        results.append(aggregator.run(start_date, end_date, update_bookmark))
+        results.append(
+            aggregator.run(
+                start_date,
+                end_date,
+                update_bookmark,
+                backfill=backfill,
+                drop_replicas=drop_replicas,
+                update_totals=update_totals,
+            )
+        )
+
+    current_stats.push_metrics()
+    return results
+
+
+@shared_task
+def drain_events_spool():
+    """Publish the events of the local spool."""
+    return current_stats.drain_spool()
+
+
+@shared_task
+def prune_events(event_types, dry_run=False, force_merge=True):
+    """Delete the raw events indices which have been aggregated."""
+    config = current_app.config
+    results = []
+    for event_name in event_types:
+        pruner = EventsPruner(
+            event_name,
+            retention_days=config["STATS_EVENTS_RETENTION_DAYS"],
+            snapshot_repository=config["STATS_EVENTS_PRUNE_SNAPSHOT_REPOSITORY"],
+            export_path=config["STATS_EVENTS_PRUNE_EXPORT_PATH"],
+            codec=config["STATS_EVENTS_PRUNE_CODEC"],
+        )
+        results.append((event_name, pruner.run(dry_run, force_merge)))
 
     return results
@@ -3,18 +3,33 @@
 
 """Celery background tasks."""
 
+from importlib.util import find_spec
+
 from flask import current_app
 
 from .proxies import current_stats
 
 
+def _template_variant(templates):
+    """Return the configured variant of a templates package, if it exists."""
+    variant = current_app.config["STATS_TEMPLATES_VARIANT"]
+    if not variant:
+        return templates
+    variant_templates = "{0}.{1}".format(templates, variant)
+    if find_spec(variant_templates) is None:
+        return templates
+    return variant_templates
+
+
 def _collect_templates():
     """Return event and aggregation templates from config."""
     event_templates = [
-        event["templates"] for event in current_stats.events_config.values()
+        _template_variant(event["templates"])
+        for event in current_stats.events_config.values()
     ]
     aggregation_templates = [
-        agg["templates"] for agg in current_stats.aggregations_config.values()
+        _template_variant(agg["templates"])
+        for agg in current_stats.aggregations_config.values()
     ]
 
     return event_templates + aggregation_templates
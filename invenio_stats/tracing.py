@@ -0,0 +1,285 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Tracing of the events from their emission to their aggregation.
+
+The emitted events which are sampled carry the context of their trace in
+their ``traceparent`` field (in the W3C Trace Context format), so that the
+spans of their processing are part of the same trace. The processing and the
+aggregations are also traced by batch, interval and partition.
+
+Tracing is disabled unless an exporter is configured, e.g. a
+:class:`FileExporter` writing the sampled spans to a local file for offline
+analysis.
+"""
+
+import json
+import random
+import threading
+import time
+
+from flask import current_app
+
+TRACE_FIELD = "traceparent"
+"""Field of the events carrying the context of their trace."""
+
+
+def _random_id(bits):
+    return "{:0{}x}".format(random.getrandbits(bits) or 1, bits // 4)
+
+
+def parse_traceparent(traceparent):
+    """Parse a trace context.
+
+    :returns: a ``(trace_id, span_id, sampled)`` tuple, or ``None`` if the
+        trace context is invalid.
+    """
+    try:
+        version, trace_id, span_id, flags = traceparent.split("-")
+        sampled = bool(int(flags, 16) & 1)
+    except (AttributeError, ValueError):
+        return None
+    if len(trace_id) != 32 or len(span_id) != 16:
+        return None
+    return trace_id, span_id, sampled
+
+
+class Span(object):
+    """A timed operation of a trace."""
+
+    def __init__(
+        self,
+        tracer,
+        name,
+        trace_id,
+        parent_id=None,
+        sampled=True,
+        links=None,
+        attributes=None,
+    ):
+        """Constructor."""
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _random_id(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.links = links or []
+        self.attributes = attributes or {}
+        self.error = None
+        self.start_time = time.time()
+        self.end_time = None
+
+    @property
+    def traceparent(self):
+        """Context of the span, in the W3C Trace Context format."""
+        return "00-{}-{}-{}".format(
+            self.trace_id, self.span_id, "01" if self.sampled else "00"
+        )
+
+    def set_attribute(self, key, value):
+        """Set an attribute of the span."""
+        self.attributes[key] = value
+
+    def end(self):
+        """End the span, and export it if it's sampled."""
+        if self.end_time is not None:
+            return
+        self.end_time = time.time()
+        if self.sampled:
+            self.tracer.export(self)
+
+    def to_dict(self):
+        """Get the exported representation of the span."""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "links": self.links,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": round((self.end_time - self.start_time) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def __enter__(self):
+        """Enter the span."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """End the span, recording the error if any."""
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.error = "{}: {}".format(exc_type.__name__, exc_value)
+        self.end()
+
+
+class _NoopSpan(object):
+    """Span of a disabled tracer."""
+
+    traceparent = None
+    sampled = False
+
+    def set_attribute(self, key, value):
+        """Ignore the attribute."""
+
+    def end(self):
+        """Do nothing."""
+
+    def __enter__(self):
+        """Enter the span."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Do nothing."""
+
+
+NOOP_SPAN = _NoopSpan()
+"""Span returned by :func:`start_span` when tracing is disabled."""
+
+
+class Tracer(object):
+    """Start spans, and export the sampled ones.
+
+    The traces are sampled when their first span is started: the spans whose
+    parent is given inherit its sampling decision.
+    """
+
+    def __init__(self, exporter, sampling_rate=1.0):
+        """Constructor.
+
+        :param exporter: object exporting the sampled spans with its
+            ``export(span)`` method.
+        :param sampling_rate: probability of sampling a trace.
+        """
+        self.exporter = exporter
+        self.sampling_rate = sampling_rate
+
+    def start_span(self, name, parent=None, links=None, **attributes):
+        """Start a span.
+
+        :param parent: parent span, or context of the parent span.
+        :param links: spans or contexts of spans related to the span, e.g. the
+            batch in which an event is processed.
+        :param attributes: attributes of the span.
+        """
+        if isinstance(parent, str):
+            parent = parse_traceparent(parent)
+        elif parent is not None:
+            parent = (parent.trace_id, parent.span_id, parent.sampled)
+
+        if parent is None:
+            trace_id = _random_id(128)
+            parent_id = None
+            sampled = random.random() < self.sampling_rate
+        else:
+            trace_id, parent_id, sampled = parent
+
+        return Span(
+            self,
+            name,
+            trace_id,
+            parent_id=parent_id,
+            sampled=sampled,
+            links=[
+                link if isinstance(link, str) else link.traceparent
+                for link in links or []
+                if link is not None and link is not NOOP_SPAN
+            ],
+            attributes=attributes,
+        )
+
+    def export(self, span):
+        """Export a sampled span."""
+        try:
+            self.exporter.export(span)
+        except Exception:
+            # tracing must not break what it traces
+            pass
+
+
+class FileExporter(object):
+    """Append the spans to a file, one JSON object per line."""
+
+    def __init__(self, path):
+        """Constructor.
+
+        :param path: path of the file to which the spans are appended.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        """Append a span to the file."""
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+
+
+class _NoopTracer(object):
+    """Tracer of the disabled tracing."""
+
+    def start_span(self, name, parent=None, links=None, **attributes):
+        """Start a no-op span."""
+        return NOOP_SPAN
+
+
+NOOP_TRACER = _NoopTracer()
+"""Tracer returned by :func:`current_tracer` when tracing is disabled."""
+
+
+def current_tracer():
+    """Get the tracer of the application, if tracing is enabled.
+
+    The events can be processed and aggregated without the extension, e.g. in
+    scripts, in which case nothing is traced.
+
+    :returns: the tracer, or :data:`NOOP_TRACER`.
+    """
+    state = current_app.extensions.get("invenio-stats")
+    tracer = state.tracer if state is not None else None
+    return tracer if tracer is not None else NOOP_TRACER
+
+
+def start_span(name, parent=None, links=None, **attributes):
+    """Start a span with the application's tracer, if tracing is enabled."""
+    return current_tracer().start_span(name, parent=parent, links=links, **attributes)
+
+
+class TracedBatches(object):
+    """Iterate over the events of a queue, tracing them by batch.
+
+    A span is started for each batch of ``size`` events, and ended when the
+    next batch starts, i.e. once the events of the batch are processed. The
+    context of the trace of each event is removed from the event, and kept in
+    ``context`` while it is being processed.
+    """
+
+    def __init__(self, tracer, events, name, size, **attributes):
+        """Constructor."""
+        self.tracer = tracer
+        self.events = events
+        self.name = name
+        self.size = size
+        self.attributes = attributes
+        self.span = None
+        self.context = None
+
+    def __iter__(self):
+        """Iterate over the events."""
+        try:
+            for count, event in enumerate(self.events):
+                if count % self.size == 0:
+                    if self.span is not None:
+                        self.span.end()
+                    self.span = self.tracer.start_span(self.name, **self.attributes)
+                self.span.set_attribute("events", count % self.size + 1)
+                self.context = (
+                    event.pop(TRACE_FIELD, None) if isinstance(event, dict) else None
+                )
+                yield event
+        finally:
+            if self.span is not None:
+                self.span.end()
@@ -115,6 +115,12 @@ AllowAllPermission = type(
     {"can": lambda self: True, "allows": lambda *args: True},
 )()
 
+DenyAllPermission = type(
+    "Deny",
+    (),
+    {"can": lambda self: False, "allows": lambda *args: False},
+)()
+
 
 def default_permission_factory(query_name, params):
     """Default permission factory.
@@ -128,3 +134,30 @@ def default_permission_factory(query_name, params):
         return AllowAllPermission
     else:
         return current_stats.queries[query_name].permission_factory(query_name, params)
+
+
+def default_metrics_permission_factory():
+    """Default permission factory of the metrics endpoint.
+
+    The metrics expose details about the message broker and the search
+    cluster, thus they are denied to everyone by default.
+    """
+    return DenyAllPermission
+
+
+def default_status_permission_factory():
+    """Default permission factory of the status endpoint.
+
+    The status exposes details about the message broker and the search
+    cluster, thus it is denied to everyone by default.
+    """
+    return DenyAllPermission
+
+
+def default_profiling_permission_factory(query_name, params):
+    """Default permission factory of the queries profiling.
+
+    Profiles expose details about the search cluster, thus they are denied to
+    everyone by default.
+    """
+    return DenyAllPermission
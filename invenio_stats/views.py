@@ -3,13 +3,33 @@
 
 """InvenioStats views."""
 
-from flask import Blueprint, abort, jsonify, request
+import csv
+import hashlib
+import io
+import json
+from itertools import chain
+
+from flask import (
+    Blueprint,
+    abort,
+    current_app,
+    jsonify,
+    request,
+    stream_with_context,
+)
+from flask.views import MethodView
+from invenio_cache import current_cache
 from invenio_i18n import gettext as _
 from invenio_rest.views import ContentNegotiatedMethodView
 from invenio_search.engine import search
 
+from .coalescing import QueryCoalescer
 from .errors import InvalidRequestInputError, UnknownQueryError
+from .metrics import CONTENT_TYPE
+from .profiling import QueryProfile
 from .proxies import current_stats
+from .queries import encode_cursor
+from .status import get_status
 from .utils import current_user
 
 blueprint = Blueprint(
@@ -19,6 +39,31 @@ blueprint = Blueprint(
 )
 
 
+def check_endpoint_permission(permission_factory):
+    """Abort the request if the user can't access an endpoint."""
+    permission = permission_factory()
+    if permission is not None and not permission.can():
+        abort(403 if current_user.is_authenticated else 401)
+
+
+def check_permission(stat, params, permission_factory=None):
+    """Abort the request if the user can't query the statistic."""
+    permission_factory = permission_factory or current_stats.permission_factory
+    permission = permission_factory(stat, params)
+    if permission is not None and not permission.can():
+        message = _(
+            "You do not have a permission to query the "
+            'statistic "%(stat)s" with those '
+            "parameters",
+            stat=stat,
+        )
+
+        if current_user.is_authenticated:
+            abort(403, message)
+
+        abort(401, message)
+
+
 class StatsQueryResource(ContentNegotiatedMethodView):
     """REST API resource providing access to statistics."""
 
@@ -37,13 +82,149 @@ class StatsQueryResource(ContentNegotiatedMethodView):
             **kwargs,
         )
 
+    @staticmethod
+    def _coalesced_run(stat, query, params):
+        """Run a query, coalescing it with identical concurrent ones."""
+        coalescer = current_stats.query_coalescer
+        if coalescer is None:
+            return query.run(**params)
+        return coalescer.run(stat, params, lambda: query.run(**params))
+
+    def _run_query(self, stat, query, params):
+        """Run a query, measuring its time and errors if the metrics are enabled."""
+        metrics = current_stats.metrics
+        if metrics is None:
+            return self._coalesced_run(stat, query, params)
+        try:
+            with metrics.timer("query_seconds", stat=stat):
+                return self._coalesced_run(stat, query, params)
+        except (ValueError, search.exceptions.NotFoundError):
+            # invalid parameters, or nothing aggregated yet
+            raise
+        except Exception:
+            metrics.inc("query_errors_total", stat=stat)
+            raise
+
+    @staticmethod
+    def _is_unavailable(error):
+        """Check if a search error is due to an unavailable search cluster."""
+        if isinstance(error, search.exceptions.ConnectionError):
+            return True
+        status = getattr(error, "status_code", None)
+        return isinstance(status, int) and (status == 429 or status >= 500)
+
+    @staticmethod
+    def _stale_result_key(stat, params):
+        """Build the cache key of the last result of a query."""
+        return "stats:stale-result:{}".format(QueryCoalescer.build_key(stat, params))
+
+    def _store_result(self, stat, params, result):
+        """Keep the result of a query, to serve it if the next ones fail."""
+        current_cache.set(
+            self._stale_result_key(stat, params),
+            result,
+            timeout=current_app.config["STATS_QUERY_STALE_RESULTS_TIMEOUT"],
+        )
+
+    def _get_stale_result(self, stat, params):
+        """Get the last result of a query, marked as stale."""
+        result = current_cache.get(self._stale_result_key(stat, params))
+        if result is None:
+            return {"error": _("The statistic is temporarily unavailable.")}
+        return {**result, "stale": True}
+
+    @staticmethod
+    def _get_profiling_mode():
+        """Get the profiling mode requested via the ``profile`` argument."""
+        mode = request.args.get("profile", "").lower()
+        if mode in ("", "0", "false"):
+            return None
+        return "search" if mode == "search" else "timings"
+
+    @staticmethod
+    def _get_validators(data, stats):
+        """Compute the ETag and last modification date of a response.
+
+        The ETag is derived from the normalized request and the latest bookmark
+        of the aggregations behind each requested statistic, so that it only
+        changes when new aggregation results are available. The bookmarks are
+        cached for ``STATS_QUERY_COALESCING_TIMEOUT`` seconds. No validators are
+        returned if any of the statistics doesn't read from an aggregation, or
+        also includes the raw events which have not been aggregated yet.
+        """
+        bookmarks = {}
+        for stat in stats:
+            aggregations = current_stats.get_query_aggregations(stat)
+            recent_events = getattr(
+                current_stats.get_query(stat), "recent_events", None
+            )
+            if not aggregations or recent_events:
+                return None, None
+            for aggregation in aggregations:
+                if aggregation not in bookmarks:
+                    bookmarks[aggregation] = current_stats.get_aggregation_bookmark(
+                        aggregation, cached=True
+                    )
+
+        normalized = json.dumps(
+            {
+                "request": data,
+                "bookmarks": {
+                    k: v.isoformat() if v else None for k, v in bookmarks.items()
+                },
+            },
+            sort_keys=True,
+            default=str,
+        )
+        etag = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        last_modified = max((b for b in bookmarks.values() if b), default=None)
+        return etag, last_modified
+
+    @staticmethod
+    def _is_not_modified(etag, last_modified):
+        """Check if the client's cached response is still valid.
+
+        The POST requests are only validated with their ETag, which is derived
+        from their body, as the date of the response doesn't tell which
+        statistics it holds.
+        """
+        if request.if_none_match:
+            return request.if_none_match.contains(etag)
+        if request.method == "GET" and request.if_modified_since and last_modified:
+            return last_modified.replace(microsecond=0) <= request.if_modified_since
+        return False
+
+    def get(self, **kwargs):
+        """Get statistics, requested with the ``q`` query string argument.
+
+        The argument holds the same JSON object as the body of the POST
+        requests. Unlike those, the responses can be cached by the browsers
+        and proxies, for the ``max_age`` of the statistics, and revalidated
+        with the ``If-None-Match`` or ``If-Modified-Since`` headers.
+        """
+        try:
+            data = json.loads(request.args.get("q", "{}"))
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            raise InvalidRequestInputError(
+                _("Invalid Input. The q argument should be a JSON object.")
+            )
+        return self._get_statistics(data)
+
     def post(self, **kwargs):
         """Get statistics."""
         data = request.get_json(force=False)
         if data is None:
             data = {}
+        return self._get_statistics(data)
 
-        result = {}
+    def _get_statistics(self, data):
+        """Run the requested statistics queries, unless not modified."""
+        profiling = self._get_profiling_mode()
+        log_profiles = current_app.config["STATS_QUERY_PROFILING_LOG"]
+        profiles = {}
+        queries = {}
         for query_name, config in data.items():
             if (
                 config is None
@@ -70,37 +251,262 @@ class StatsQueryResource(ContentNegotiatedMethodView):
             except KeyError:
                 raise UnknownQueryError(stat)
 
-            permission = current_stats.permission_factory(stat, params)
-            if permission is not None and not permission.can():
-                message = _(
-                    "You do not have a permission to query the "
-                    'statistic "%(stat)s" with those '
-                    "parameters",
-                    stat=stat,
+            if profiling:
+                check_permission(
+                    stat, params, current_stats.profiling_permission_factory
                 )
+            if profiling or log_profiles:
+                profile = profiles[query_name] = QueryProfile(
+                    stat, search_profile=profiling == "search"
+                )
+                with profile.timer("permission"):
+                    check_permission(stat, params)
+            else:
+                check_permission(stat, params)
+            queries[query_name] = (stat, query, params)
 
-                if current_user.is_authenticated:
-                    abort(403, message)
+        stats = {stat for stat, _, _ in queries.values()}
+        etag, last_modified = (
+            # profiled requests are always run
+            self._get_validators(data, stats)
+            if stats and not profiling
+            else (None, None)
+        )
+        degraded = False
+        if etag and self._is_not_modified(etag, last_modified):
+            response = current_app.response_class(status=304)
+            if current_stats.metrics is not None:
+                for stat, _, _ in queries.values():
+                    current_stats.metrics.inc(
+                        "query_cache_hits_total", stat=stat, cache="not_modified"
+                    )
+        else:
+            stale_results = current_app.config["STATS_QUERY_STALE_RESULTS"]
+            result = {}
+            for query_name, (stat, query, params) in queries.items():
+                profile = profiles.get(query_name)
+                try:
+                    if profile is None:
+                        result[query_name] = self._run_query(stat, query, params)
+                    else:
+                        with profile.activate(), profile.timer("total"):
+                            # profiled requests are not coalesced with others
+                            result[query_name] = (
+                                query.run(**params)
+                                if profiling
+                                else self._run_query(stat, query, params)
+                            )
 
-                abort(401, message)
+                except ValueError as e:
+                    raise InvalidRequestInputError(e.args[0])
+                except search.exceptions.NotFoundError:
+                    # In case there is no index or value for the metric we return 0
+                    result[query_name] = dict.fromkeys(query.metric_fields.keys(), 0)
+                except search.exceptions.TransportError as e:
+                    if not stale_results or not self._is_unavailable(e):
+                        raise
+                    # serve the other statistics instead of failing the request
+                    current_app.logger.warning(
+                        "Statistic query %s (%s) failed: %s", query_name, stat, e
+                    )
+                    result[query_name] = self._get_stale_result(stat, params)
+                    degraded = True
+                    if current_stats.metrics is not None:
+                        current_stats.metrics.inc(
+                            "query_cache_hits_total", stat=stat, cache="stale"
+                        )
+                else:
+                    if stale_results and not result[query_name].get("timed_out"):
+                        self._store_result(stat, params, result[query_name])
+
+            for query_name, profile in profiles.items():
+                current_app.logger.info(
+                    "Profile of statistic query %s (%s)",
+                    query_name,
+                    profile.stat,
+                    extra={"stats_profile": profile.to_dict(search_profile=False)},
+                )
+            if profiling:
+                result["_profile"] = {
+                    query_name: profile.to_dict()
+                    for query_name, profile in profiles.items()
+                }
+
+            response = self.make_response(result)
+
+        if etag and not degraded:
+            response.set_etag(etag)
+            if last_modified and request.method == "GET":
+                response.last_modified = last_modified
+
+        max_ages = [current_stats.queries[stat].max_age for stat in stats]
+        if (
+            request.method == "GET"
+            and max_ages
+            and None not in max_ages
+            and not (profiling or degraded)
+        ):
+            response.cache_control.max_age = min(max_ages)
+
+        return response
 
-            try:
-                result[query_name] = query.run(**params)
 
-            except ValueError as e:
-                raise InvalidRequestInputError(e.args[0])
-            except search.exceptions.NotFoundError:
-                # In case there is no index or value for the metric we return 0
-                result[query_name] = dict.fromkeys(query.metric_fields.keys(), 0)
+class StatsExportResource(MethodView):
+    """REST API resource streaming the export of a statistic.
 
-        return self.make_response(result)
+    The rows are streamed as NDJSON or CSV while being fetched page by page.
+    In NDJSON exports, each page of rows is followed by a ``{"cursor": ...}``
+    line, which can be sent back as ``cursor`` to resume the export after
+    this page. Alternatively, an export can be resumed after any row by
+    sending the row's aggregated fields as ``after``.
+    """
+
+    view_name = "stat_export"
+
+    mimetypes = {
+        "ndjson": "application/x-ndjson",
+        "csv": "text/csv",
+    }
+
+    @staticmethod
+    def _ndjson(query, pages):
+        """Serialize the exported rows as NDJSON."""
+        for rows, cursor in pages:
+            yield "".join(json.dumps(row) + "\n" for row in rows)
+            yield json.dumps({"cursor": cursor}) + "\n"
+
+    @staticmethod
+    def _csv(query, pages):
+        """Serialize the exported rows as CSV."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(
+            buffer, fieldnames=query.aggregated_fields + list(query.metric_fields)
+        )
+        writer.writeheader()
+        for rows, _cursor in pages:
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    def post(self, **kwargs):
+        """Export a statistic."""
+        data = request.get_json(force=False)
+        if (
+            not isinstance(data, dict)
+            or "stat" not in data
+            or not set(data) <= {"stat", "params", "format", "cursor", "after"}
+            or data.get("format", "ndjson") not in self.mimetypes
+        ):
+            raise InvalidRequestInputError(
+                _(
+                    "Invalid Input. It should be of the form "
+                    '{ "stat": STAT_TYPE, "params": STAT_PARAMS, '
+                    '"format": "ndjson" | "csv", "cursor": CURSOR }'
+                )
+            )
+
+        stat = data["stat"]
+        params = data.get("params", {})
+        export_format = data.get("format", "ndjson")
+        try:
+            query = current_stats.get_query(stat)
+        except KeyError:
+            raise UnknownQueryError(stat)
+        if not hasattr(query, "export"):
+            raise InvalidRequestInputError(
+                _('The statistic "%(stat)s" cannot be exported.', stat=stat)
+            )
+
+        check_permission(stat, params)
+
+        cursor = data.get("cursor")
+        if data.get("after"):
+            cursor = encode_cursor(data["after"])
+        pages = query.export(
+            cursor=cursor,
+            page_size=current_app.config["STATS_EXPORT_PAGE_SIZE"],
+            **params,
+        )
+        # fetch the first page before streaming, so that errors are reported
+        try:
+            first_page = next(pages, None)
+        except ValueError as e:
+            raise InvalidRequestInputError(e.args[0])
+        except search.exceptions.NotFoundError:
+            first_page = None
+        if first_page is not None:
+            pages = chain([first_page], pages)
+        else:
+            pages = iter([])
+
+        serializer = self._csv if export_format == "csv" else self._ndjson
+        return current_app.response_class(
+            stream_with_context(serializer(query, pages)),
+            mimetype=self.mimetypes[export_format],
+        )
+
+
+class StatsMetricsResource(MethodView):
+    """Metrics of the statistics, in the Prometheus text format."""
+
+    view_name = "stat_metrics"
+
+    def get(self):
+        """Get the metrics."""
+        metrics = current_stats.metrics
+        if metrics is None:
+            abort(404)
+        check_endpoint_permission(current_stats.metrics_permission_factory)
+        return current_app.response_class(metrics.render(), content_type=CONTENT_TYPE)
+
+
+class StatsStatusResource(MethodView):
+    """Status of the events ingestion and of the aggregations, in JSON."""
+
+    view_name = "stat_status"
+
+    def get(self):
+        """Get the status."""
+        if not current_app.config["STATS_STATUS_ENDPOINT"]:
+            abort(404)
+        check_endpoint_permission(current_stats.status_permission_factory)
+        return jsonify(get_status())
 
 
 stats_view = StatsQueryResource.as_view(
     StatsQueryResource.view_name,
 )
 
+export_view = StatsExportResource.as_view(
+    StatsExportResource.view_name,
+)
+
+metrics_view = StatsMetricsResource.as_view(
+    StatsMetricsResource.view_name,
+)
+
+status_view = StatsStatusResource.as_view(
+    StatsStatusResource.view_name,
+)
+
 blueprint.add_url_rule(
     "",
     view_func=stats_view,
 )
+
+blueprint.add_url_rule(
+    "/export",
+    view_func=export_view,
+)
+
+blueprint.add_url_rule(
+    "/metrics",
+    view_func=metrics_view,
+)
+
+blueprint.add_url_rule(
+    "/status",
+    view_func=status_view,
+)
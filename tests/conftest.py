@@ -29,6 +29,7 @@ from invenio_search import current_search, current_search_client
 from kombu import Exchange
 from sqlalchemy_utils.functions import create_database, database_exists
 
+from invenio_stats.benchmark import in_memory_search
 from invenio_stats.contrib.config import (
     AGGREGATIONS_CONFIG,
     EVENTS_CONFIG,
@@ -39,6 +40,7 @@ from invenio_stats.contrib.event_builders import (
     build_record_unique_id,
     file_download_event_builder,
 )
+from invenio_stats.memory import InMemoryQueue
 from invenio_stats.processors import EventsIndexer, anonymize_user
 from invenio_stats.tasks import aggregate_events
 
@@ -192,6 +194,50 @@ def app(base_app, search):
     yield base_app
 
 
+@pytest.fixture()
+def offline_app_factory(create_app, app_config):
+    """Factory of applications without search cluster nor message broker.
+
+    The applications are built like ``base_app``, with an in-memory cache and
+    message broker, and the given config overrides.
+    """
+
+    def factory(**config):
+        return create_app(
+            **{
+                **app_config,
+                "CACHE_TYPE": "SimpleCache",
+                "QUEUES_BROKER_URL": "memory://",
+                "STATS_EVENTS": EVENTS_CONFIG,
+                "STATS_AGGREGATIONS": AGGREGATIONS_CONFIG,
+                "STATS_QUERIES": QUERIES_CONFIG,
+                **config,
+            }
+        )
+
+    return factory
+
+
+@pytest.fixture()
+def offline_config():
+    """Config overrides of ``offline_app``, e.g. overridden by a test module."""
+    return {}
+
+
+@pytest.fixture()
+def offline_app(offline_app_factory, offline_config):
+    """Application with an in-memory message broker and search client."""
+    app = offline_app_factory(**offline_config)
+    with app.app_context():
+        current_queues.declare()
+        try:
+            with in_memory_search():
+                yield app
+        finally:
+            # the queues of the in-memory broker are shared by the tests
+            current_queues.delete()
+
+
 @pytest.fixture()
 def config_with_index_prefix(app):
     """Add index prefix to the app config."""
@@ -347,8 +393,6 @@ def mock_datetime():
 @pytest.fixture()
 def mock_event_queue(app, mock_datetime, request_headers, objects, mock_user_ctx):
     """Create a mock queue containing a few file download events."""
-    mock_queue = Mock()
-    mock_queue.routing_key = "stats-file-download"
     with (
         patch("datetime.datetime", mock_datetime),
         app.test_request_context(headers=request_headers["user"]),
@@ -357,7 +401,7 @@ def mock_event_queue(app, mock_datetime, request_headers, objects, mock_user_ctx
             build_file_unique_id(file_download_event_builder({}, app, objects[0]))
             for idx in range(100)
         ]
-        mock_queue.consume.return_value = iter(events)
+    mock_queue = InMemoryQueue(iter(events), routing_key="stats-file-download")
     # Save the queued events for later tests
     mock_queue.queued_events = deepcopy(events)
     return mock_queue
@@ -406,9 +450,7 @@ def generate_events(
                 for event_idx in range(robot_event_number):
                     yield build_event(True)
 
-    mock_queue = Mock()
-    mock_queue.consume.return_value = generator_list()
-    mock_queue.routing_key = "stats-file-download"
+    mock_queue = InMemoryQueue(generator_list(), routing_key="stats-file-download")
 
     EventsIndexer(
         mock_queue,
@@ -5,17 +5,19 @@
 """Aggregation tests."""
 
 import datetime
-from unittest.mock import patch
+import json
+from unittest.mock import MagicMock, call, patch
 
 import pytest
 from conftest import _create_file_download_event
 from helpers import mock_date
 from invenio_search import current_search
-from invenio_search.engine import dsl
+from invenio_search.engine import dsl, search
 
 from invenio_stats import current_stats
 from invenio_stats.aggregations import StatAggregator, filter_robots
 from invenio_stats.processors import EventsIndexer
+from invenio_stats.queries import TotalsQuery
 from invenio_stats.tasks import aggregate_events, process_events
 
 
@@ -71,7 +73,7 @@ def test_overwriting_aggregations(app, search_clear, mock_event_queue):
         aggregations have not been overwritten
     """
     # Send some events
-    mock_event_queue.consume.return_value = [
+    mock_event_queue.events = [
         _create_file_download_event(date) for date in [(2017, 6, 1), (2017, 6, 2, 10)]
     ]
     # Note that the events use the current time. Let's mock that as well
@@ -92,7 +94,7 @@ def test_overwriting_aggregations(app, search_clear, mock_event_queue):
         if "file_id" in hit["_source"].keys():
             assert hit["_version"] == 1
 
-    mock_event_queue.consume.return_value = [
+    mock_event_queue.events = [
         _create_file_download_event(date)
         for date in [(2017, 6, 2, 15), (2017, 7, 1)]  # second event on the same date
     ]
@@ -193,7 +195,7 @@ def test_bookmark_removal(app, search_clear, mock_event_queue):
     This simulates the scenario where aggregations have been created but the
     the bookmarks have not been set due to an error.
     """
-    mock_event_queue.consume.return_value = [
+    mock_event_queue.events = [
         _create_file_download_event(date)
         for date in [(2017, 6, 2, 15), (2017, 7, 1)]  # second event on the same date
     ]
@@ -345,3 +347,232 @@ def test_metric_aggregations(app, search_clear, event_queues):
     assert results[0].count == 12  # 3 views over 4 differnet hour slices
     assert results[0].unique_count == 4  # 4 different hour slices accessed
     assert results[0].volume == 9000 * 12
+
+
+def test_weighted_aggregations(app, search_clear, event_queues):
+    """Test that the sampling weights of the events are summed up."""
+    events = []
+    for idx, weight in enumerate([None, 1.0, 2.5, 4.0]):
+        event = _create_file_download_event((2018, 1, 1, 12, idx))
+        if weight is not None:
+            event["weight"] = weight
+        events.append(event)
+    current_stats.publish("file-download", events)
+    process_events(["file-download"])
+    current_search.flush_and_refresh(index="*")
+
+    stat_agg = StatAggregator(
+        name="file-download-agg",
+        client=search_clear,
+        event="file-download",
+        field="file_id",
+        interval="day",
+    )
+    with patch("invenio_stats.aggregations.datetime", mock_date(2018, 1, 2)):
+        stat_agg.run()
+    current_search.flush_and_refresh(index="*")
+
+    results = dsl.Search(using=search_clear, index="stats-file-download").execute()
+    assert len(results) == 1
+    assert results[0].count == 8  # events without a weight count as one
+
+
+def test_aggregation_totals(app, search_clear, mock_event_queue):
+    """Test the materialization of all-time totals by the aggregator."""
+    mock_event_queue.events = [
+        _create_file_download_event(date) for date in [(2017, 6, 1), (2017, 6, 2, 10)]
+    ]
+    with patch("invenio_stats.processors.datetime", mock_date(2017, 6, 2, 11)):
+        EventsIndexer(mock_event_queue).run()
+    current_search.flush_and_refresh(index="*")
+
+    def _aggregate(*now):
+        aggregator = StatAggregator(
+            name="file-download-agg",
+            client=search_clear,
+            event="file-download",
+            field="unique_id",
+            totals=True,
+        )
+        with patch("invenio_stats.aggregations.datetime", mock_date(*now)):
+            aggregator.run()
+        current_search.flush_and_refresh(index="*")
+        return aggregator
+
+    aggregator = _aggregate(2017, 6, 2, 12)
+    unique_id = "B0000000000000000000000000000001_F0000000000000000000000000000001"
+    total = search_clear.get(index=aggregator.totals_index, id=unique_id)
+    assert total["_source"]["count"] == 2
+
+    # a new event on an already aggregated day only adds the difference
+    mock_event_queue.events = [_create_file_download_event((2017, 6, 2, 15))]
+    with patch("invenio_stats.processors.datetime", mock_date(2017, 6, 2, 16)):
+        EventsIndexer(mock_event_queue).run()
+    current_search.flush_and_refresh(index="*")
+    _aggregate(2017, 6, 2, 17)
+
+    total = search_clear.get(index=aggregator.totals_index, id=unique_id)
+    assert total["_source"]["count"] == 3
+
+    query = TotalsQuery(name="test-totals", index="stats-totals-file-download")
+    assert query.run(unique_id=unique_id) == {"value": 3}
+    assert query.run(unique_id=[unique_id, "unknown"])["buckets"] == [
+        {"key": unique_id, "value": 3},
+        {"key": "unknown", "value": 0},
+    ]
+
+    # deleting aggregations subtracts them from the totals
+    aggregator.delete(start_date=datetime.datetime(2017, 6, 2))
+    current_search.flush_and_refresh(index="*")
+    total = search_clear.get(index=aggregator.totals_index, id=unique_id)
+    assert total["_source"]["count"] == 1
+
+    # the totals can be rebuilt from the aggregations
+    search_clear.indices.delete(index=aggregator.totals_index)
+    assert aggregator.rebuild_totals() == 1
+    total = search_clear.get(index=aggregator.totals_index, id=unique_id)
+    assert total["_source"]["count"] == 1
+
+
+def test_backfill_settings(offline_app_factory):
+    """Test that the backfilled indices settings are restored after failures."""
+    app = offline_app_factory()
+    client = MagicMock()
+    client.indices.exists.return_value = True
+    client.indices.get_settings.side_effect = lambda index, flat_settings: {
+        index: {
+            "settings": {
+                "index.refresh_interval": "5s",
+                "index.number_of_replicas": "1",
+            }
+        }
+    }
+    with app.app_context():
+        stat_agg = StatAggregator(
+            name="file-download-agg",
+            client=client,
+            event="file-download",
+            field="file_id",
+        )
+
+        def agg_iter(dt, previous_bookmark):
+            yield {"_index": "stats-file-download-2018-01", "_source": {}}
+            raise ValueError()
+
+        def bulk(client, actions, **kwargs):
+            return len(list(actions)), 0
+
+        with (
+            patch.object(stat_agg, "agg_iter", side_effect=agg_iter),
+            patch.object(stat_agg.bookmark_api, "get_bookmark", return_value=None),
+            patch("invenio_stats.aggregations.dsl.Index"),
+            patch("invenio_search.engine.search.helpers.bulk", side_effect=bulk),
+            pytest.raises(ValueError),
+        ):
+            stat_agg.run(
+                start_date=datetime.datetime(2018, 1, 1, tzinfo=datetime.timezone.utc),
+                end_date=datetime.datetime(2018, 1, 1, tzinfo=datetime.timezone.utc),
+                backfill=True,
+                drop_replicas=True,
+            )
+
+    assert client.indices.put_settings.call_args_list == [
+        call(
+            index="stats-file-download-2018-01",
+            body={"index": {"refresh_interval": "-1", "number_of_replicas": 0}},
+        ),
+        call(
+            index="stats-file-download-2018-01",
+            body={"index": {"refresh_interval": "5s", "number_of_replicas": "1"}},
+        ),
+    ]
+    client.indices.refresh.assert_called_once_with(index="stats-file-download-2018-01")
+    report = stat_agg.backfill_report
+    assert report["indices"] == ["stats-file-download-2018-01"]
+    assert set(report) == {
+        "indices",
+        "duration",
+        "refresh_duration",
+        "periodic_refreshes_disabled",
+    }
+
+
+def test_totals_requests(offline_app_factory):
+    """Test that the totals are updated in the bulk requests of the documents."""
+    app = offline_app_factory()
+    client = MagicMock()
+    written = {}
+    client.mget.side_effect = lambda body: {
+        "docs": [
+            {
+                "found": True,
+                "_source": {"file_id": "F1", "count": written.get(doc["_id"], 1)},
+            }
+            for doc in body["docs"]
+        ]
+    }
+    pending = {}
+    client.index.side_effect = lambda index, id, body: pending.update({id: body})
+    client.delete.side_effect = lambda index, id: pending.pop(id)
+
+    def get(index, id):
+        if id not in pending:
+            raise search.NotFoundError(404, "not_found", {})
+        return {"_source": json.loads(json.dumps(pending[id]))}
+
+    client.get.side_effect = get
+    requests = []
+
+    def bulk(client, actions, **kwargs):
+        requests.append(list(actions))
+        if len(requests) == 1:
+            # the documents are written, but not the increments of the totals
+            written.update({a["_id"]: 3 for a in requests[-1][:-1]})
+            raise search.helpers.BulkIndexError("1 document(s) failed", [])
+        return len(requests[-1]), 0
+
+    with app.app_context():
+        stat_agg = StatAggregator(
+            name="file-download-agg",
+            client=client,
+            event="file-download",
+            field="file_id",
+            totals=True,
+        )
+
+        def agg_iter(dt, previous_bookmark):
+            for i in range(3):
+                yield {
+                    "_id": "F1-{}".format(i),
+                    "_index": "stats-file-download-2018-01",
+                    "_source": {"file_id": "F1", "count": 3},
+                }
+
+        def run():
+            stat_agg.run(
+                start_date=datetime.datetime(2018, 1, 1, tzinfo=datetime.timezone.utc),
+                end_date=datetime.datetime(2018, 1, 1, tzinfo=datetime.timezone.utc),
+            )
+
+        with (
+            patch.object(stat_agg, "agg_iter", side_effect=agg_iter),
+            patch.object(stat_agg.bookmark_api, "get_bookmark", return_value=None),
+            patch.object(stat_agg.bookmark_api, "set_bookmark"),
+            patch("invenio_stats.aggregations.dsl.Index"),
+            patch("invenio_search.engine.search.helpers.bulk", side_effect=bulk),
+        ):
+            with pytest.raises(search.helpers.BulkIndexError):
+                run()
+            assert "file-download-agg" in pending
+            # the retried run replays the increments of the failed request
+            run()
+
+    request, replayed, retried = requests
+    assert [a["_id"] for a in request] == ["F1-0", "F1-1", "F1-2", "F1"]
+    params = request[-1]["script"]["params"]
+    assert params["increments"] == {"count": 6}
+    assert replayed[-1]["script"]["params"]["increments"] == {"count": 6}
+    assert replayed[-1]["script"]["params"]["run_id"] == params["run_id"]
+    # the documents written by the failed request are not counted again
+    assert retried[-1]["script"]["params"]["increments"] == {"count": 0}
+    assert not pending
@@ -0,0 +1,68 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Events load shedding tests."""
+
+from unittest.mock import MagicMock, patch
+
+from invenio_stats.backpressure import BacklogPolicy
+from invenio_stats.tasks import refresh_queue_depths
+
+ROBOT_UA = "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)"
+
+
+def test_backlog_policy():
+    """Test the decisions of the default backlog policy."""
+    policy = BacklogPolicy(10, critical_watermark=100, low_priority=["file-download"])
+    robot = {"user_agent": ROBOT_UA}
+    assert policy("record-view", robot, 5) == ("accept", 1)
+    assert policy("record-view", robot, 10) == ("robot", 0)
+    assert policy("file-download", {}, 10) == ("low-priority", 0)
+    assert policy("record-view", {}, 10) == ("accept", 1)
+    assert policy("record-view", {}, 100) == ("sample", 0.1)
+
+
+def test_apply_backlog_policy(offline_app_factory):
+    """Test that the events are shed according to the queue depth."""
+    app = offline_app_factory(
+        STATS_EVENTS={"record-view": {"templates": "", "cls": MagicMock()}},
+        STATS_EVENTS_BACKLOG_HIGH_WATERMARK=10,
+        STATS_EVENTS_BACKLOG_CRITICAL_WATERMARK=100,
+        STATS_EVENTS_BACKLOG_SAMPLING_RATE=0.5,
+    )
+    state = app.extensions["invenio-stats"]
+    queue = MagicMock()
+    queue.queue.queue_declare.return_value = ("stats-record-view", 5, 1)
+    with patch(
+        "invenio_stats.ext.current_queues",
+        MagicMock(queues={"stats-record-view": queue}),
+    ):
+        # the events are accepted while the depth of the queue is unknown
+        assert state.apply_backlog_policy("record-view", {"idx": 0}) == {"idx": 0}
+        with app.app_context():
+            refresh_queue_depths()
+        state._queue_depths.clear()
+        assert state.apply_backlog_policy("record-view", {"idx": 1}) == {"idx": 1}
+        # the depth is read from the cache, and not from the broker
+        queue.queue.queue_declare.return_value = ("stats-record-view", 100, 1)
+        assert state.apply_backlog_policy("record-view", {"idx": 2}) == {"idx": 2}
+        assert queue.queue.queue_declare.call_count == 1
+
+        assert state.refresh_queue_depth("record-view") == 100
+        state._queue_depths.clear()
+        with patch("invenio_stats.ext.random.random", side_effect=[0.1, 0.9]):
+            assert state.apply_backlog_policy("record-view", {"weight": 2}) == {
+                "weight": 4
+            }
+            assert state.apply_backlog_policy("record-view", {}) is None
+        assert (
+            state.apply_backlog_policy("record-view", {"user_agent": ROBOT_UA}) is None
+        )
+        assert queue.queue.queue_declare.call_count == 2
+
+    assert state.backlog_decisions == {
+        ("record-view", "accept", "kept"): 2,
+        ("record-view", "sample", "kept"): 1,
+        ("record-view", "sample", "dropped"): 1,
+        ("record-view", "robot", "dropped"): 1,
+    }
@@ -0,0 +1,154 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""End-to-end benchmark tests."""
+
+import json
+from datetime import datetime, timezone
+
+import pytest
+from click.testing import CliRunner
+from flask.cli import ScriptInfo
+from invenio_search import current_search_client
+
+from invenio_stats.benchmark import EventsBenchmark, in_memory_search, percentiles
+from invenio_stats.cli import stats
+
+
+def test_percentiles():
+    """Test the percentiles of the latencies."""
+    assert percentiles([]) == {}
+    assert percentiles([i / 1000 for i in range(1, 101)]) == {
+        "p50": 50.5,
+        "p95": 96.0,
+        "p99": 100.0,
+        "max": 100.0,
+    }
+
+
+def test_generate(offline_app):
+    """Test the generation of the synthetic events."""
+    runner = EventsBenchmark(
+        "file-download", events=4, start_date=datetime(2026, 1, 1, tzinfo=timezone.utc)
+    )
+    events = runner.generate()
+    assert [e["timestamp"] for e in events] == [
+        "2026-01-01T00:00:00",
+        "2026-01-01T06:00:00",
+        "2026-01-01T12:00:00",
+        "2026-01-01T18:00:00",
+    ]
+    assert set(events[0]) >= {"bucket_id", "file_id", "file_key", "user_agent"}
+    # the identifiers can't collide with the ones of real events
+    assert events[0]["bucket_id"].startswith("benchmark-")
+    assert events[0]["file_id"].startswith("benchmark-")
+    assert EventsBenchmark("file-download", events=4).generate() == (
+        EventsBenchmark("file-download", events=4).generate()
+    )
+
+    with pytest.raises(ValueError):
+        EventsBenchmark("unknown", events=4).generate()
+
+
+def test_benchmark_run(offline_app):
+    """Test the stages of the benchmark."""
+    original = current_search_client._get_current_object()
+    with in_memory_search() as client:
+        assert current_search_client._get_current_object() is client
+        reports = EventsBenchmark("file-download", events=500, days=2, queries=5).run()
+        assert client.indices.exists(index="stats-file-download")
+        # the bookmarks are not updated
+        assert not client.search(index="stats-bookmarks")["hits"]["hits"]
+        # the events and aggregations of the benchmark are deleted
+        for index in ("events-stats-file-download", "stats-file-download"):
+            assert not client.search(index=index)["hits"]["hits"]
+    assert current_search_client._get_current_object() is original
+
+    reports = {report["stage"]: report for report in reports}
+    assert list(reports) == ["generate", "publish", "process", "aggregate", "query"]
+    assert reports["publish"]["count"] == 500
+    assert set(reports["publish"]["latencies"]) == {"p50", "p95", "p99", "max"}
+    assert reports["process"]["count"] == 500
+    assert reports["process"]["errors"] == 0
+    assert reports["aggregate"]["count"] > 0
+    assert reports["aggregate"]["errors"] == 0
+    assert reports["query"]["count"] == 10
+    assert reports["query"]["errors"] == 0
+    assert set(reports["query"]["queries"]) == {
+        "bucket-file-download-histogram",
+        "bucket-file-download-total",
+    }
+
+
+def test_benchmark_real_data(offline_app):
+    """Test that the benchmark leaves the real events and aggregations alone."""
+    real_event = {
+        "timestamp": "2000-01-05T00:00:00",
+        "unique_id": "B1_F1",
+        "updated_timestamp": "2000-01-05T00:00:00",
+    }
+    with in_memory_search() as client:
+        client.index(index="events-stats-file-download-2000-01", body=real_event)
+        client.index(
+            index="stats-file-download-2000-01",
+            body={"timestamp": "2000-01-05T00:00:00", "unique_id": "B1_F1"},
+        )
+        client.index(
+            index="stats-bookmarks",
+            body={"date": "2000-01-02T00:00:00", "aggregation_type": "agg"},
+        )
+        client.indices.refresh(index="*")
+        EventsBenchmark("file-download", events=100, days=2, queries=1).run()
+        for index in (
+            "events-stats-file-download",
+            "stats-file-download",
+            "stats-bookmarks",
+        ):
+            assert len(client.search(index=index)["hits"]["hits"]) == 1
+
+        # the benchmark refuses to aggregate the days of real events again
+        client.index(
+            index="events-stats-file-download-2000-01",
+            body={**real_event, "timestamp": "2000-01-02T12:00:00"},
+        )
+        client.indices.refresh(index="*")
+        with pytest.raises(ValueError):
+            EventsBenchmark("file-download", events=100, days=2).run()
+
+
+def test_benchmark_cli(offline_app, tmp_path):
+    """Test the "benchmark run" CLI command."""
+    runner = CliRunner()
+    script_info = ScriptInfo(create_app=lambda: offline_app)
+
+    result = runner.invoke(
+        stats, ["benchmark", "run", "unknown", "--yes"], obj=script_info
+    )
+    assert result.exit_code == 2
+    assert "Invalid event type" in result.output
+
+    result = runner.invoke(
+        stats,
+        [
+            "benchmark",
+            "run",
+            "record-view",
+            "--events",
+            "200",
+            "--in-memory",
+            "--json",
+            str(tmp_path / "reports.json"),
+            "--yes",
+        ],
+        obj=script_info,
+    )
+    assert result.exit_code == 0
+    assert "process: 200 events in" in result.output
+    reports = json.loads((tmp_path / "reports.json").read_text())
+    assert [report["stage"] for report in reports] == [
+        "generate",
+        "publish",
+        "process",
+        "aggregate",
+        "query",
+    ]
@@ -0,0 +1,85 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Buffered event emission tests."""
+
+import threading
+
+import pytest
+from flask import Flask
+
+from invenio_stats.buffering import EventBuffer
+
+
+class Publisher(object):
+    """Publish function recording the published batches."""
+
+    def __init__(self):
+        """Constructor."""
+        self.batches = []
+        self.published = threading.Event()
+
+    def __call__(self, event_type, events):
+        """Record a batch."""
+        self.batches.append((event_type, events))
+        self.published.set()
+
+
+def test_event_buffer_batches():
+    """Test that the events are published in batches by type."""
+    publisher = Publisher()
+    buffer = EventBuffer(Flask("test"), publisher, batch_size=3, flush_interval=60)
+    for idx in range(3):
+        buffer.put("file-download" if idx % 2 else "record-view", {"idx": idx})
+    assert publisher.published.wait(5)
+    buffer.close()
+    assert sorted(publisher.batches) == [
+        ("file-download", [{"idx": 1}]),
+        ("record-view", [{"idx": 0}, {"idx": 2}]),
+    ]
+
+
+def test_event_buffer_flush_interval():
+    """Test that the events are published after the flush interval."""
+    publisher = Publisher()
+    buffer = EventBuffer(Flask("test"), publisher, flush_interval=0.1)
+    buffer.put("record-view", {"idx": 0})
+    assert publisher.published.wait(5)
+    assert publisher.batches == [("record-view", [{"idx": 0}])]
+    buffer.close()
+
+
+@pytest.mark.parametrize("overflow, published", [("drop", 2), ("spill", 3)])
+def test_event_buffer_overflow(overflow, published):
+    """Test the overflow policies of the buffer."""
+    publisher = Publisher()
+    blocked = threading.Event()
+
+    def blocking_publish(event_type, events):
+        blocked.wait(5)
+        publisher(event_type, events)
+
+    buffer = EventBuffer(
+        Flask("test"),
+        blocking_publish,
+        max_size=1,
+        batch_size=1,
+        flush_interval=0.01,
+        overflow=overflow,
+    )
+    buffer.put("record-view", {"idx": 0})
+    # wait for the background thread to take the first event
+    while not buffer._queue.empty():
+        pass
+    buffer.put("record-view", {"idx": 1})
+    if overflow == "spill":
+        blocked.set()
+    buffer.put("record-view", {"idx": 2})
+    blocked.set()
+    buffer.close()
+
+    assert len(publisher.batches) == published
+    assert buffer.dropped == 3 - published
+
+    with pytest.raises(ValueError):
+        EventBuffer(Flask("test"), publisher, overflow="unknown")
@@ -0,0 +1,160 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Query coalescing tests."""
+
+import threading
+import time
+
+import pytest
+
+from invenio_stats.coalescing import QueryCoalescer
+
+
+class DictCache(object):
+    """Minimal in-memory cache with the Invenio-Cache interface."""
+
+    def __init__(self):
+        """Constructor."""
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def add(self, key, value, timeout=None):
+        """Set the value only if the key does not exist."""
+        with self.lock:
+            if key in self.data:
+                return False
+            self.data[key] = value
+            return True
+
+    def get(self, key):
+        """Get a value."""
+        return self.data.get(key)
+
+    def set(self, key, value, timeout=None):
+        """Set a value."""
+        self.data[key] = value
+
+    def delete(self, key):
+        """Delete a value."""
+        self.data.pop(key, None)
+
+
+def test_build_key():
+    """Test that the key does not depend on the parameters' order."""
+    key1 = QueryCoalescer.build_key("stat", {"a": 1, "b": "2"})
+    key2 = QueryCoalescer.build_key("stat", {"b": "2", "a": 1})
+    assert key1 == key2
+    assert key1 != QueryCoalescer.build_key("other-stat", {"a": 1, "b": "2"})
+    assert key1 != QueryCoalescer.build_key("stat", {"a": 2, "b": "2"})
+
+
+def test_coalescing_config(offline_app_factory):
+    """Test that the queries are only coalesced when enabled."""
+    app = offline_app_factory()
+    assert app.extensions["invenio-stats"].query_coalescer is None
+
+    app = offline_app_factory(STATS_QUERY_COALESCING=True)
+    coalescer = app.extensions["invenio-stats"].query_coalescer
+    assert isinstance(coalescer, QueryCoalescer)
+    assert coalescer.cache is None
+
+
+def test_concurrent_identical_queries():
+    """Test that concurrent identical queries run only once."""
+    coalescer = QueryCoalescer()
+    calls = []
+    results = []
+
+    def query():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"value": 42}
+
+    def request():
+        results.append(coalescer.run("stat", {"recid": "1"}, query))
+
+    threads = [threading.Thread(target=request) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{"value": 42}] * 10
+    assert coalescer.hits == {"stat": 9}
+    # each request gets its own copy of the result, the leader included
+    assert len({id(result) for result in results}) == 10
+
+    # once finished, a new request runs the query again
+    coalescer.run("stat", {"recid": "1"}, query)
+    assert len(calls) == 2
+
+
+def test_errors_are_shared():
+    """Test that the waiting requests get the error of the query."""
+    coalescer = QueryCoalescer()
+    errors = []
+
+    def query():
+        time.sleep(0.2)
+        raise ValueError("invalid")
+
+    def request():
+        try:
+            coalescer.run("stat", {}, query)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=request) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(errors) == 5
+
+
+def test_coalescing_across_processes():
+    """Test that the result of another process is used from the cache."""
+    cache = DictCache()
+    leader = QueryCoalescer(cache=cache, timeout=2, poll_interval=0.01)
+    follower = QueryCoalescer(cache=cache, timeout=2, poll_interval=0.01)
+    started = threading.Event()
+    calls = []
+
+    def query():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return {"value": 1}
+
+    thread = threading.Thread(target=leader.run, args=("stat", {}, query))
+    thread.start()
+    started.wait()
+    assert follower.run("stat", {}, query) == {"value": 1}
+    thread.join()
+    assert len(calls) == 1
+
+
+def test_coalescing_across_processes_leader_failure():
+    """Test that a failing leader lets the other processes run the query."""
+    cache = DictCache()
+    leader = QueryCoalescer(cache=cache, timeout=2, poll_interval=0.01)
+    follower = QueryCoalescer(cache=cache, timeout=2, poll_interval=0.01)
+    started = threading.Event()
+
+    def failing_query():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError()
+
+    def leader_run():
+        with pytest.raises(RuntimeError):
+            leader.run("stat", {}, failing_query)
+
+    thread = threading.Thread(target=leader_run)
+    thread.start()
+    started.wait()
+    assert follower.run("stat", {}, lambda: {"value": 2}) == {"value": 2}
+    thread.join()
@@ -4,12 +4,18 @@
 
 """Invenio Stats extension tests."""
 
+from datetime import datetime, timezone
+
 from flask import Flask
+from invenio_cache import InvenioCache, current_cache
 from invenio_queues import InvenioQueues
 from invenio_queues.proxies import current_queues
+from invenio_search import InvenioSearch
 
 from invenio_stats import InvenioStats
-from invenio_stats.contrib.config import EVENTS_CONFIG
+from invenio_stats.benchmark import in_memory_search
+from invenio_stats.bookmark import BookmarkAPI
+from invenio_stats.contrib.config import AGGREGATIONS_CONFIG, EVENTS_CONFIG
 from invenio_stats.ext import finalize_app
 from invenio_stats.proxies import current_stats
 
@@ -61,3 +67,43 @@ def test_finalize_app_warms_event_state():
         assert current_stats.events["file-download"].queue == (
             current_queues.queues["stats-file-download"]
         )
+
+
+def test_get_aggregation_bookmark():
+    """Test that the bookmarks are read without side effects, and cached."""
+    app = Flask("testapp")
+    app.config.update(
+        CACHE_TYPE="SimpleCache",
+        QUEUES_BROKER_URL="memory://",
+        STATS_AGGREGATIONS=AGGREGATIONS_CONFIG,
+    )
+    InvenioCache(app)
+    InvenioQueues(app)
+    InvenioSearch(app)
+    InvenioStats(app)
+
+    with app.app_context(), in_memory_search() as client:
+        assert current_stats.get_aggregation_bookmark("file-download-agg") is None
+        assert (
+            current_stats.get_aggregation_bookmark("file-download-agg", cached=True)
+            is None
+        )
+        # reading the bookmarks doesn't create their index
+        assert not client.indices.exists(index="stats-bookmarks")
+
+        BookmarkAPI(client, "file-download-agg", "day").set_bookmark(
+            "2026-01-01T00:00:00"
+        )
+        client.indices.refresh(index="stats-bookmarks")
+        bookmark = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        assert current_stats.get_aggregation_bookmark("file-download-agg") == bookmark
+        # the cached bookmark is reused until it expires
+        assert (
+            current_stats.get_aggregation_bookmark("file-download-agg", cached=True)
+            is None
+        )
+        current_cache.clear()
+        assert (
+            current_stats.get_aggregation_bookmark("file-download-agg", cached=True)
+            == bookmark
+        )
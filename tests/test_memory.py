@@ -0,0 +1,282 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""In-memory search client tests."""
+
+from datetime import datetime, timezone
+
+import pytest
+from invenio_search.engine import dsl, search
+
+from invenio_stats.aggregations import StatAggregator
+from invenio_stats.memory import InMemorySearchClient
+from invenio_stats.queries import DateHistogramQuery
+
+
+def _events(count):
+    """Build record-view events over three days."""
+    return [
+        {
+            "_index": "events-stats-record-view-2026-01",
+            "_id": str(i),
+            "_source": {
+                "timestamp": "2026-01-{:02d}T{:02d}:00:00".format(1 + i % 3, i // 3),
+                "unique_id": "recid_{}".format(i % 4),
+                "pid_value": str(i % 4),
+                "unique_session_id": "session-{}".format(i % 5),
+                "is_robot": i % 10 == 0,
+                "updated_timestamp": "2026-01-05T00:00:00+00:00",
+            },
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.fixture()
+def client():
+    """In-memory client with record-view events."""
+    client = InMemorySearchClient()
+    client.indices.put_template(
+        name="record-view",
+        body={
+            "index_patterns": ["events-stats-record-view-*"],
+            "settings": {"index": {"refresh_interval": "5s"}},
+            "aliases": {"events-stats-record-view": {}},
+        },
+    )
+    client.indices.put_template(
+        name="aggr-record-view",
+        body={
+            "index_patterns": ["stats-record-view-*"],
+            "aliases": {"stats-record-view": {}},
+        },
+    )
+    assert search.helpers.bulk(client, _events(60), stats_only=True) == (60, 0)
+    return client
+
+
+def test_search(client):
+    """Test the queries, sorting and paging of the searches."""
+    result = client.search(
+        index="events-stats-record-view",
+        body={
+            "query": {
+                "bool": {
+                    "filter": [
+                        {"term": {"timestamp": "2026-01-02T12:34:00||/d"}},
+                        {"terms": {"pid_value": ["1", "2"]}},
+                    ],
+                    "must_not": [{"term": {"is_robot": True}}],
+                }
+            },
+            "sort": [{"timestamp": {"order": "desc"}}, "pid_value"],
+            "size": 3,
+            "from": 1,
+            "_source": ["timestamp", "pid_value"],
+        },
+    )
+    assert result["hits"]["total"]["value"] == 9
+    assert [hit["_source"] for hit in result["hits"]["hits"]] == [
+        {"timestamp": "2026-01-02T16:00:00", "pid_value": "1"},
+        {"timestamp": "2026-01-02T15:00:00", "pid_value": "2"},
+        {"timestamp": "2026-01-02T12:00:00", "pid_value": "1"},
+    ]
+
+    # the date math roundings of the bounds
+    def count(bounds):
+        return client.count(
+            index="events-stats-record-view",
+            body={"query": {"range": {"timestamp": bounds}}},
+        )["count"]
+
+    assert count({"gte": "2026-01-02T12:00:00||/d"}) == 40
+    assert count({"gt": "2026-01-02T12:00:00||/d"}) == 20
+    assert count({"lte": "2026-01-02T12:00:00||/d"}) == 40
+    assert count({"lt": "2026-01-02T12:00:00||/d"}) == 20
+
+    # scan through the scroll API
+    assert len(list(dsl.Search(using=client, index="events-*").scan())) == 60
+
+    with pytest.raises(search.exceptions.NotFoundError):
+        client.search(index="unknown")
+
+
+def test_aggregations(client):
+    """Test the bucket and metric aggregations."""
+    query = dsl.Search(using=client, index="events-stats-record-view")[0:0]
+    query = query.filter("term", is_robot=False)
+    terms = query.aggs.bucket("terms", "terms", field="unique_id", size=2)
+    terms.metric("top_hit", "top_hits", size=1, sort={"timestamp": "desc"})
+    terms.metric("sessions", "cardinality", field="unique_session_id")
+    terms.metric("weight", "sum", field="weight", missing=1)
+    terms.metric("last_update", "max", field="updated_timestamp")
+    query.aggs.bucket("histogram", "date_histogram", field="timestamp", interval="day")
+    result = query.execute().to_dict()["aggregations"]
+
+    # ties are sorted by term
+    assert [b["key"] for b in result["terms"]["buckets"]] == ["recid_1", "recid_3"]
+    assert result["terms"]["sum_other_doc_count"] == 24
+    bucket = result["terms"]["buckets"][0]
+    assert bucket["doc_count"] == 15
+    assert bucket["sessions"]["value"] == 5
+    assert bucket["weight"]["value"] == 15
+    assert bucket["last_update"]["value_as_string"] == "2026-01-05T00:00:00.000Z"
+    assert bucket["top_hit"]["hits"]["hits"][0]["_source"]["timestamp"] == (
+        "2026-01-03T17:00:00"
+    )
+    assert [b["doc_count"] for b in result["histogram"]["buckets"]] == [18, 18, 18]
+
+    # the partitions of the terms cover all the terms
+    keys = set()
+    for partition in range(3):
+        result = client.search(
+            index="events-stats-record-view",
+            body={
+                "size": 0,
+                "aggs": {
+                    "terms": {
+                        "terms": {
+                            "field": "unique_id",
+                            "include": {"partition": partition, "num_partitions": 3},
+                        }
+                    }
+                },
+            },
+        )
+        keys.update(b["key"] for b in result["aggregations"]["terms"]["buckets"])
+    assert keys == {"recid_0", "recid_1", "recid_2", "recid_3"}
+
+    # the pages of a composite aggregation
+    rows, after = [], None
+    while True:
+        composite = {
+            "sources": [{"pid": {"terms": {"field": "pid_value"}}}],
+            "size": 3,
+        }
+        if after:
+            composite["after"] = after
+        result = client.search(
+            index="events-stats-record-view",
+            body={"size": 0, "aggs": {"rows": {"composite": composite}}},
+        )["aggregations"]["rows"]
+        if not result["buckets"]:
+            break
+        rows.extend(b["key"]["pid"] for b in result["buckets"])
+        after = result["after_key"]
+    assert rows == ["0", "1", "2", "3"]
+
+
+def test_indices(client):
+    """Test the management of the indices and aliases."""
+    index = "events-stats-record-view-2026-01"
+    assert client.indices.exists(index="events-stats-record-view")
+    settings = client.indices.get_settings(index=index, flat_settings=True)
+    assert settings[index]["settings"]["index.refresh_interval"] == "5s"
+    client.indices.put_settings(index=index, body={"index": {"refresh_interval": "-1"}})
+    settings = client.indices.get_settings(index=index)
+    assert settings[index]["settings"]["index"]["refresh_interval"] == "-1"
+
+    # writes through a rolled over alias
+    client.indices.create(
+        index="events-000001",
+        body={"aliases": {"events-write": {"is_write_index": True}}},
+    )
+    client.index(index="events-write", body={"timestamp": "2026-01-01"})
+    result = client.indices.rollover(
+        alias="events-write", body={"conditions": {"max_docs": 1}}
+    )
+    assert result["rolled_over"]
+    client.index(index="events-write", body={"timestamp": "2026-01-02"})
+    assert client.count(index="events-000002")["count"] == 1
+    assert client.count(index="events-write")["count"] == 2
+
+    client.indices.delete(index="events-*")
+    assert not client.indices.exists(index="events-write")
+    assert client.calls["indices.rollover"] == 1
+    assert client.timings["indices.rollover"] > 0
+
+
+def test_aggregation_run(offline_app, client):
+    """Test an aggregation and a query without search cluster."""
+    aggregator = StatAggregator(
+        "record-view-agg",
+        "record-view",
+        client=client,
+        field="unique_id",
+        copy_fields={"pid_value": "pid_value"},
+        metric_fields={
+            "unique_count": ("cardinality", "unique_session_id", {}),
+        },
+    )
+    aggregator.run(
+        start_date=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        end_date=datetime(2026, 1, 4, tzinfo=timezone.utc),
+    )
+    assert aggregator.bookmark_api.get_bookmark(refresh_time=0) == datetime(
+        2026, 1, 4, tzinfo=timezone.utc
+    )
+    doc = client.get(index="stats-record-view-2026-01", id="recid_1-2026-01-02")
+    assert doc["_source"]["count"] == 5
+    assert doc["_source"]["unique_count"] == 5
+
+    query = DateHistogramQuery(
+        name="record-view",
+        index="stats-record-view",
+        client=client,
+        required_filters={"recid": "pid_value"},
+        metric_fields={"views": ("sum", "count", {})},
+    )
+    result = query.run(
+        interval="day",
+        start_date=datetime(2026, 1, 1),
+        end_date=datetime(2026, 1, 3),
+        recid="1",
+    )
+    assert [bucket["views"] for bucket in result["buckets"]] == [5, 5, 5]
+
+    aggregator.delete(start_date=datetime(2026, 1, 2, tzinfo=timezone.utc))
+    assert client.count(index="stats-record-view")["count"] == 4
+
+
+def test_aggregation_totals(offline_app, client):
+    """Test the all-time totals of an aggregation without search cluster."""
+    aggregator = StatAggregator(
+        "record-view-agg",
+        "record-view",
+        client=client,
+        field="unique_id",
+        totals=True,
+    )
+
+    def aggregated_count(unique_id):
+        return sum(
+            hit["_source"]["count"]
+            for hit in client.search(
+                index="stats-record-view",
+                body={"query": {"term": {"unique_id": unique_id}}, "size": 100},
+            )["hits"]["hits"]
+        )
+
+    aggregator.run(
+        start_date=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        end_date=datetime(2026, 1, 2, tzinfo=timezone.utc),
+    )
+    # the totals are not counted twice when the intervals are aggregated again
+    aggregator.run(
+        start_date=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        end_date=datetime(2026, 1, 4, tzinfo=timezone.utc),
+    )
+    total = client.get(index="stats-totals-record-view", id="recid_1")["_source"]
+    assert total["count"] == aggregated_count("recid_1") == 15
+
+    aggregator.delete(start_date=datetime(2026, 1, 2, tzinfo=timezone.utc))
+    total = client.get(index="stats-totals-record-view", id="recid_1")["_source"]
+    assert total["count"] == aggregated_count("recid_1") == 5
+
+    # the scripts without Python implementation are rejected
+    with pytest.raises(search.RequestError):
+        client.update(
+            index="stats-totals-record-view",
+            id="recid_1",
+            body={"script": {"source": "ctx._source.count = 0"}},
+        )
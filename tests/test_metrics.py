@@ -0,0 +1,212 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Metrics tests."""
+
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+from invenio_search.engine import search
+
+from invenio_stats.aggregations import StatAggregator
+from invenio_stats.memory import InMemoryQueue, InMemorySearchClient
+from invenio_stats.metrics import Metrics, push_grouping_key
+from invenio_stats.processors import EventsIndexer, flag_robots
+from invenio_stats.utils import AllowAllPermission
+
+
+@pytest.fixture()
+def offline_config():
+    """Enable the metrics."""
+    return {"STATS_METRICS": True}
+
+
+def test_render():
+    """Test the Prometheus text format."""
+    metrics = Metrics(
+        buckets=[0.1, 1],
+        collectors=[lambda: [("spool_bytes", {}, 1024)]],
+    )
+    metrics.inc("events_indexed_total", 3, event_type="record-view")
+    metrics.inc("events_indexed_total", event_type='a "quoted"\ntype')
+    for value in (0.05, 0.5, 5):
+        metrics.observe("query_seconds", value, stat="views")
+    assert metrics.render() == (
+        "# HELP invenio_stats_events_indexed_total "
+        "Events indexed in the search cluster.\n"
+        "# TYPE invenio_stats_events_indexed_total counter\n"
+        'invenio_stats_events_indexed_total{event_type="a \\"quoted\\"\\ntype"} 1\n'
+        'invenio_stats_events_indexed_total{event_type="record-view"} 3\n'
+        "# HELP invenio_stats_query_seconds "
+        "Time spent running the statistics queries.\n"
+        "# TYPE invenio_stats_query_seconds histogram\n"
+        'invenio_stats_query_seconds_bucket{stat="views",le="0.1"} 1\n'
+        'invenio_stats_query_seconds_bucket{stat="views",le="1"} 2\n'
+        'invenio_stats_query_seconds_bucket{stat="views",le="+Inf"} 3\n'
+        'invenio_stats_query_seconds_sum{stat="views"} 5.55\n'
+        'invenio_stats_query_seconds_count{stat="views"} 3\n'
+        "# HELP invenio_stats_spool_bytes Size of the local events spool.\n"
+        "# TYPE invenio_stats_spool_bytes gauge\n"
+        "invenio_stats_spool_bytes 1024\n"
+    )
+
+    metrics.reset()
+    assert metrics.render().splitlines()[-1] == "invenio_stats_spool_bytes 1024"
+
+
+def test_push():
+    """Test pushing the metrics to a pushgateway."""
+    metrics = Metrics()
+    metrics.inc("events_indexed_total", 3, event_type="record-view")
+    with patch("invenio_stats.metrics.urlopen") as urlopen:
+        metrics.push(
+            "http://pushgateway:9091/", "stats workers", grouping_key={"worker": "1"}
+        )
+    request = urlopen.call_args[0][0]
+    assert request.full_url == (
+        "http://pushgateway:9091/metrics/job/stats%20workers/worker/1"
+    )
+    assert request.method == "PUT"
+    assert b'events_indexed_total{event_type="record-view"} 3' in request.data
+
+
+def test_push_grouping_key(offline_app_factory):
+    """Test that the pushed groups outlive the restarts of the processes."""
+    assert push_grouping_key("worker-1") == {
+        "instance": "worker-1",
+        "process": "main",
+    }
+    with patch("invenio_stats.metrics.current_process") as current_process:
+        current_process.return_value.index = 2
+        assert push_grouping_key()["process"] == "2"
+
+    app = offline_app_factory(
+        STATS_METRICS=True,
+        STATS_METRICS_PUSHGATEWAY_URL="http://pushgateway:9091",
+        STATS_METRICS_PUSHGATEWAY_INSTANCE="worker-1",
+    )
+    with app.app_context(), patch("invenio_stats.metrics.urlopen") as urlopen:
+        app.extensions["invenio-stats"].push_metrics()
+    assert urlopen.call_args[0][0].full_url == (
+        "http://pushgateway:9091/metrics/job/invenio-stats"
+        "/instance/worker-1/process/main"
+    )
+
+
+def test_disabled(offline_app_factory):
+    """Test that the metrics are disabled by default."""
+    app = offline_app_factory()
+    with app.app_context():
+        assert app.extensions["invenio-stats"].metrics is None
+        assert app.test_client().get("/stats/metrics").status_code == 404
+
+
+def test_events_metrics(offline_app):
+    """Test the metrics of the events processing."""
+
+    def drop_downloads(doc):
+        return None if doc.get("pid_type") == "file" else doc
+
+    events = [
+        {
+            "timestamp": "2026-01-01T00:00:{:02d}".format(i),
+            "pid_type": "file" if i % 4 == 0 else "recid",
+            "pid_value": str(i),
+            "user_agent": "Googlebot" if i % 2 else "Mozilla/5.0 (X11; Linux x86_64)",
+            "visitor_id": str(i),
+            "unique_id": "recid_{}".format(i),
+        }
+        for i in range(10)
+    ]
+    indexer = EventsIndexer(
+        InMemoryQueue(events + [{"pid_type": "recid"}]),
+        client=InMemorySearchClient(),
+        preprocessors=[drop_downloads, flag_robots],
+    )
+    indexer.run()
+
+    samples = offline_app.extensions["invenio-stats"].metrics.samples()
+
+    def value(name, **labels):
+        (value,) = [v for s, l, v in samples[name] if not s and dict(l) == labels]
+        return value
+
+    labels = {"event_type": "record-view"}
+    assert value("events_consumed_total", **labels) == 11
+    assert value("events_filtered_total", preprocessor="drop_downloads", **labels) == 3
+    assert value("events_flagged_total", flag="robot", **labels) == 5
+    # the event without timestamp failed to be processed
+    assert value("events_failed_total", **labels) == 1
+    assert value("events_indexed_total", **labels) == 7
+    durations = {
+        dict(l)["preprocessor"]: v
+        for s, l, v in samples["events_preprocessor_seconds"]
+        if s == "_count"
+    }
+    assert durations == {"drop_downloads": 11, "flag_robots": 8}
+
+
+def test_aggregation_metrics(offline_app):
+    """Test the metrics of the aggregations."""
+    client = InMemorySearchClient()
+    search.helpers.bulk(
+        client,
+        [
+            {
+                "_index": "events-stats-record-view-2026-01",
+                "_source": {
+                    "timestamp": "2026-01-0{}T00:00:00".format(1 + i % 2),
+                    "unique_id": "recid_{}".format(i % 3),
+                    "is_robot": False,
+                    "updated_timestamp": "2026-01-02T00:00:00",
+                },
+            }
+            for i in range(6)
+        ],
+    )
+    client.indices.put_alias(
+        index="events-stats-record-view-2026-01", name="events-stats-record-view"
+    )
+    aggregator = StatAggregator(
+        "record-view-agg", "record-view", client=client, field="unique_id"
+    )
+    aggregator.run(
+        start_date=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        end_date=datetime(2026, 1, 3, tzinfo=timezone.utc),
+    )
+
+    samples = offline_app.extensions["invenio-stats"].metrics.samples()
+    labels = (("aggregation", "record-view-agg"),)
+    assert samples["aggregation_partitions_total"] == [("", labels, 3)]
+    assert samples["aggregation_buckets_total"] == [("", labels, 6)]
+    assert ("_count", labels + (("interval", "day"),), 3) in samples[
+        "aggregation_bulk_seconds"
+    ]
+
+    # the events updated before the bookmark are skipped
+    aggregator.run(start_date=datetime(2026, 1, 1, tzinfo=timezone.utc))
+    samples = offline_app.extensions["invenio-stats"].metrics.samples()
+    assert samples["aggregation_skipped_total"] == [("", labels, 6)]
+
+
+def test_endpoint(offline_app):
+    """Test the metrics endpoint."""
+    state = offline_app.extensions["invenio-stats"]
+    state.backlog_decisions[("record-view", "sampled", "dropped")] += 2
+    state.metrics.inc("query_errors_total", stat="record-view")
+    client = offline_app.test_client()
+    # the metrics are denied to everyone by default
+    assert client.get("/stats/metrics").status_code == 401
+
+    state.metrics_permission_factory = lambda: AllowAllPermission
+    res = client.get("/stats/metrics")
+    assert res.status_code == 200
+    assert res.content_type == "text/plain; version=0.0.4; charset=utf-8"
+    assert (
+        'invenio_stats_backlog_decisions_total{event_type="record-view",'
+        'outcome="dropped",reason="sampled"} 2'
+    ) in res.get_data(as_text=True).splitlines()
+    assert 'invenio_stats_query_errors_total{stat="record-view"} 1' in (
+        res.get_data(as_text=True)
+    )
@@ -0,0 +1,135 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Event payload codecs tests."""
+
+from unittest.mock import MagicMock, patch
+
+import msgpack
+import pytest
+from kombu import Connection, Exchange, Queue
+from kombu.compat import Consumer
+from kombu.message import Message
+
+from invenio_stats.memory import InMemoryMessage, InMemorySearchClient
+from invenio_stats.payloads import (
+    COMPACT_CONTENT_TYPE,
+    CompactPayloadCodec,
+    build_payload_codec,
+)
+from invenio_stats.processors import EventsIndexer
+
+
+def test_compact_payload_codec():
+    """Test that the compact payloads are smaller and decoded as events."""
+    codec = build_payload_codec("compact", ["timestamp", "user_agent", "referrer"])
+    events = [
+        {"timestamp": "2026-01-01T00:00:00", "user_agent": "Mozilla/5.0"},
+        {"timestamp": "2026-01-01T00:00:01", "referrer": None, "unique_id": "a"},
+    ]
+
+    exchange = Exchange("test-payloads", type="direct")
+    queue = Queue("test-payloads", exchange=exchange, routing_key="test-payloads")
+    with Connection("memory://") as conn:
+        producer = conn.Producer(exchange=exchange, routing_key="test-payloads")
+        queue(conn).declare()
+        # messages published with the previous codec are still decoded
+        producer.publish(events[0])
+        for event in events:
+            producer.publish(codec.encode(event), serializer=codec.serializer)
+        consumer = Consumer(conn, queue="test-payloads", exchange="test-payloads")
+        messages = list(consumer.iterqueue(limit=3))
+
+    assert [m.content_type for m in messages] == [
+        "application/json",
+        "application/x-invenio-stats-compact",
+        "application/x-invenio-stats-compact",
+    ]
+    assert [m.payload for m in messages] == [events[0]] + events
+    assert len(messages[1].body) < len(messages[0].body)
+
+
+def test_payload_codec_errors():
+    """Test the payload codecs configuration errors."""
+    with pytest.raises(ValueError):
+        build_payload_codec("unknown")
+    with pytest.raises(ValueError):
+        build_payload_codec("compact")
+    assert build_payload_codec("msgpack").serializer == "msgpack"
+    assert CompactPayloadCodec(["a"]).encode({"a": 1}) == [
+        CompactPayloadCodec(["a"]).schema_id,
+        1,
+        [1],
+        {},
+    ]
+
+
+def test_previous_payload_fields():
+    """Test that the payloads of the previous schemas are still decoded."""
+    previous = CompactPayloadCodec(["timestamp", "referrer"])
+    current = build_payload_codec("compact", ["timestamp"], [previous.fields])
+    assert current.schema_id != previous.schema_id
+    assert current.schema_id[0] == previous.schema_id[0] == 1
+
+    body = previous.encode({"timestamp": "2026-01-01T00:00:00", "referrer": "a"})
+    message = Message(
+        body=msgpack.packb(body, use_bin_type=True),
+        content_type=COMPACT_CONTENT_TYPE,
+        content_encoding="binary",
+    )
+    assert message.payload == {"timestamp": "2026-01-01T00:00:00", "referrer": "a"}
+
+
+def test_undecodable_messages_skipped(offline_app_factory):
+    """Test that a message which can't be decoded doesn't abort the indexing."""
+    unknown = Message(
+        body=msgpack.packb([b"\x01\x00\x00\x00\x00", 0, [], {}]),
+        content_type=COMPACT_CONTENT_TYPE,
+        content_encoding="binary",
+    )
+    event = {"timestamp": "2026-01-01T00:00:00", "unique_id": "1", "visitor_id": "1"}
+    queue = MagicMock(routing_key="stats-record-view")
+    queue.consume.return_value = iter(
+        [
+            unknown,
+            InMemoryMessage(event),
+            unknown,
+            InMemoryMessage({**event, "unique_id": "2"}),
+        ]
+    )
+    client = InMemorySearchClient()
+    app = offline_app_factory()
+    with app.app_context(), patch.object(app.logger, "exception") as log:
+        indexer = EventsIndexer(
+            queue, client=client, preprocessors=[], double_click_window=0
+        )
+        assert indexer.run() == (2, 0)
+    queue.consume.assert_called_once_with(payload=False)
+    assert log.call_count == 2
+
+
+def test_publish_payload_codec(offline_app_factory):
+    """Test that the events are published with the codec of their queue."""
+    app = offline_app_factory(
+        STATS_EVENTS={
+            "record-view": {
+                "templates": "",
+                "cls": MagicMock(),
+                "payload_codec": "compact",
+                "payload_fields": ["timestamp"],
+            }
+        },
+    )
+    state = app.extensions["invenio-stats"]
+    queue = MagicMock()
+    producer = queue.create_producer.return_value.__enter__.return_value
+    with patch(
+        "invenio_stats.ext.current_queues",
+        MagicMock(queues={"stats-record-view": queue}),
+    ):
+        codec = state.events["record-view"].payload_codec
+        state.publish("record-view", [{"timestamp": "2026-01-01T00:00:00"}])
+    producer.publish.assert_called_once_with(
+        [codec.schema_id, 1, ["2026-01-01T00:00:00"], {}], serializer="stats-compact"
+    )
+    assert not queue.publish.called
@@ -6,10 +6,11 @@
 
 import logging
 from datetime import datetime
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 from conftest import _create_file_download_event
+from flask import Flask
 from helpers import get_queue_size, mock_date
 from invenio_queues.proxies import current_queues
 from invenio_search import current_search
@@ -19,6 +20,7 @@ from invenio_stats.contrib.event_builders import (
     build_file_unique_id,
     file_download_event_builder,
 )
+from invenio_stats.memory import InMemoryQueue, InMemorySearchClient
 from invenio_stats.processors import (
     EventsIndexer,
     anonymize_user,
@@ -332,7 +334,7 @@ def test_events_indexer_id_windowing(app, mock_event_queue):
     def bulk(client, generator, *args, **kwargs):
         received_docs.extend(generator)
 
-    mock_event_queue.consume.return_value = [
+    mock_event_queue.events = [
         _create_file_download_event(date)
         for date in [
             # Those two events will be in the same window
@@ -353,6 +355,40 @@ def test_events_indexer_id_windowing(app, mock_event_queue):
     assert len(ids) == 3
 
 
+def test_events_indexer_rollover(app, mock_event_queue):
+    """Check that EventsIndexer writes through the rollover alias."""
+    client = MagicMock()
+    client.indices.exists_alias.return_value = False
+    indexer = EventsIndexer(
+        mock_event_queue,
+        client=client,
+        preprocessors=[],
+        rollover={"max_docs": 1000},
+    )
+
+    received_docs = []
+
+    def bulk(client, generator, *args, **kwargs):
+        received_docs.extend(generator)
+
+    with patch("invenio_search.engine.search.helpers.bulk", side_effect=bulk):
+        indexer.run()
+
+    assert {doc["_index"] for doc in received_docs} == {
+        "events-stats-file-download-write"
+    }
+    client.indices.create.assert_called_once_with(
+        index="events-stats-file-download-000001",
+        body={
+            "aliases": {"events-stats-file-download-write": {"is_write_index": True}}
+        },
+    )
+    client.indices.rollover.assert_called_once_with(
+        alias="events-stats-file-download-write",
+        body={"conditions": {"max_docs": 1000}},
+    )
+
+
 def test_double_clicks(app, mock_event_queue, search_clear):
     """Test that events occurring within a time window are counted as 1."""
     event_type = "file-download"
@@ -421,3 +457,23 @@ def test_failing_processors(app, search_clear, event_queues, caplog):
     assert get_queue_size("stats-file-download") == 0
     assert search_obj.index("events-stats-file-download").count() == 3
     assert search_obj.index("events-stats-file-download-2018-01").count() == 3
+
+
+def test_events_indexer_without_extension():
+    """Test that the events can be indexed without the extension."""
+    queue = InMemoryQueue(
+        [
+            {
+                "timestamp": "2026-01-01T00:00:00",
+                "unique_id": "B1_F1",
+                "visitor_id": "1",
+            }
+        ],
+        routing_key="stats-file-download",
+    )
+    client = InMemorySearchClient()
+    with Flask("test").app_context():
+        indexer = EventsIndexer(queue, client=client, preprocessors=[])
+        assert indexer.run() == (1, 0)
+    (hit,) = client.search(index="events-stats-file-download-*")["hits"]["hits"]
+    assert hit["_source"]["unique_id"] == "B1_F1"
@@ -4,10 +4,17 @@
 """Query tests."""
 
 import datetime
+from unittest.mock import Mock, patch
 
 import pytest
-
-from invenio_stats.queries import DateHistogramQuery, TermsQuery
+from conftest import _create_file_download_event
+from helpers import mock_date
+from invenio_search import current_search
+
+from invenio_stats.errors import InvalidRequestInputError
+from invenio_stats.memory import InMemoryQueue
+from invenio_stats.processors import EventsIndexer, flag_robots
+from invenio_stats.queries import DateHistogramQuery, MultiKeyTermsQuery, TermsQuery
 from invenio_stats.utils import format_datetime_iso
 
 
@@ -39,6 +46,90 @@ def test_histogram_query(app, event_queues, aggregated_events, queries_config):
         assert int(day_result["value"]) == 2
 
 
+@pytest.mark.parametrize(
+    "aggregated_events",
+    [
+        {
+            "file_number": 1,
+            "event_number": 2,
+            "start_date": datetime.date(2017, 1, 1),
+            "end_date": datetime.date(2017, 1, 7),
+        }
+    ],
+    indirect=["aggregated_events"],
+)
+def test_histogram_query_derived_intervals(
+    app, event_queues, aggregated_events, queries_config
+):
+    """Test histograms derived from the cached daily histogram."""
+    params = dict(
+        bucket_id="B0000000000000000000000000000001",
+        file_key="test.pdf",
+        start_date=datetime.datetime(2016, 12, 25),
+        end_date=datetime.datetime(2017, 1, 14),
+    )
+    query_params = queries_config["bucket-file-download-histogram"]["params"]
+    histo_query = DateHistogramQuery(name="test_histo", **query_params)
+    cached_query = DateHistogramQuery(
+        name="test_histo_cached", cache_timeout=60, **query_params
+    )
+    assert cached_query.derive_intervals
+    for interval in ("day", "week", "month"):
+        expected = histo_query.run(interval=interval, **params)
+        results = cached_query.run(interval=interval, **params)
+        assert [(b["key"], b["value"]) for b in results["buckets"]] == [
+            (b["key"], b["value"]) for b in expected["buckets"]
+        ]
+
+    filled_query = DateHistogramQuery(
+        name="test_histo_filled", fill_gaps=True, max_buckets=10, **query_params
+    )
+    results = filled_query.run(interval="day", **params)
+    # 21 days don't fit in 10 buckets
+    assert results["interval"] == "week"
+    assert [int(b["value"]) for b in results["buckets"]] == [0, 2, 12, 0]
+
+
+@pytest.mark.parametrize(
+    "aggregated_events",
+    [
+        {
+            "file_number": 3,
+            "event_number": 2,
+            "start_date": datetime.date(2017, 1, 1),
+            "end_date": datetime.date(2017, 1, 7),
+        }
+    ],
+    indirect=["aggregated_events"],
+)
+def test_multi_key_terms_query(app, event_queues, aggregated_events):
+    """Test that the multi key terms query returns the counts of each key."""
+    query = MultiKeyTermsQuery(
+        name="test_multi_key",
+        index="stats-file-download",
+        key_field="unique_id",
+        max_keys=3,
+    )
+    keys = [
+        "B000000000000000000000000000000{0}_F000000000000000000000000000000{0}".format(
+            idx
+        )
+        for idx in (3, 1)
+    ] + ["unknown"]
+    results = query.run(
+        keys=keys,
+        start_date=datetime.datetime(2017, 1, 1),
+        end_date=datetime.datetime(2017, 1, 7),
+    )
+    assert [b["key"] for b in results["buckets"]] == keys
+    assert [int(b["value"]) for b in results["buckets"]] == [14, 14, 0]
+
+    with pytest.raises(InvalidRequestInputError):
+        query.run(keys=keys + ["other"])
+    with pytest.raises(InvalidRequestInputError):
+        query.run(keys=[])
+
+
 @pytest.mark.parametrize(
     "aggregated_events",
     [
@@ -65,6 +156,74 @@ def test_terms_query(app, event_queues, aggregated_events, queries_config):
     assert int(results["buckets"][0]["value"]) == 49
 
 
+@pytest.mark.parametrize(
+    "aggregated_events",
+    [
+        {
+            "file_number": 3,
+            "event_number": 2,
+            "start_date": datetime.date(2017, 1, 1),
+            "end_date": datetime.date(2017, 1, 7),
+        }
+    ],
+    indirect=["aggregated_events"],
+)
+def test_terms_query_export(app, event_queues, aggregated_events):
+    """Test that the export of a terms query is paginated and resumable."""
+    query = TermsQuery(
+        name="test_export",
+        index="stats-file-download",
+        aggregated_fields=["bucket_id"],
+    )
+    pages = list(query.export(page_size=2))
+    assert [len(rows) for rows, _ in pages] == [2, 1]
+    rows = [row for page_rows, _ in pages for row in page_rows]
+    assert [row["bucket_id"] for row in rows] == [
+        "B000000000000000000000000000000{}".format(idx) for idx in (1, 2, 3)
+    ]
+    assert all(int(row["value"]) == 14 for row in rows)
+
+    # resume the export after the first page
+    resumed = list(query.export(cursor=pages[0][1], page_size=2))
+    assert [rows for rows, _ in resumed] == [pages[1][0]]
+
+    with pytest.raises(InvalidRequestInputError):
+        list(query.export(cursor="invalid"))
+
+
+@pytest.mark.parametrize(
+    "query_name, args",
+    [("bucket-file-download-histogram", ("day",)), ("bucket-file-download-total", ())],
+)
+def test_precompiled_query(app, queries_config, query_name, args):
+    """Test that the precompiled request body is the same as the DSL query."""
+    query_config = queries_config[query_name]
+    client = Mock()
+    query = query_config["cls"](
+        name=query_name, client=client, **query_config["params"]
+    )
+    assert query.compiled_aggs is not None
+
+    start_date = datetime.datetime(2017, 1, 1)
+    end_date = datetime.datetime(2017, 1, 7)
+    query.execute_query(*args, start_date, end_date, bucket_id="B1")
+    body = client.search.call_args.kwargs["body"]
+    expected = query.build_query(*args, start_date, end_date, bucket_id="B1").to_dict()
+    assert body["aggs"] == expected["aggs"]
+    assert sorted(body["query"]["bool"]["filter"], key=str) == sorted(
+        expected["query"]["bool"]["filter"], key=str
+    )
+
+    # query modifiers can change the whole query, so it is not precompiled
+    query = query_config["cls"](
+        name=query_name,
+        client=client,
+        query_modifiers=[lambda q, **kwargs: q],
+        **query_config["params"],
+    )
+    assert query.compiled_aggs is None
+
+
 def test_query_date_formatting_config_disabled(app, queries_config):
     """Test date formatting in build_query when STATS_EVENTS_UTC_DATETIME_ENABLED is False.
 
@@ -262,3 +421,51 @@ def test_terms_query_date_formatting_config_enabled(app, queries_config):
     assert range_filter is not None, "Range filter should exist in query"
     assert range_filter["gte"] == formatted_start
     assert range_filter["lte"] == formatted_end
+
+
+@pytest.mark.parametrize(
+    "aggregated_events",
+    [
+        {
+            "file_number": 1,
+            "event_number": 2,
+            "start_date": datetime.date(2017, 1, 1),
+            "end_date": datetime.date(2017, 1, 7),
+            "run_date": (2017, 1, 8),
+        }
+    ],
+    indirect=["aggregated_events"],
+)
+def test_queries_recent_events(app, event_queues, aggregated_events, queries_config):
+    """Test that the queries include the events not aggregated yet."""
+    queue = InMemoryQueue(
+        [_create_file_download_event((2017, 1, 8, 10, minute)) for minute in range(3)],
+        routing_key="stats-file-download",
+    )
+    EventsIndexer(queue, preprocessors=[flag_robots], double_click_window=0).run()
+    current_search.flush_and_refresh(index="*")
+
+    terms_query = TermsQuery(
+        name="test_total_count",
+        recent_events_aggregation="file-download-agg",
+        **queries_config["bucket-file-download-total"]["params"],
+    )
+    histo_query = DateHistogramQuery(
+        name="test_histo",
+        recent_events_aggregation="file-download-agg",
+        **queries_config["bucket-file-download-histogram"]["params"],
+    )
+    with patch("invenio_stats.queries.datetime", mock_date(2017, 1, 8, 12)):
+        terms_results = terms_query.run(bucket_id="B0000000000000000000000000000001")
+        histo_results = histo_query.run(
+            bucket_id="B0000000000000000000000000000001",
+            file_key="test.pdf",
+        )
+    assert int(terms_results["value"]) == 7 * 2 + 3
+    assert [int(b["value"]) for b in histo_results["buckets"]] == [2] * 7 + [3]
+
+    # the raw events are not taken into account beyond the maximum window
+    terms_query.recent_events.max_window = datetime.timedelta(hours=1)
+    with patch("invenio_stats.queries.datetime", mock_date(2017, 1, 8, 12)):
+        terms_results = terms_query.run(bucket_id="B0000000000000000000000000000001")
+    assert int(terms_results["value"]) == 7 * 2
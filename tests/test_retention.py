@@ -0,0 +1,123 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Raw events retention tests."""
+
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from invenio_stats.retention import EventsPruner
+
+
+def _ts(*args):
+    """Get the timestamp in milliseconds of a UTC date."""
+    return datetime(*args, tzinfo=timezone.utc).timestamp() * 1000
+
+
+def test_events_pruner(offline_app_factory):
+    """Test that only the aggregated and expired events indices are pruned."""
+    app = offline_app_factory(
+        STATS_AGGREGATIONS={
+            "file-download-agg": {
+                "templates": "",
+                "cls": MagicMock(),
+                "params": {"event": "file-download", "interval": "day"},
+            }
+        },
+    )
+    client = MagicMock()
+    client.search.return_value = {
+        "aggregations": {
+            "indices": {
+                "buckets": [
+                    {
+                        "key": "events-stats-file-download-2025-01",
+                        "newest": {"value": _ts(2025, 1, 31, 23)},
+                    },
+                    {
+                        "key": "events-stats-file-download-2025-02",
+                        "newest": {"value": _ts(2025, 2, 28, 23)},
+                    },
+                    {
+                        "key": "events-stats-file-download-000001",
+                        "newest": {"value": _ts(2025, 1, 1)},
+                    },
+                ]
+            }
+        }
+    }
+    client.indices.get_alias.side_effect = lambda name=None, index=None: (
+        {"events-stats-file-download-000001": {}}
+        if name
+        else {
+            "stats-file-download-2025-01": {},
+            "stats-file-download-2025-02": {},
+        }
+    )
+    with (
+        app.app_context(),
+        patch.object(
+            app.extensions["invenio-stats"],
+            "get_aggregation_bookmark",
+            return_value=datetime(2025, 2, 28, 12, tzinfo=timezone.utc),
+        ),
+    ):
+        pruner = EventsPruner("file-download", client=client, retention_days=0)
+        result = pruner.run()
+
+    # the events of the bookmark's day are aggregated again on the next run,
+    # and the rollover write index is never pruned
+    assert result == {
+        "pruned": ["events-stats-file-download-2025-01"],
+        "merged": ["stats-file-download-2025-01"],
+    }
+    client.indices.delete.assert_called_once_with(
+        index="events-stats-file-download-2025-01"
+    )
+    client.indices.forcemerge.assert_called_once_with(
+        index="stats-file-download-2025-01", max_num_segments=1
+    )
+
+
+def test_events_pruner_codec(offline_app_factory):
+    """Test that the finished aggregations indices are cloned with the codec."""
+    client = MagicMock()
+    client.indices.get_settings.side_effect = lambda index, **kwargs: {
+        index: {
+            "settings": (
+                {"index.codec": "best_compression"} if index.endswith("2025-02") else {}
+            )
+        }
+    }
+    client.indices.get_alias.side_effect = lambda index: {
+        index: {"aliases": {"stats-file-download": {}}}
+    }
+    app = offline_app_factory()
+    with app.app_context():
+        pruner = EventsPruner("file-download", client=client, codec="best_compression")
+        assert (
+            pruner.set_codec("stats-file-download-2025-02")
+            == "stats-file-download-2025-02"
+        )
+        clone = pruner.set_codec("stats-file-download-2025-01")
+
+    # the index is never closed
+    assert clone == "stats-file-download-2025-01-best_compression"
+    client.indices.close.assert_not_called()
+    client.indices.clone.assert_called_once()
+    assert client.indices.clone.call_args.kwargs["target"] == clone
+    assert client.indices.update_aliases.call_args.kwargs["body"]["actions"] == [
+        {"add": {"index": clone, "alias": "stats-file-download"}},
+        {"add": {"index": clone, "alias": "stats-file-download-2025-01"}},
+        {"remove_index": {"index": "stats-file-download-2025-01"}},
+    ]
+
+    # the writes are allowed again if the index could not be cloned
+    client.indices.clone.side_effect = ValueError()
+    with app.app_context(), pytest.raises(ValueError):
+        pruner.set_codec("stats-file-download-2025-01")
+    assert client.indices.put_settings.call_args.kwargs["body"] == {
+        "index": {"blocks": {"write": None}}
+    }
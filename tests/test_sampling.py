@@ -0,0 +1,66 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Event sampling tests."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from invenio_stats.receivers import EventEmitter
+from invenio_stats.sampling import AdaptiveRateSampler, FixedRateSampler
+
+
+def test_fixed_rate_sampler():
+    """Test that a fixed fraction of the events is kept."""
+    sampler = FixedRateSampler(0.25)
+    with patch("invenio_stats.sampling.random.random", side_effect=[0.1, 0.3]):
+        assert sampler({}) == 4
+        assert sampler({}) is None
+    assert FixedRateSampler(1)({}) == 1
+
+    with pytest.raises(ValueError):
+        FixedRateSampler(0)
+
+
+def test_adaptive_rate_sampler():
+    """Test that the events of the hot keys are sampled."""
+    sampler = AdaptiveRateSampler(["file_id"], max_rate=0.1, window=100)
+    hot = {"file_id": "hot"}
+    with patch("invenio_stats.sampling.random.random", return_value=0.0):
+        weights = [sampler(hot) for _ in range(20)]
+    # the first 10 events are kept, then the 20th one weighs 20 / 10
+    assert weights[:10] == [1.0] * 10
+    assert weights[19] == 2
+    # the other keys are not affected
+    assert sampler({"file_id": "cold"}) == 1.0
+
+    with patch("invenio_stats.sampling.random.random", return_value=0.99):
+        assert sampler(hot) is None
+
+
+def test_event_emitter_sampling(offline_app_factory):
+    """Test that the emitted events are sampled and weighted."""
+    app = offline_app_factory(
+        STATS_EVENTS={
+            "record-view": {
+                "templates": "",
+                "cls": MagicMock(),
+                "sampler": FixedRateSampler(0.5),
+            }
+        },
+    )
+    state = app.extensions["invenio-stats"]
+    emitter = EventEmitter("record-view", [lambda event, sender: {"idx": sender}])
+    with (
+        app.app_context(),
+        patch(
+            "invenio_stats.ext.current_queues",
+            MagicMock(queues={"stats-record-view": MagicMock()}),
+        ),
+        patch.object(state, "publish") as publish,
+        patch("invenio_stats.sampling.random.random", side_effect=[0.1, 0.9]),
+    ):
+        emitter(0)
+        emitter(1)
+    publish.assert_called_once_with("record-view", [{"idx": 0, "weight": 2}])
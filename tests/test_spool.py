@@ -0,0 +1,69 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Events spool tests."""
+
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from invenio_stats.spool import EventSpool
+
+
+def test_spool_append_and_drain(tmp_path):
+    """Test spooling and draining events."""
+    spool = EventSpool(str(tmp_path), segment_size=100)
+    for idx in range(5):
+        spool.append("record-view", [{"idx": idx}])
+    spool.append("file-download", [{"idx": 5}, {"idx": 6}])
+    # the segments are rotated
+    assert len(spool.segments()) > 1
+    assert spool.stats()["events"] == {"record-view": 5, "file-download": 2}
+
+    published = []
+    assert spool.drain(lambda t, events: published.append((t, events)), 2) == 7
+    assert sorted(e["idx"] for _, events in published for e in events) == list(range(7))
+    assert all(len(events) <= 2 for _, events in published)
+    assert spool.segments() == []
+
+    # appending still works once the segments have been drained
+    spool.append("record-view", [{"idx": 7}])
+    assert spool.stats()["events"] == {"record-view": 1}
+
+
+def test_spool_failed_drain(tmp_path):
+    """Test that the segments are kept if they can't be published."""
+    spool = EventSpool(str(tmp_path))
+    spool.append("record-view", [{"idx": 0}])
+
+    def failing_publish(event_type, events):
+        raise ConnectionError()
+
+    with pytest.raises(ConnectionError):
+        spool.drain(failing_publish)
+    assert spool.stats()["events"] == {"record-view": 1}
+
+
+def test_publish_spooling(offline_app_factory, tmp_path):
+    """Test that events are spooled when publishing fails."""
+    app = offline_app_factory(
+        STATS_EVENTS={"record-view": {"templates": "", "cls": MagicMock()}},
+        STATS_EVENTS_SPOOL_PATH=os.path.join(str(tmp_path), "spool"),
+    )
+    state = app.extensions["invenio-stats"]
+    queue = MagicMock()
+    with patch(
+        "invenio_stats.ext.current_queues",
+        MagicMock(queues={"stats-record-view": queue}),
+    ):
+        queue.publish.side_effect = ConnectionError()
+        state.publish("record-view", [{"idx": 0}])
+        # the next events are spooled without trying to publish them
+        state.publish("record-view", [{"idx": 1}])
+        assert queue.publish.call_count == 1
+        assert state.event_spool.stats()["events"] == {"record-view": 2}
+
+        queue.publish.side_effect = None
+        assert state.drain_spool() == 2
+        queue.publish.assert_called_with([{"idx": 0}, {"idx": 1}])
@@ -0,0 +1,165 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Status tests."""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from click.testing import CliRunner
+from flask import Flask
+from flask.cli import ScriptInfo
+from invenio_search import current_search_client
+
+from invenio_stats.cli import stats
+from invenio_stats.contrib.config import AGGREGATIONS_CONFIG, EVENTS_CONFIG
+from invenio_stats.proxies import current_stats
+from invenio_stats.status import (
+    aggregation_throughput,
+    consuming_queue,
+    get_status,
+    oldest_queued_date,
+    record_aggregation_run,
+    record_published,
+)
+from invenio_stats.tasks import aggregate_events, process_events
+from invenio_stats.utils import AllowAllPermission
+
+
+@pytest.fixture()
+def offline_config():
+    """Check the depth of the queues on each request."""
+    return {"STATS_EVENTS_BACKLOG_CHECK_INTERVAL": 0}
+
+
+def record_view(second):
+    """Build a record-view event."""
+    return {
+        "timestamp": "2026-01-01T00:00:{:02d}".format(second),
+        "record_id": str(second),
+        "pid_type": "recid",
+        "pid_value": str(second),
+        "visitor_id": "1",
+        "user_agent": "Mozilla/5.0 (X11; Linux x86_64)",
+    }
+
+
+def test_recent_runs(offline_app):
+    """Test the throughput of the recent runs of the aggregations."""
+    offline_app.config["STATS_STATUS_RECENT_RUNS"] = 2
+    assert aggregation_throughput("record-view-agg") is None
+    record_aggregation_run("record-view-agg", 36000, 1)
+    record_aggregation_run("record-view-agg", 3600, 1)
+    record_aggregation_run("record-view-agg", 3600, 3)
+    assert aggregation_throughput("record-view-agg") == 1800
+
+    # the runs are not recorded without cache
+    app = Flask("test")
+    with app.app_context():
+        record_aggregation_run("record-view-agg", 3600, 1)
+        assert aggregation_throughput("record-view-agg") is None
+
+
+def test_oldest_queued_date(offline_app):
+    """Test the date of the first publishing since the queue was consumed."""
+    assert oldest_queued_date("record-view") is None
+    record_published("record-view")
+    published = oldest_queued_date("record-view")
+    record_published("record-view")
+    assert oldest_queued_date("record-view") == published
+
+    with consuming_queue("record-view"):
+        assert oldest_queued_date("record-view") is None
+        record_published("record-view")
+    assert oldest_queued_date("record-view") >= published
+
+    # the date is kept if the queue could not be consumed
+    with pytest.raises(ValueError), consuming_queue("record-view"):
+        raise ValueError()
+    assert oldest_queued_date("record-view") >= published
+
+
+def test_status(offline_app):
+    """Test the status of the events and of the aggregations."""
+    now = datetime(2026, 1, 1, 1, tzinfo=timezone.utc)
+    status = get_status(now=now)
+    assert status["timestamp"] == "2026-01-01T01:00:00+00:00"
+    assert status["events"]["record-view"] == {
+        "queue_depth": 0,
+        "oldest_queued_event": None,
+        "oldest_queued_event_age": None,
+        "latest_event": None,
+        "latest_event_age": None,
+    }
+    assert status["aggregations"]["record-view-agg"] == {
+        "event": "record-view",
+        "bookmark": None,
+        "lag": None,
+        "throughput": None,
+        "catch_up": None,
+    }
+    # the status doesn't create the bookmarks index
+    assert not current_search_client.indices.exists(index="stats-bookmarks")
+
+    published = datetime.now(timezone.utc)
+    current_stats.publish("record-view", [record_view(i) for i in range(3)])
+    events = get_status(now=published + timedelta(hours=1))["events"]["record-view"]
+    assert events["queue_depth"] == 3
+    assert 3590 < events["oldest_queued_event_age"] <= 3600
+    # the queued events are not consumed
+    assert get_status(now=now)["events"]["record-view"]["queue_depth"] == 3
+
+    process_events(["record-view"])
+    current_search_client.indices.refresh(index="events-stats-record-view")
+    events = get_status(now=now)["events"]["record-view"]
+    assert events["queue_depth"] == 0
+    assert events["oldest_queued_event"] is None
+    assert events["latest_event"] == "2026-01-01T00:00:02+00:00"
+    assert events["latest_event_age"] == 3598
+
+    aggregate_events(["record-view-agg"])
+    status = get_status()
+    aggregation = status["aggregations"]["record-view-agg"]
+    assert aggregation["bookmark"] is not None
+    assert aggregation["lag"] >= 0
+    assert aggregation["throughput"] > 0
+    assert aggregation["catch_up"] == pytest.approx(
+        aggregation["lag"] / aggregation["throughput"], abs=0.01
+    )
+
+
+def test_status_endpoint(offline_app):
+    """Test the status endpoint."""
+    client = offline_app.test_client()
+    assert client.get("/stats/status").status_code == 404
+
+    offline_app.config["STATS_STATUS_ENDPOINT"] = True
+    # the status is denied to everyone by default
+    assert client.get("/stats/status").status_code == 401
+
+    current_stats.status_permission_factory = lambda: AllowAllPermission
+    res = client.get("/stats/status")
+    assert res.status_code == 200
+    assert set(res.json["events"]) == set(EVENTS_CONFIG)
+    assert set(res.json["aggregations"]) == set(AGGREGATIONS_CONFIG)
+
+
+def test_status_cli(offline_app):
+    """Test the "status" CLI command."""
+    current_stats.publish("record-view", [record_view(0)])
+    runner = CliRunner()
+    script_info = ScriptInfo(create_app=lambda: offline_app)
+
+    result = runner.invoke(stats, ["status"], obj=script_info)
+    assert result.exit_code == 0
+    assert " - record-view: 1 queued, oldest queued event age " in result.output
+    assert (
+        " - record-view-agg: bookmark none, lag unknown, catch-up unknown"
+        in result.output
+    )
+
+    result = runner.invoke(stats, ["status", "--json"], obj=script_info)
+    assert result.exit_code == 0
+    status = json.loads(result.output)
+    assert status["events"]["record-view"]["queue_depth"] == 1
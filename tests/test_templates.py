@@ -0,0 +1,42 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Templates registration tests."""
+
+from flask import Flask
+
+from invenio_stats import InvenioStats
+from invenio_stats.templates import register_index_templates, register_templates
+
+
+def test_templates_variant():
+    """Test the selection of the templates variant."""
+    app = Flask("test")
+    app.config.update(
+        STATS_EVENTS={
+            "file-download": {"templates": "invenio_stats.contrib.file_download"},
+            "custom-event": {"templates": "invenio_stats.contrib"},
+        },
+        STATS_AGGREGATIONS={
+            "file-download-agg": {
+                "templates": "invenio_stats.contrib.aggregations.aggr_file_download"
+            }
+        },
+    )
+    InvenioStats(app)
+    with app.app_context():
+        assert register_templates() == [
+            "invenio_stats.contrib.file_download",
+            "invenio_stats.contrib",
+            "invenio_stats.contrib.aggregations.aggr_file_download",
+        ]
+
+        app.config.update(
+            STATS_TEMPLATES_VARIANT="performance", STATS_REGISTER_INDEX_TEMPLATES=True
+        )
+        # templates without the variant fall back to the default ones
+        assert register_index_templates() == [
+            "invenio_stats.contrib.file_download.performance",
+            "invenio_stats.contrib",
+            "invenio_stats.contrib.aggregations.aggr_file_download.performance",
+        ]
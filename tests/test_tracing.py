@@ -0,0 +1,260 @@
+# SPDX-FileCopyrightText: 2026 CERN.
+# SPDX-License-Identifier: MIT
+
+"""Tracing tests."""
+
+import json
+from datetime import datetime, timezone
+
+import pytest
+from flask import Flask
+from invenio_search.engine import search
+
+from invenio_stats.aggregations import StatAggregator
+from invenio_stats.memory import InMemorySearchClient
+from invenio_stats.processors import EventsIndexer, flag_robots
+from invenio_stats.receivers import EventEmitter
+from invenio_stats.tracing import (
+    NOOP_SPAN,
+    NOOP_TRACER,
+    FileExporter,
+    Tracer,
+    current_tracer,
+    parse_traceparent,
+    start_span,
+)
+
+
+class ListExporter(object):
+    """Exporter keeping the spans in a list."""
+
+    def __init__(self):
+        """Constructor."""
+        self.spans = []
+
+    def export(self, span):
+        """Keep the span."""
+        self.spans.append(span)
+
+
+def read_spans(path):
+    """Read the spans exported to a file."""
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture()
+def offline_config(tmp_path):
+    """Trace every event to a file."""
+    return {
+        "STATS_TRACING_EXPORTER": FileExporter(str(tmp_path / "spans.jsonl")),
+        "STATS_TRACING_SAMPLING_RATE": 1.0,
+    }
+
+
+def test_traceparent():
+    """Test the format of the trace contexts."""
+    tracer = Tracer(ListExporter())
+    span = tracer.start_span("root")
+    trace_id, span_id, sampled = parse_traceparent(span.traceparent)
+    assert span.traceparent.startswith("00-")
+    assert (trace_id, span_id, sampled) == (span.trace_id, span.span_id, True)
+    assert len(trace_id) == 32 and len(span_id) == 16
+
+    child = tracer.start_span("child", parent=span.traceparent)
+    assert (child.trace_id, child.parent_id) == (span.trace_id, span.span_id)
+
+    for invalid in (None, "", "00-abc-def-01", "00-{}-{}-zz".format(trace_id, span_id)):
+        assert parse_traceparent(invalid) is None
+
+
+def test_sampling():
+    """Test that the spans inherit the sampling decision of their trace."""
+    exporter = ListExporter()
+    tracer = Tracer(exporter, sampling_rate=0)
+    with tracer.start_span("root") as root:
+        with tracer.start_span("child", parent=root) as child:
+            pass
+    assert not root.sampled and not child.sampled
+    assert exporter.spans == []
+
+    # the decision of the emitter is kept by the workers
+    sampled = "00-{}-{}-01".format("1" * 32, "2" * 16)
+    with tracer.start_span("child", parent=sampled) as child:
+        pass
+    assert exporter.spans == [child]
+
+    tracer = Tracer(exporter, sampling_rate=1)
+    with pytest.raises(ValueError):
+        with tracer.start_span("failing"):
+            raise ValueError("failure")
+    assert exporter.spans[-1].error == "ValueError: failure"
+
+
+def test_file_exporter(tmp_path):
+    """Test exporting the spans to a file."""
+    tracer = Tracer(FileExporter(str(tmp_path / "spans.jsonl")))
+    root = tracer.start_span("root", event_type="record-view")
+    tracer.start_span("child", parent=root, links=[root, NOOP_SPAN]).end()
+    root.end()
+    root.end()
+
+    child, root_span = read_spans(tmp_path / "spans.jsonl")
+    assert root_span["name"] == "root"
+    assert root_span["parent_id"] is None
+    assert root_span["attributes"] == {"event_type": "record-view"}
+    assert child["parent_id"] == root_span["span_id"]
+    assert child["links"] == [root.traceparent]
+    assert child["duration_ms"] >= 0
+
+
+def test_disabled(offline_app_factory):
+    """Test that tracing is disabled by default."""
+    app = offline_app_factory()
+    with app.app_context():
+        assert app.extensions["invenio-stats"].tracer is None
+        assert current_tracer() is NOOP_TRACER
+        with start_span("stats.emit") as span:
+            assert span is NOOP_SPAN
+            span.set_attribute("events", 1)
+        assert span.traceparent is None
+
+    # the events can be processed without the extension
+    with Flask("test").app_context():
+        assert current_tracer() is NOOP_TRACER
+        assert start_span("stats.emit") is NOOP_SPAN
+
+
+def test_events_tracing(offline_app, tmp_path):
+    """Test the tracing of the events from their emission to their indexing."""
+
+    def build_event(event, sender, **kwargs):
+        return {
+            "timestamp": "2026-01-01T00:00:00",
+            "pid_type": "recid" if kwargs["pid_value"] != "2" else "file",
+            "pid_value": kwargs["pid_value"],
+            "user_agent": "Mozilla/5.0 (X11; Linux x86_64)",
+            "unique_id": "recid_{}".format(kwargs["pid_value"]),
+        }
+
+    def drop_downloads(doc):
+        return None if doc.get("pid_type") == "file" else doc
+
+    emitter = EventEmitter("record-view", [build_event])
+    for pid_value in ("1", "2"):
+        emitter(offline_app, pid_value=pid_value)
+
+    client = InMemorySearchClient()
+    indexer = EventsIndexer(
+        offline_app.extensions["invenio-stats"].events["record-view"].queue,
+        client=client,
+        preprocessors=[drop_downloads, flag_robots],
+    )
+    assert indexer.run() == (1, 0)
+    # the context of the trace is not indexed
+    (hit,) = client.search(index="events-stats-record-view-*")["hits"]["hits"]
+    assert "traceparent" not in hit["_source"]
+
+    spans = read_spans(tmp_path / "spans.jsonl")
+    emits = [s for s in spans if s["name"] == "stats.emit"]
+    (batch,) = [s for s in spans if s["name"] == "events.batch"]
+    preprocs = [s for s in spans if s["name"] == "events.preprocess"]
+    assert len(emits) == 2
+    assert batch["attributes"] == {"event_type": "record-view", "events": 2}
+    assert [s["attributes"]["preprocessor"] for s in preprocs] == [
+        "drop_downloads",
+        "flag_robots",
+        "drop_downloads",
+    ]
+    # the preprocessors are part of the trace of their event
+    for emit, span in zip([emits[0], emits[0], emits[1]], preprocs):
+        assert (span["trace_id"], span["parent_id"]) == (
+            emit["trace_id"],
+            emit["span_id"],
+        )
+        assert span["links"] == [
+            "00-{}-{}-01".format(batch["trace_id"], batch["span_id"])
+        ]
+    assert preprocs[-1]["attributes"]["filtered"] is True
+
+
+def test_untraced_worker(offline_app, offline_app_factory):
+    """Test that a worker without tracer doesn't index the trace context."""
+    emitter = EventEmitter(
+        "record-view",
+        [
+            lambda event, sender, **kwargs: {
+                "timestamp": "2026-01-01T00:00:00",
+                "pid_type": "recid",
+                "pid_value": "1",
+                "unique_id": "recid_1",
+            }
+        ],
+    )
+    emitter(offline_app)
+
+    app = offline_app_factory()
+    client = InMemorySearchClient()
+    with app.app_context():
+        assert app.extensions["invenio-stats"].tracer is None
+        indexer = EventsIndexer(
+            app.extensions["invenio-stats"].events["record-view"].queue,
+            client=client,
+            preprocessors=[],
+        )
+        assert indexer.run() == (1, 0)
+    (hit,) = client.search(index="events-stats-record-view-*")["hits"]["hits"]
+    assert "traceparent" not in hit["_source"]
+
+
+def test_aggregation_tracing(offline_app, tmp_path):
+    """Test the tracing of the intervals and partitions of the aggregations."""
+    client = InMemorySearchClient()
+    search.helpers.bulk(
+        client,
+        [
+            {
+                "_index": "events-stats-record-view-2026-01",
+                "_source": {
+                    "timestamp": "2026-01-0{}T00:00:00".format(1 + i % 2),
+                    "unique_id": "recid_{}".format(i % 3),
+                    "is_robot": False,
+                    "updated_timestamp": "2026-01-02T00:00:00",
+                },
+            }
+            for i in range(6)
+        ],
+    )
+    client.indices.put_alias(
+        index="events-stats-record-view-2026-01", name="events-stats-record-view"
+    )
+    StatAggregator(
+        "record-view-agg",
+        "record-view",
+        client=client,
+        field="unique_id",
+        max_bucket_size=2,
+    ).run(
+        start_date=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        end_date=datetime(2026, 1, 2, tzinfo=timezone.utc),
+    )
+
+    spans = read_spans(tmp_path / "spans.jsonl")
+    intervals = {
+        s["attributes"]["interval"].split("||")[0]: s
+        for s in spans
+        if s["name"] == "aggregation.interval"
+    }
+    assert set(intervals) == {"2026-01-01T00:00:00", "2026-01-02T00:00:00"}
+    partitions = [s for s in spans if s["name"] == "aggregation.partition"]
+    assert {s["parent_id"] for s in partitions} == {
+        s["span_id"] for s in intervals.values()
+    }
+    # the 3 terms of an interval are aggregated in 2 partitions
+    day = intervals["2026-01-01T00:00:00"]
+    assert sorted(
+        (s["attributes"]["partition"], s["attributes"]["partitions"])
+        for s in partitions
+        if s["parent_id"] == day["span_id"]
+    ) == [(0, 2), (1, 2)]
+    assert all("buckets" in s["attributes"] for s in partitions)
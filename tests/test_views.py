@@ -4,11 +4,15 @@
 """Test view functions."""
 
 import json
+from unittest.mock import patch
 
 import pytest
+from conftest import CustomQuery
 from flask import url_for
+from invenio_search.engine import search
 
 from invenio_stats import current_stats
+from invenio_stats.utils import AllowAllPermission
 
 
 def test_post_request(
@@ -72,3 +76,161 @@ def test_unauthorized_request(
     factory = current_stats.queries["test-query"].permission_factory
     assert factory.query_name == "test-query"
     assert factory.params == sample_histogram_query_data["mystat"]["params"]
+
+
+def test_conditional_request(
+    app, db, client, users, queries_config, sample_histogram_query_data
+):
+    """Test the ETag validator of the POST stats API."""
+    headers = [("Content-Type", "application/json"), ("Accept", "application/json")]
+    sample_histogram_query_data["mystat"]["stat"] = "test-query"
+    users["authorized"].login(client)
+
+    def _post(extra_headers=None):
+        return client.post(
+            url_for("invenio_stats.stat_query"),
+            headers=headers + (extra_headers or []),
+            data=json.dumps(sample_histogram_query_data),
+        )
+
+    resp = _post()
+    assert resp.status_code == 200
+    etag = resp.headers["ETag"]
+    assert etag
+
+    resp = _post([("If-None-Match", etag)])
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    assert not resp.data
+
+    # the POST requests are only validated with their ETag
+    assert "Last-Modified" not in resp.headers
+    resp = _post([("If-Modified-Since", "Fri, 01 Jan 2100 00:00:00 GMT")])
+    assert resp.status_code == 200
+
+    # a different request has a different ETag
+    sample_histogram_query_data["mystat"]["params"]["file_key"] = "other.pdf"
+    resp = _post([("If-None-Match", etag)])
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+def test_conditional_get_request(
+    app, db, client, users, queries_config, sample_histogram_query_data
+):
+    """Test the ETag and Last-Modified validators of the GET stats API."""
+    sample_histogram_query_data["mystat"]["stat"] = "test-query"
+    users["authorized"].login(client)
+
+    def _get(extra_headers=None):
+        return client.get(
+            url_for(
+                "invenio_stats.stat_query",
+                q=json.dumps(sample_histogram_query_data),
+            ),
+            headers=[("Accept", "application/json")] + (extra_headers or []),
+        )
+
+    resp = _get()
+    assert resp.status_code == 200
+    assert resp.json["mystat"]["value"] == 100
+    etag = resp.headers["ETag"]
+    last_modified = resp.headers["Last-Modified"]
+
+    assert _get([("If-None-Match", etag)]).status_code == 304
+    assert _get([("If-Modified-Since", last_modified)]).status_code == 304
+
+    resp = client.get(url_for("invenio_stats.stat_query", q="[]"))
+    assert resp.status_code == 400
+
+
+def test_cache_control_max_age(
+    app, db, client, users, queries_config, sample_histogram_query_data
+):
+    """Test the configurable max-age of the stats API responses."""
+    headers = [("Content-Type", "application/json"), ("Accept", "application/json")]
+    sample_histogram_query_data["mystat"]["stat"] = "test-query"
+    users["authorized"].login(client)
+    queries_config["test-query"]["max_age"] = 3600
+    current_stats.__dict__.pop("queries", None)
+
+    resp = client.get(
+        url_for("invenio_stats.stat_query", q=json.dumps(sample_histogram_query_data)),
+        headers=headers,
+    )
+    assert resp.status_code == 200
+    assert resp.cache_control.max_age == 3600
+
+    # the POST responses are not cached
+    resp = client.post(
+        url_for("invenio_stats.stat_query"),
+        headers=headers,
+        data=json.dumps(sample_histogram_query_data),
+    )
+    assert resp.status_code == 200
+    assert resp.cache_control.max_age is None
+    current_stats.__dict__.pop("queries", None)
+
+
+def test_profiled_request(
+    app, db, client, users, queries_config, sample_histogram_query_data
+):
+    """Test the profiling of the stats API requests."""
+    headers = [("Content-Type", "application/json"), ("Accept", "application/json")]
+    sample_histogram_query_data["mystat"]["stat"] = "test-query"
+    users["authorized"].login(client)
+
+    def _post():
+        return client.post(
+            url_for("invenio_stats.stat_query", profile=1),
+            headers=headers,
+            data=json.dumps(sample_histogram_query_data),
+        )
+
+    # profiling is denied by default
+    assert _post().status_code == 403
+
+    current_stats.__dict__["profiling_permission_factory"] = (
+        lambda query_name, params: AllowAllPermission
+    )
+    try:
+        resp = _post()
+    finally:
+        current_stats.__dict__.pop("profiling_permission_factory")
+    assert resp.status_code == 200
+    assert "ETag" not in resp.headers
+    resp_json = json.loads(resp.data.decode("utf-8"))
+    assert resp_json["mystat"]["value"] == 100
+    profile = resp_json["_profile"]["mystat"]
+    assert profile["stat"] == "test-query"
+    assert {"permission", "total"} <= set(profile["timings"])
+
+
+def test_stale_results(
+    app, db, client, users, queries_config, sample_histogram_query_data
+):
+    """Test serving the last result of a statistic when its query fails."""
+    headers = [("Content-Type", "application/json"), ("Accept", "application/json")]
+    sample_histogram_query_data["mystat"]["stat"] = "test-query"
+    users["authorized"].login(client)
+
+    def _post():
+        return client.post(
+            url_for("invenio_stats.stat_query"),
+            headers=headers,
+            data=json.dumps(sample_histogram_query_data),
+        )
+
+    app.config["STATS_QUERY_STALE_RESULTS"] = True
+    try:
+        assert _post().status_code == 200
+        timeout = search.exceptions.ConnectionTimeout("TIMEOUT", "timeout", None)
+        with patch.object(CustomQuery, "run", side_effect=timeout):
+            resp = _post()
+    finally:
+        app.config["STATS_QUERY_STALE_RESULTS"] = False
+    assert resp.status_code == 200
+    assert "ETag" not in resp.headers
+    resp_json = json.loads(resp.data.decode("utf-8"))
+    assert resp_json["mystat"]["value"] == 100
+    assert resp_json["mystat"]["stale"] is True